@@ -1,19 +1,142 @@
-'''azurerm - library for easy Azure Resource Manager calls from Python'''
-
-from .acs import *
-from .adalfns import *
-from .amsrp import *
-from .container import *
-from .computerp import *
-from .cosmosdbrp import *
-from .deployments import *
-from .graphfns import *
-from .insightsrp import *
-from .keyvault import *
-from .networkrp import *
-from .resourcegroups import *
-from .storagerp import *
-from .subfns import *
-from .restfns import *
-from .templates import *
-from .vmimages import *
+'''azurerm - library for easy Azure Resource Manager calls from Python
+
+Functions are loaded on first use: azurerm.list_vmss imports computerp (and requests) when it is
+first looked up, so scripts don't pay to import adal and every resource provider module at
+startup. The table below says which module defines each name. Submodules can also be imported
+directly, e.g. import azurerm.computerp.
+'''
+import importlib
+
+_MODULE_NAMES = {
+    'acs': ('create_container_service', 'delete_container_service', 'get_container_service',
+            'list_acs_operations', 'list_container_services', 'list_container_services_sub'),
+    'adalfns': ('CredentialPool', 'get_access_token', 'get_access_token_from_cli',
+                'ServicePrincipalCredential'),
+    'amsrp': ('add_authorization_policy', 'check_media_service_name_availability',
+              'create_asset_accesspolicy', 'create_asset_delivery_policy',
+              'create_contentkey_authorization_policy',
+              'create_contentkey_authorization_policy_options', 'create_media_asset',
+              'create_media_assetfile', 'create_media_service_rg',
+              'create_ondemand_streaming_locator', 'create_sas_locator',
+              'create_streaming_endpoint', 'delete_asset_accesspolicy',
+              'delete_asset_delivery_policy', 'delete_content_key',
+              'delete_contentkey_authorization_policy',
+              'delete_contentkey_authorization_policy_options', 'delete_media_asset',
+              'delete_media_service_rg', 'delete_sas_locator', 'delete_streaming_endpoint',
+              'encode_mezzanine_asset', 'get_ams_access_token', 'get_key_delivery_url',
+              'helper_add', 'helper_delete', 'helper_list', 'link_asset_content_key',
+              'link_asset_delivery_policy', 'link_contentkey_authorization_policy',
+              'list_asset_accesspolicy', 'list_asset_delivery_policy', 'list_content_key',
+              'list_contentkey_authorization_policy',
+              'list_contentkey_authorization_policy_options', 'list_media_asset',
+              'list_media_endpoint_keys', 'list_media_job', 'list_media_processor',
+              'list_media_services', 'list_media_services_rg', 'list_sas_locator',
+              'list_streaming_endpoint', 'scale_streaming_endpoint', 'translate_asset_options',
+              'translate_job_state', 'update_media_assetfile', 'upload_block_blob',
+              'validate_mp4_asset'),
+    'clicache': ('CliProfile', 'CliTokens', 'get_cli_path', 'get_cli_profile', 'get_cli_tokens'),
+    'client': ('AzureRMClient',),
+    'container': ('create_container_definition', 'create_container_instance_group',
+                  'delete_container_instance_group', 'get_container_instance_group',
+                  'get_container_instance_logs', 'list_container_instance_groups',
+                  'list_container_instance_groups_sub'),
+    'computerp': ('bulk_vmss_vms', 'create_as', 'create_vm', 'create_vmss', 'deallocate_vm',
+                  'delete_as', 'delete_vm', 'delete_vmss', 'delete_vmss_vms', 'get_as',
+                  'get_compute_usage', 'get_vm', 'get_vm_extension', 'get_vm_instance_view',
+                  'get_vmss', 'get_vmss_instance_view', 'get_vmss_nics', 'get_vmss_public_ips',
+                  'get_vmss_rolling_upgrades', 'get_vmss_vm', 'get_vmss_vm_instance_view',
+                  'get_vmss_vm_nics', 'InstanceViewWatcher', 'iter_as', 'iter_as_sub',
+                  'iter_vm_images_sub', 'iter_vms', 'iter_vms_sub', 'iter_vmss', 'iter_vmss_skus',
+                  'iter_vmss_sub', 'iter_vmss_vm_instance_view', 'iter_vmss_vms',
+                  'iter_vmss_vms_expanded', 'list_as', 'list_as_sub', 'list_vm_images_sub',
+                  'list_vms', 'list_vms_sub', 'list_vmss', 'list_vmss_skus', 'list_vmss_sub',
+                  'list_vmss_vm_instance_view', 'list_vmss_vm_instance_view_pg', 'list_vmss_vms',
+                  'poweroff_vmss', 'poweroff_vmss_vms', 'put_vmss', 'put_vmss_vm',
+                  'reimage_vmss_vms', 'restart_vm', 'restart_vmss', 'restart_vmss_vms',
+                  'rolling_upgrade_vmss', 'scale_vmss', 'start_vm', 'start_vmss', 'start_vmss_vms',
+                  'stop_vm', 'stopdealloc_vmss', 'stopdealloc_vmss_vms', 'summarize_vmss_vms',
+                  'update_vm', 'update_vmss', 'upgrade_vmss_vms'),
+    'cosmosdbrp': ('create_cosmosdb_account', 'get_cosmosdb_account_keys'),
+    'deployments': ('list_deployment_operations', 'show_deployment'),
+    'fanout': ('fan_out', 'FanOutError'),
+    'graphfns': ('get_graph_token_from_msi', 'get_object_id_from_graph'),
+    'insightsrp': ('create_autoscale_rule', 'create_autoscale_setting',
+                   'get_events_for_subscription', 'get_metrics_for_resource',
+                   'list_autoscale_settings', 'list_insights_components',
+                   'list_metric_defs_for_resource'),
+    'keyvault': ('create_keyvault', 'delete_keyvault', 'delete_keyvault_secret', 'get_keyvault',
+                 'iter_keyvaults', 'iter_keyvaults_sub', 'list_keyvaults', 'list_keyvaults_sub',
+                 'set_keyvault_secret'),
+    'msifns': ('clear_msi_tokens', 'get_msi_endpoint', 'get_msi_token'),
+    'networkrp': ('create_lb_with_nat_pool', 'create_nic', 'create_nsg', 'create_nsg_rule',
+                  'create_public_ip', 'create_vnet', 'delete_load_balancer', 'delete_nic',
+                  'delete_nsg', 'delete_nsg_rule', 'delete_public_ip', 'delete_vnet',
+                  'get_lb_nat_rule', 'get_load_balancer', 'get_network_usage', 'get_nic',
+                  'get_public_ip', 'get_vnet', 'iter_asgs', 'iter_asgs_all', 'iter_lb_nat_rules',
+                  'iter_load_balancers', 'iter_load_balancers_rg', 'iter_nics', 'iter_nics_rg',
+                  'iter_nsgs', 'iter_nsgs_all', 'iter_public_ips', 'iter_vnets', 'iter_vnets_rg',
+                  'list_asgs', 'list_asgs_all', 'list_lb_nat_rules', 'list_load_balancers',
+                  'list_load_balancers_rg', 'list_nics', 'list_nics_rg', 'list_nsgs',
+                  'list_nsgs_all', 'list_public_ips', 'list_vnets', 'list_vnets_rg',
+                  'update_load_balancer'),
+    'operations': ('iter_completed', 'OperationPoller', 'TERMINAL_STATES', 'wait_for_operation',
+                   'wait_for_operations'),
+    'ratelimit': ('disable_rate_limiting', 'enable_rate_limiting', 'get_bucket', 'retry_delay',
+                  'TokenBucket'),
+    'resourcegroups': ('create_resource_group', 'delete_resource_group', 'export_template',
+                       'get_resource_group', 'get_resource_group_resources',
+                       'list_resource_groups'),
+    'restfns': ('BatchGet', 'close_sessions', 'current_deadline', 'Deadline', 'DeadlineExceeded',
+                'disable_etag_cache', 'disable_hedging', 'disable_single_flight', 'do_ams_auth',
+                'do_ams_delete', 'do_ams_get', 'do_ams_get_url', 'do_ams_patch', 'do_ams_post',
+                'do_ams_put', 'do_ams_sto_put', 'do_batch_get', 'do_delete', 'do_get',
+                'do_get_next', 'do_get_raw', 'do_patch', 'do_post', 'do_put', 'enable_etag_cache',
+                'enable_hedging', 'enable_single_flight', 'get_session', 'get_timeouts', 'get_url',
+                'get_user_agent', 'iter_values', 'RequestCancelled', 'set_timeouts'),
+    'settings': ('ACS_API', 'AIO_MAX_CONCURRENCY', 'ams_auth_endpoint', 'ams_rest_endpoint',
+                 'AZURE_AUTH_ENDPOINT', 'AZURE_RESOURCE_ENDPOINT', 'AZURE_RM_ENDPOINT', 'BASE_API',
+                 'batch_acceptformat', 'BATCH_API', 'BATCH_MAX_REQUESTS', 'charset', 'COMP_API',
+                 'CONTAINER_API', 'COSMOSDB_API', 'CREDENTIAL_POOL_WORKERS', 'DEPLOYMENTS_API',
+                 'dsversion_max', 'dsversion_min', 'ETAG_CACHE_SIZE', 'FAN_OUT_QUEUE_SIZE',
+                 'FAN_OUT_WORKERS', 'get_auth_endpoint', 'get_resource_endpoint', 'get_rm_endpoint',
+                 'GRAPH_RESOURCE_HOST', 'HEDGE_BUDGET', 'HEDGE_LATENCY_SAMPLES', 'HEDGE_PERCENTILE',
+                 'HEDGE_WORKERS', 'HTTP_CONNECT_TIMEOUT', 'HTTP_POOL_SIZES', 'HTTP_READ_TIMEOUT',
+                 'INSIGHTS_API', 'INSIGHTS_COMPONENTS_API', 'INSIGHTS_METRICS_API',
+                 'INSIGHTS_PREVIEW_API', 'json_acceptformat', 'json_only_acceptformat',
+                 'KEYVAULT_API', 'LRO_MAX_POLL_INTERVAL', 'LRO_POLL_BACKOFF', 'LRO_POLL_INTERVAL',
+                 'LRO_POLL_MAX_ERRORS', 'LRO_WAIT_REQUESTS_PER_SECOND', 'LRO_WAIT_WORKERS',
+                 'MEDIA_API', 'NETWORK_API', 'RATE_LIMIT_MAX_RETRIES', 'RATE_LIMIT_READS',
+                 'RATE_LIMIT_WRITES', 'RESOURCE_API', 'STORAGE_API', 'TOKEN_REFRESH_MARGIN',
+                 'TOKEN_REFRESH_RETRY', 'use_endpoints', 'VMSS_BULK_CHUNK_SIZE',
+                 'VMSS_BULK_WORKERS', 'VMSS_UPGRADE_HEALTH_TIMEOUT', 'VMSS_UPGRADE_PARALLEL_FDS',
+                 'VMSS_UPGRADE_PARALLEL_UDS', 'WATCH_BACKOFF', 'WATCH_MAX_INTERVAL',
+                 'WATCH_MIN_INTERVAL', 'xml_acceptformat', 'xmsversion'),
+    'storagerp': ('create_storage_account', 'delete_storage_account', 'get_storage_account',
+                  'get_storage_account_keys', 'get_storage_usage', 'iter_storage_accounts_rg',
+                  'iter_storage_accounts_sub', 'list_storage_accounts_rg',
+                  'list_storage_accounts_sub'),
+    'subfns': ('get_subscription_from_cli', 'list_locations', 'list_subscriptions', 'list_tenants'),
+    'templates': ('deploy_template', 'deploy_template_uri', 'deploy_template_uri_param_uri'),
+    'vmimages': ('list_offers', 'list_publishers', 'list_sku_versions', 'list_skus'),
+    'vmssindex': ('get_vmss_instance_table', 'VmssInstanceTable'),
+}
+
+_NAME_MODULES = {name: module for module, names in _MODULE_NAMES.items() for name in names}
+
+__all__ = sorted(_NAME_MODULES)
+
+
+def __getattr__(name):
+    '''Import the module which defines a name the first time it is looked up.'''
+    module_name = _NAME_MODULES.get(name)
+    if module_name is None:
+        if name in _MODULE_NAMES or name == 'aio':
+            return importlib.import_module('.' + name, __name__)
+        raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+    value = getattr(importlib.import_module('.' + module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_NAME_MODULES))
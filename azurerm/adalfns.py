@@ -1,18 +1,316 @@
 '''adalfns - place to store azurerm functions which call adal routines'''
-import json
-import codecs
-import os
-import requests
-from datetime import datetime as dt
+import concurrent.futures
+import hashlib
+import threading
+import time
 
 import adal
 
-from .settings import get_auth_endpoint, get_resource_endpoint
+from .clicache import get_cli_path, get_cli_profile, get_cli_tokens
+from .msifns import get_msi_endpoint, get_msi_token
+from .settings import get_auth_endpoint, get_resource_endpoint, TOKEN_REFRESH_MARGIN, \
+    TOKEN_REFRESH_RETRY, CREDENTIAL_POOL_WORKERS
+from .subfns import list_subscriptions
+
+# cached service principal tokens by (authority, application_id, resource, secret hash)
+_token_cache = {}
+# guards _token_cache and wakes the background refresh thread when an entry is added
+_token_condition = threading.Condition()
+_refresh_thread = None
+
+
+class _CachedToken:
+    '''A service principal token and its expiry, shared by every credential with the same
+    authority, application, secret and resource.'''
+    def __init__(self, authority, application_id, application_secret, resource):
+        self.application_id = application_id
+        self.application_secret = application_secret
+        self.resource = resource
+        self.context = adal.AuthenticationContext(authority, api_version=None)
+        self.token = None
+        self.expires = 0.0
+        self.refresh_at = 0.0
+        self.lock = threading.Lock()
+
+    def valid(self):
+        return self.token is not None and time.monotonic() < self.expires
+
+    def _acquire(self):
+        token_response = self.context.acquire_token_with_client_credentials(
+            self.resource, self.application_id, self.application_secret)
+        expires_in = float(token_response.get('expiresIn', 3600))
+        now = time.monotonic()
+        self.token = token_response.get('accessToken')
+        self.expires = now + expires_in
+        self.refresh_at = now + max(expires_in - TOKEN_REFRESH_MARGIN, expires_in / 2)
+
+    def refresh(self):
+        '''Get a new token from Azure AD.'''
+        with self.lock:
+            self._acquire()
+
+    def get(self):
+        '''Return the token, getting one from Azure AD first if there is no valid token.'''
+        if not self.valid():
+            with self.lock:
+                # another thread may have got one while this one waited for the lock
+                if not self.valid():
+                    self._acquire()
+        return self.token
+
+
+def _refresh(entry):
+    try:
+        entry.refresh()
+    except Exception:  # keep handing out the current token, and try again later
+        pass
+
+
+def _refresh_tokens():
+    '''Background thread which refreshes cached tokens before they expire.'''
+    refresh_pool = concurrent.futures.ThreadPoolExecutor(max_workers=CREDENTIAL_POOL_WORKERS)
+    while True:
+        with _token_condition:
+            now = time.monotonic()
+            due = [entry for entry in _token_cache.values()
+                   if entry.token is not None and entry.refresh_at <= now]
+            if not due:
+                next_refresh = min([entry.refresh_at for entry in _token_cache.values()
+                                    if entry.token is not None], default=None)
+                _token_condition.wait(None if next_refresh is None else next_refresh - now)
+                continue
+            # tokens are refreshed independently; one which fails is tried again later
+            for entry in due:
+                entry.refresh_at = now + TOKEN_REFRESH_RETRY
+        for entry in due:
+            refresh_pool.submit(_refresh, entry)
+
+
+def _start_refresh_thread():
+    global _refresh_thread
+    if _refresh_thread is None:
+        _refresh_thread = threading.Thread(target=_refresh_tokens, name='azurerm-token-refresh',
+                                           daemon=True)
+        _refresh_thread.start()
+
+
+class ServicePrincipalCredential:
+    '''A service principal credential which caches its access token and refreshes it in the
+    background.
+
+    The first get_token() call gets a token from Azure AD. After that a shared background
+    thread gets a new one TOKEN_REFRESH_MARGIN seconds before it expires, so get_token() hands
+    out the current token without waiting. Credentials for the same tenant, authority,
+    application, secret and resource share one cached token. A credential can be called like a
+    function, so it can be passed to AzureRMClient as its access_token.
+
+    Args:
+        tenant_id (str): Tenant id of the user's account.
+        application_id (str): Application id of a Service Principal account.
+        application_secret (str): Application secret (password) of the Service Principal account.
+        resource (str): Optional resource to get tokens for. Default get_resource_endpoint().
+    '''
+    def __init__(self, tenant_id, application_id, application_secret, resource=None):
+        self.tenant_id = tenant_id
+        self.application_id = application_id
+        self.resource = resource or get_resource_endpoint()
+        # a credential only shares a token with one which has the same secret and authority,
+        # so a wrong secret never gets a cached token, and can't change a shared entry
+        authority = get_auth_endpoint() + tenant_id
+        key = (authority, application_id, self.resource,
+               hashlib.sha256(application_secret.encode('utf-8')).hexdigest())
+        with _token_condition:
+            entry = _token_cache.get(key)
+            if entry is None:
+                entry = _token_cache[key] = _CachedToken(authority, application_id,
+                                                         application_secret, self.resource)
+        self._entry = entry
+
+    def get_token(self):
+        '''Get the current access token, getting one from Azure AD first if there is no valid
+        token yet.
+
+        Returns:
+            An Azure authentication token string.
+        '''
+        entry = self._entry
+        if entry.valid():
+            return entry.token
+        token = entry.get()
+        # let the refresh thread know when this token is due for refresh
+        with _token_condition:
+            _start_refresh_thread()
+            _token_condition.notify()
+        return token
+
+    __call__ = get_token
+
+    def expires_in(self):
+        '''Return the number of seconds until the current token expires, 0 if there is none.'''
+        return max(0.0, self._entry.expires - time.monotonic()) if self._entry.token else 0.0
+
+
+class CredentialPool:
+    '''Service principal credentials for many tenants, with lookup by subscription.
+
+    Tokens for all the credentials are acquired concurrently and refreshed independently in
+    the background (see ServicePrincipalCredential). map_subscriptions() lists the
+    subscriptions each credential can see, so get_token() can find the right token for a
+    subscription id. It is called by get_token() for a subscription it hasn't seen yet. E.g.
+
+        pool = azurerm.CredentialPool()
+        for tenant_id, app_id, app_secret in service_principals:
+            pool.add(tenant_id, app_id, app_secret)
+        access_token = pool.get_token(subscription_id=subscription_id)
+
+    Args:
+        max_workers (int): Optional number of tokens acquired at once. Default
+            CREDENTIAL_POOL_WORKERS.
+    '''
+    def __init__(self, max_workers=CREDENTIAL_POOL_WORKERS):
+        self.max_workers = max_workers
+        self._credentials = {}
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        # held while get_credential() maps subscriptions, so concurrent misses map them once
+        self._map_lock = threading.Lock()
+
+    def add(self, tenant_id, application_id, application_secret, resource=None):
+        '''Add a service principal to the pool. Its token is acquired by acquire_all(),
+        map_subscriptions() or the first get_token() for it. The pool uses the first service
+        principal added for each tenant.
+
+        Args:
+            tenant_id (str): Tenant id of the user's account.
+            application_id (str): Application id of a Service Principal account.
+            application_secret (str): Application secret (password) of the Service Principal
+                account.
+            resource (str): Optional resource to get tokens for. Default get_resource_endpoint().
+
+        Returns:
+            The ServicePrincipalCredential.
+        '''
+        credential = ServicePrincipalCredential(tenant_id, application_id, application_secret,
+                                                resource)
+        with self._lock:
+            self._credentials.setdefault(tenant_id, credential)
+        return credential
+
+    def _run_all(self, func):
+        '''Call func(tenant_id, credential) for every credential concurrently.
+
+        Returns:
+            Dictionary of results, and dictionary of exceptions, by tenant id.
+        '''
+        with self._lock:
+            credentials = list(self._credentials.items())
+        results = {}
+        errors = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(func, tenant_id, credential): tenant_id
+                       for tenant_id, credential in credentials}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as error:
+                    errors[futures[future]] = error
+        return results, errors
+
+    def acquire_all(self):
+        '''Get tokens for all the credentials at once.
+
+        Returns:
+            Dictionary of the exceptions raised for credentials whose token could not be
+            acquired, by tenant id. Empty if all succeeded.
+        '''
+        return self._run_all(lambda tenant_id, credential: credential.get_token())[1]
+
+    def map_subscriptions(self):
+        '''List the subscriptions visible to each credential, concurrently, and remember which
+        tenant each subscription belongs to.
+
+        Returns:
+            Dictionary of the exceptions raised for credentials whose token or subscriptions
+            could not be got, by tenant id. Empty if all succeeded.
+        '''
+        def list_tenant_subscriptions(tenant_id, credential):
+            response = list_subscriptions(credential.get_token())
+            if 'value' not in response:
+                raise ValueError('list_subscriptions failed: ' + str(response))
+            return response['value']
+
+        results, errors = self._run_all(list_tenant_subscriptions)
+        with self._lock:
+            for tenant_id, subscriptions in results.items():
+                for subscription in subscriptions:
+                    self._subscriptions[subscription['subscriptionId'].lower()] = \
+                        subscription.get('tenantId', tenant_id)
+        return errors
+
+    def tenants(self):
+        '''Return the list of tenant ids in the pool.'''
+        with self._lock:
+            return list(self._credentials)
+
+    def subscriptions(self):
+        '''Return a dictionary of tenant id by subscription id, as found by
+        map_subscriptions().'''
+        with self._lock:
+            return dict(self._subscriptions)
+
+    def get_credential(self, tenant_id=None, subscription_id=None):
+        '''Get the credential for a tenant, or for the tenant a subscription belongs to.
+
+        Args:
+            tenant_id (str): Tenant id.
+            subscription_id (str): Subscription id, used if tenant_id is not given. If
+                map_subscriptions() hasn't found it yet, it is called once to look again.
+
+        Returns:
+            A ServicePrincipalCredential.
+
+        Raises:
+            KeyError: If there is no credential for the tenant or subscription.
+        '''
+        if tenant_id is None:
+            subscription_id = subscription_id.lower()
+            with self._lock:
+                tenant_id = self._subscriptions.get(subscription_id)
+            if tenant_id is None:
+                with self._map_lock:
+                    # another thread may have mapped it while this one waited for the lock
+                    with self._lock:
+                        tenant_id = self._subscriptions.get(subscription_id)
+                    if tenant_id is None:
+                        self.map_subscriptions()
+                        with self._lock:
+                            tenant_id = self._subscriptions[subscription_id]
+        with self._lock:
+            return self._credentials[tenant_id]
+
+    def get_token(self, tenant_id=None, subscription_id=None):
+        '''Get the access token for a tenant, or for the tenant a subscription belongs to.
+
+        Args:
+            tenant_id (str): Tenant id.
+            subscription_id (str): Subscription id, used if tenant_id is not given. See
+                get_credential().
+
+        Returns:
+            An Azure authentication token string.
+
+        Raises:
+            KeyError: If there is no credential for the tenant or subscription.
+        '''
+        return self.get_credential(tenant_id, subscription_id).get_token()
 
 
 def get_access_token(tenant_id, application_id, application_secret):
     '''get an Azure access token using the adal library.
 
+    Tokens are cached and refreshed in the background, see ServicePrincipalCredential, so
+    repeated calls with the same arguments return at once with a token which is still valid.
+
     Args:
         tenant_id (str): Tenant id of the user's account.
         application_id (str): Application id of a Service Principal account.
@@ -21,11 +319,7 @@ def get_access_token(tenant_id, application_id, application_secret):
     Returns:
         An Azure authentication token string.
     '''
-    context = adal.AuthenticationContext(
-        get_auth_endpoint() + tenant_id, api_version=None)
-    token_response = context.acquire_token_with_client_credentials(
-        get_resource_endpoint(), application_id, application_secret)
-    return token_response.get('accessToken')
+    return ServicePrincipalCredential(tenant_id, application_id, application_secret).get_token()
 
 
 def get_access_token_from_cli():
@@ -39,67 +333,38 @@ def get_access_token_from_cli():
     '''
 
     # check if running in cloud shell, if so, pick up token from MSI_ENDPOINT
-    if 'ACC_CLOUD' in os.environ and 'MSI_ENDPOINT' in os.environ:
-        endpoint = os.environ['MSI_ENDPOINT']
-        headers = {'Metadata': 'true'}
-        body = {"resource": "https://management.azure.com/"}
-        ret = requests.post(endpoint, headers=headers, data=body)
-        return ret.json()['access_token']
+    if get_msi_endpoint() is not None:
+        return get_msi_token("https://management.azure.com/")
 
     else: # not running cloud shell
-        home = os.path.expanduser('~')
-        sub_username = ""
-
         # 1st identify current subscription
-        azure_profile_path = home + os.sep + '.azure' + os.sep + 'azureProfile.json'
-        if os.path.isfile(azure_profile_path) is False:
+        azure_profile_path = get_cli_path('azureProfile.json')
+        profile = get_cli_profile()
+        if profile is None:
             print('Error from get_access_token_from_cli(): Cannot find ' + azure_profile_path)
             return None
-        with codecs.open(azure_profile_path, 'r', 'utf-8-sig') as azure_profile_fd:
-            subs = json.load(azure_profile_fd)
-        for sub in subs['subscriptions']:
-            if sub['isDefault'] == True:
-                sub_username = sub['user']['name']
+        sub_username = profile.default_user
         if sub_username == "":
             print('Error from get_access_token_from_cli(): Default subscription not found in ' +  \
                 azure_profile_path)
             return None
 
         # look for acces_token
-        access_keys_path = home + os.sep + '.azure' + os.sep + 'accessTokens.json'
-        if os.path.isfile(access_keys_path) is False:
+        access_keys_path = get_cli_path('accessTokens.json')
+        tokens = get_cli_tokens()
+        if tokens is None:
             print('Error from get_access_token_from_cli(): Cannot find ' + access_keys_path)
             return None
-        with open(access_keys_path, 'r') as access_keys_fd:
-            keys = json.load(access_keys_fd)
-
-        # loop through accessTokens.json until first unexpired entry found
-        for key in keys:
-            if key['userId'] == sub_username:
-                if 'accessToken' not in keys[0]:
-                    print('Error from get_access_token_from_cli(): accessToken not found in ' + \
-                        access_keys_path)
-                    return None
-                if 'tokenType' not in keys[0]:
-                    print('Error from get_access_token_from_cli(): tokenType not found in ' + \
-                        access_keys_path)
-                    return None
-                if 'expiresOn' not in keys[0]:
-                    print('Error from get_access_token_from_cli(): expiresOn not found in ' + \
-                        access_keys_path)
-                    return None
-                expiry_date_str = key['expiresOn']
-
-                # check date and skip past expired entries
-                if 'T' in expiry_date_str:
-                    exp_date = dt.strptime(key['expiresOn'], '%Y-%m-%dT%H:%M:%S.%fZ')
-                else:
-                    exp_date = dt.strptime(key['expiresOn'], '%Y-%m-%d %H:%M:%S.%f')
-                if exp_date < dt.now():
-                    continue
-                else:
-                    return key['accessToken']
-
-        # if dropped out of the loop, token expired
+        if tokens.missing is not None and sub_username in tokens.users:
+            print('Error from get_access_token_from_cli(): ' + tokens.missing + \
+                ' not found in ' + access_keys_path)
+            return None
+
+        # first unexpired entry for the user
+        access_token = tokens.get_token(sub_username)
+        if access_token is not None:
+            return access_token
+
+        # if no unexpired entry was found, token expired
         print('Error from get_access_token_from_cli(): token expired. Run \'az login\'')
         return None
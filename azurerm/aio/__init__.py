@@ -0,0 +1,16 @@
+'''azurerm.aio - asyncio versions of the azurerm REST and resource provider functions
+
+Requires aiohttp (pip install azurerm[aio]). Functions have the same names and arguments as
+their sync counterparts; await them, or use async for with the iter_* functions. Requests on
+an event loop share one HTTP session, and at most AIO_MAX_CONCURRENCY are in flight at once.
+'''
+
+from .amsrp import *
+from .computerp import *
+from .insightsrp import *
+from .keyvault import *
+from .networkrp import *
+from .resourcegroups import *
+from .restfns import *
+from .storagerp import *
+from .subfns import *
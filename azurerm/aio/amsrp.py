@@ -0,0 +1,5 @@
+'''azurerm.aio amsrp - asyncio versions of the amsrp functions'''
+from .. import amsrp as _sync
+from .mirror import mirror_module
+
+globals().update(mirror_module(_sync))
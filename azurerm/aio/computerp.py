@@ -0,0 +1,8 @@
+'''azurerm.aio computerp - asyncio versions of the computerp functions'''
+from .. import computerp as _sync
+from .mirror import mirror_module
+
+# these use the results of REST calls rather than returning them, see mirror_module()
+globals().update(mirror_module(_sync, skip=('_run_vmss_chunk', '_vmss_vm_health',
+                                            '_wait_until_healthy', 'bulk_vmss_vms',
+                                            'rolling_upgrade_vmss', 'summarize_vmss_vms')))
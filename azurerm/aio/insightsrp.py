@@ -0,0 +1,5 @@
+'''azurerm.aio insightsrp - asyncio versions of the insightsrp functions'''
+from .. import insightsrp as _sync
+from .mirror import mirror_module
+
+globals().update(mirror_module(_sync))
@@ -0,0 +1,33 @@
+'''azurerm.aio keyvault - asyncio versions of the keyvault functions'''
+from .. import keyvault as _sync
+from .mirror import mirror_module
+from .subfns import list_tenants
+
+globals().update(mirror_module(_sync))
+_create_keyvault = create_keyvault
+
+
+async def create_keyvault(access_token, subscription_id, rgname, vault_name, location,
+                          template_deployment=True, tenant_id=None, object_id=None):
+    '''Create a new key vault in the named resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        rgname (str): Azure resource group name.
+        vault_name (str): Name of the new key vault.
+        location (str): Azure data center location. E.g. westus2.
+        template_deployment (boolean): Whether to allow deployment from template.
+        tenant_id (str): Optionally specify a tenant ID (otherwise picks first response) from
+                         list_tenants().
+        object_id (str): Optionally specify an object ID representing user or principal for the
+                         access policy.
+
+    Returns:
+        HTTP response. JSON body of key vault properties.
+    '''
+    if tenant_id is None:
+        ret = await list_tenants(access_token)
+        tenant_id = ret['value'][0]['tenantId']
+    return await _create_keyvault(access_token, subscription_id, rgname, vault_name, location,
+                                  template_deployment, tenant_id, object_id)
@@ -0,0 +1,42 @@
+'''azurerm.aio mirror - build asyncio versions of the sync azurerm resource provider modules
+
+The resource provider functions only build an endpoint and a body, and return the result of a
+restfns call. Rebinding the restfns names they use to the async versions in aio.restfns turns
+each of them into a function which returns an awaitable (or an async iterator for iter_*
+functions) with the same name, arguments and docstring.
+'''
+import types
+
+from . import restfns
+
+
+def mirror_module(module, skip=()):
+    '''Create async versions of the functions defined in a sync azurerm module.
+
+    Functions which use the result of a REST call rather than just returning it can't be
+    mirrored this way; list them in skip and write them by hand.
+
+    Args:
+        module (module): A sync azurerm module, e.g. azurerm.computerp.
+        skip (iterable): Names of functions not to mirror.
+
+    Returns:
+        A dict of function name to async function.
+    '''
+    namespace = dict(vars(module))
+    for name in vars(restfns):
+        if name in namespace and not name.startswith('_'):
+            namespace[name] = getattr(restfns, name)
+    mirrored = {}
+    for name, value in vars(module).items():
+        if name in skip or not isinstance(value, types.FunctionType) or \
+                value.__module__ != module.__name__:
+            continue
+        func = types.FunctionType(value.__code__, namespace, name, value.__defaults__,
+                                  value.__closure__)
+        func.__kwdefaults__ = value.__kwdefaults__
+        func.__doc__ = value.__doc__
+        func.__module__ = module.__name__.replace('azurerm.', 'azurerm.aio.', 1)
+        namespace[name] = func
+        mirrored[name] = func
+    return mirrored
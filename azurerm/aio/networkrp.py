@@ -0,0 +1,5 @@
+'''azurerm.aio networkrp - asyncio versions of the networkrp functions'''
+from .. import networkrp as _sync
+from .mirror import mirror_module
+
+globals().update(mirror_module(_sync))
@@ -0,0 +1,5 @@
+'''azurerm.aio resourcegroups - asyncio versions of the resourcegroups functions'''
+from .. import resourcegroups as _sync
+from .mirror import mirror_module
+
+globals().update(mirror_module(_sync))
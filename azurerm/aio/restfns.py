@@ -0,0 +1,416 @@
+'''azurerm.aio restfns - asyncio REST functions for azurerm'''
+
+import asyncio
+import json
+import weakref
+
+import aiohttp
+
+from ..ratelimit import get_bucket, retry_delay
+from ..restfns import get_timeouts, get_user_agent
+from ..settings import json_acceptformat, json_only_acceptformat, xml_acceptformat, \
+charset, dsversion_min, dsversion_max, xmsversion, AIO_MAX_CONCURRENCY, RATE_LIMIT_MAX_RETRIES
+
+# one aiohttp session and concurrency semaphore per event loop
+_loop_state = weakref.WeakKeyDictionary()
+_max_concurrency = AIO_MAX_CONCURRENCY
+
+
+class AsyncResponse:
+    '''A fully read HTTP response, with the requests.Response attributes azurerm callers use.
+
+    Attributes:
+        status_code (int): HTTP status code.
+        headers (dict): Case insensitive response headers.
+        text (str): Response body.
+        url (str): Final URL of the request.
+    '''
+    def __init__(self, status_code, headers, text, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self.url = url
+
+    def json(self):
+        '''Parse the response body as JSON.'''
+        return json.loads(self.text)
+
+    def __repr__(self):
+        return '<AsyncResponse [{}]>'.format(self.status_code)
+
+
+def set_max_concurrency(max_concurrency):
+    '''Set the maximum number of requests in flight at once on each event loop.
+
+    Applies to event loops which have not sent a request yet.
+
+    Args:
+        max_concurrency (int): Maximum concurrent requests. Default AIO_MAX_CONCURRENCY.
+    '''
+    global _max_concurrency
+    _max_concurrency = max_concurrency
+
+
+def _get_state():
+    '''Get the (session, semaphore) pair for the running event loop, creating it if needed.'''
+    loop = asyncio.get_running_loop()
+    state = _loop_state.get(loop)
+    if state is None or state[0].closed:
+        connector = aiohttp.TCPConnector(limit=_max_concurrency)
+        state = (aiohttp.ClientSession(connector=connector),
+                 asyncio.Semaphore(_max_concurrency))
+        _loop_state[loop] = state
+    return state
+
+
+async def close_session():
+    '''Close the HTTP session of the running event loop. Call before the loop ends.
+    '''
+    state = _loop_state.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state[0].close()
+
+
+async def _send(method, endpoint, **kwargs):
+    '''Send an HTTP request on the event loop's session and read the whole response.
+
+    Like the sync restfns, requests are paced by the per-subscription rate limiter, throttled
+    (429) requests are retried after their Retry-After interval, and the connect/read timeouts
+    from set_timeouts() apply. For an overall deadline use asyncio.wait_for(), which also cancels.
+    '''
+    session, semaphore = _get_state()
+    connect, read = get_timeouts()
+    kwargs['timeout'] = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+    bucket = get_bucket(endpoint, method)
+    attempt = 0
+    while True:
+        if bucket is not None:
+            wait = bucket.reserve()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = bucket.reserve()
+        async with semaphore:
+            async with session.request(method, endpoint, **kwargs) as raw_response:
+                text = await raw_response.text()
+                response = AsyncResponse(raw_response.status, raw_response.headers, text,
+                                         str(raw_response.url))
+        if bucket is not None:
+            bucket.update(response.headers)
+        if response.status_code != 429 or attempt >= RATE_LIMIT_MAX_RETRIES:
+            return response
+        delay = retry_delay(response, attempt)
+        if bucket is not None:
+            bucket.block(delay)
+        else:
+            await asyncio.sleep(delay)
+        attempt += 1
+
+
+async def do_get(endpoint, access_token):
+    '''Do an HTTP GET request and return JSON.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    headers = {"Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    return (await _send('GET', endpoint, headers=headers)).json()
+
+
+async def do_get_next(endpoint, access_token):
+    '''Do an HTTP GET request, follow the nextLink chain and return JSON.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    headers = {"Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    value_list = []
+    while endpoint is not None:
+        get_return = (await _send('GET', endpoint, headers=headers)).json()
+        if not 'value' in get_return:
+            return get_return
+        endpoint = get_return.get('nextLink')
+        value_list += get_return['value']
+    return {'value': value_list}
+
+
+async def _iter_pages(endpoint, headers, prefetch):
+    '''Yield the JSON body of each page in a nextLink chain.'''
+    if prefetch <= 0:
+        while endpoint is not None:
+            get_return = (await _send('GET', endpoint, headers=headers)).json()
+            endpoint = get_return.get('nextLink') if 'value' in get_return else None
+            yield get_return
+        return
+
+    pages = asyncio.Queue(maxsize=prefetch)
+
+    async def fetch_pages(endpoint):
+        try:
+            while endpoint is not None:
+                get_return = (await _send('GET', endpoint, headers=headers)).json()
+                endpoint = get_return.get('nextLink') if 'value' in get_return else None
+                await pages.put(get_return)
+        except Exception as error:  # handed to the consumer and raised there
+            await pages.put(error)
+        await pages.put(None)
+
+    fetcher = asyncio.ensure_future(fetch_pages(endpoint))
+    try:
+        while True:
+            get_return = await pages.get()
+            if get_return is None:
+                return
+            if isinstance(get_return, Exception):
+                raise get_return
+            yield get_return
+    finally:
+        fetcher.cancel()
+
+
+async def iter_values(endpoint, access_token, prefetch=0):
+    '''Do HTTP GET requests following the nextLink chain, and yield list items as they arrive.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        access_token (str): A valid Azure authentication token.
+        prefetch (int): Optional number of pages to fetch ahead in a background task.
+
+    Yields:
+        JSON body of each list item. If a page has no value list (e.g. an error response) its
+        JSON body is yielded instead and iteration stops.
+    '''
+    headers = {"Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    async for get_return in _iter_pages(endpoint, headers, prefetch):
+        if not 'value' in get_return:
+            yield get_return
+            return
+        page = get_return['value']
+        del get_return
+        for value in page:
+            yield value
+
+
+async def do_delete(endpoint, access_token):
+    '''Do an HTTP DELETE request.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response.
+    '''
+    headers = {"Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    return await _send('DELETE', endpoint, headers=headers)
+
+
+async def do_patch(endpoint, body, access_token):
+    '''Do an HTTP PATCH request.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        body (str): JSON body of information to patch.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    headers = {"content-type": "application/json", "Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    return await _send('PATCH', endpoint, data=body, headers=headers)
+
+
+async def do_post(endpoint, body, access_token):
+    '''Do an HTTP POST request.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        body (str): JSON body of information to post.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    headers = {"content-type": "application/json", "Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    return await _send('POST', endpoint, data=body, headers=headers)
+
+
+async def do_put(endpoint, body, access_token):
+    '''Do an HTTP PUT request.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        body (str): JSON body of information to put.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    headers = {"content-type": "application/json", "Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    return await _send('PUT', endpoint, data=body, headers=headers)
+
+
+def _ams_headers(access_token, content_format=json_acceptformat, accept=json_acceptformat,
+                 min_ds=dsversion_min):
+    '''Build the request headers for the Media Services REST API.'''
+    return {"Content-Type": content_format,
+            "DataServiceVersion": min_ds,
+            "MaxDataServiceVersion": dsversion_max,
+            "Accept": accept,
+            "Accept-Charset": charset,
+            "Authorization": "Bearer " + access_token,
+            "x-ms-version": xmsversion}
+
+
+async def _ams_send(method, endpoint, path, headers, body=None):
+    '''Send an AMS request, following the 301 redirect the first call can return.'''
+    kwargs = {'headers': headers}
+    if body is not None:
+        kwargs['data'] = body
+    response = await _send(method, endpoint, allow_redirects=False, **kwargs)
+    if response.status_code == 301:
+        redirected_url = ''.join([response.headers['location'], path])
+        response = await _send(method, redirected_url, **kwargs)
+    return response
+
+
+async def do_ams_auth(endpoint, body):
+    '''Acquire Media Services Authentication Token.
+
+    Args:
+        endpoint (str): Azure Media Services Initial Endpoint.
+        body (str): A Content Body.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    headers = {"content-type": "application/x-www-form-urlencoded",
+               "Accept": json_acceptformat}
+    return await _send('POST', endpoint, data=body, headers=headers)
+
+
+async def do_ams_get(endpoint, path, access_token):
+    '''Do a AMS HTTP GET request.
+
+    Args:
+        endpoint (str): Azure Media Services Initial Endpoint.
+        path (str): Azure Media Services Endpoint Path.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    return await _ams_send('GET', endpoint, path, _ams_headers(access_token))
+
+
+async def do_ams_put(endpoint, path, body, access_token, rformat="json",
+                     ds_min_version="3.0;NetFx"):
+    '''Do a AMS HTTP PUT request.
+
+    Args:
+        endpoint (str): Azure Media Services Initial Endpoint.
+        path (str): Azure Media Services Endpoint Path.
+        body  (str): Azure Media Services Content Body.
+        access_token (str): A valid Azure authentication token.
+        rformat (str): A required JSON Accept Format.
+        ds_min_version (str): A required DS MIN Version.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    if rformat == "json_only":
+        headers = _ams_headers(access_token, json_only_acceptformat, min_ds=ds_min_version)
+    else:
+        headers = _ams_headers(access_token)
+    return await _ams_send('PUT', endpoint, path, headers, body)
+
+
+async def do_ams_post(endpoint, path, body, access_token, rformat="json",
+                      ds_min_version="3.0;NetFx"):
+    '''Do a AMS HTTP POST request.
+
+    Args:
+        endpoint (str): Azure Media Services Initial Endpoint.
+        path (str): Azure Media Services Endpoint Path.
+        body  (str): Azure Media Services Content Body.
+        access_token (str): A valid Azure authentication token.
+        rformat (str): A required JSON Accept Format.
+        ds_min_version (str): A required DS MIN Version.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    if rformat == "json_only":
+        headers = _ams_headers(access_token, json_only_acceptformat, min_ds=ds_min_version)
+    elif rformat == "xml":
+        headers = _ams_headers(access_token, xml_acceptformat,
+                               xml_acceptformat + ",application/xml")
+    else:
+        headers = _ams_headers(access_token)
+    return await _ams_send('POST', endpoint, path, headers, body)
+
+
+async def do_ams_patch(endpoint, path, body, access_token):
+    '''Do a AMS PATCH request.
+
+    Args:
+        endpoint (str): Azure Media Services Initial Endpoint.
+        path (str): Azure Media Services Endpoint Path.
+        body  (str): Azure Media Services Content Body.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    return await _ams_send('PATCH', endpoint, path, _ams_headers(access_token), body)
+
+
+async def do_ams_delete(endpoint, path, access_token):
+    '''Do a AMS DELETE request.
+
+    Args:
+        endpoint (str): Azure Media Services Initial Endpoint.
+        path (str): Azure Media Services Endpoint Path.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    headers = _ams_headers(access_token)
+    del headers['Content-Type']
+    return await _ams_send('DELETE', endpoint, path, headers)
+
+
+async def do_ams_sto_put(endpoint, body, content_length):
+    '''Do a PUT request to the Azure Storage API.
+
+    Args:
+        endpoint (str): Azure Media Services Initial Endpoint.
+        body  (str): Azure Media Services Content Body.
+        content_length (str): Content_length.
+
+    Returns:
+        HTTP response. JSON body.
+    '''
+    headers = {"Accept": json_acceptformat,
+               "Accept-Charset": charset,
+               "x-ms-blob-type": "BlockBlob",
+               "x-ms-meta-m1": "v1",
+               "x-ms-meta-m2": "v2",
+               "x-ms-version": "2015-02-21",
+               "Content-Length": str(content_length)}
+    return await _send('PUT', endpoint, data=body, headers=headers)
@@ -0,0 +1,5 @@
+'''azurerm.aio storagerp - asyncio versions of the storagerp functions'''
+from .. import storagerp as _sync
+from .mirror import mirror_module
+
+globals().update(mirror_module(_sync))
@@ -0,0 +1,5 @@
+'''azurerm.aio subfns - asyncio versions of the subfns functions'''
+from .. import subfns as _sync
+from .mirror import mirror_module
+
+globals().update(mirror_module(_sync))
@@ -0,0 +1,127 @@
+'''clicache.py - in-memory view of the Azure CLI profile and token cache files
+
+get_access_token_from_cli() and get_subscription_from_cli() read ~/.azure/azureProfile.json and
+~/.azure/accessTokens.json. The functions here parse each file once, index it by subscription
+name and user, parse token expiry times up front, and only read the file again when its
+modification time or size changes.
+'''
+import io
+import json
+import os
+import threading
+from datetime import datetime as dt
+
+# parsed files by path: path -> ((mtime_ns, size), parsed view)
+_files = {}
+_files_lock = threading.Lock()
+
+
+def get_cli_path(file_name):
+    '''Get the path of a file in the Azure CLI configuration directory, ~/.azure.
+
+    Args:
+        file_name (str): File name, e.g. azureProfile.json.
+
+    Returns:
+        Path string.
+    '''
+    return os.path.expanduser('~') + os.sep + '.azure' + os.sep + file_name
+
+
+def _load(path, parse):
+    '''Return the parsed view of a file, parsing it again only if it has changed.
+
+    Returns None if the file does not exist.
+    '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _files.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with io.open(path, 'r', encoding='utf-8-sig') as file_fd:
+        view = parse(json.load(file_fd))
+    with _files_lock:
+        _files[path] = (version, view)
+    return view
+
+
+def _parse_expiry(expires_on):
+    '''Parse an accessTokens.json expiresOn value into a datetime.'''
+    if 'T' in expires_on:
+        return dt.strptime(expires_on, '%Y-%m-%dT%H:%M:%S.%fZ')
+    return dt.strptime(expires_on, '%Y-%m-%d %H:%M:%S.%f')
+
+
+class CliProfile:
+    '''Parsed azureProfile.json, indexed by subscription name.
+
+    Attributes:
+        subscriptions (list): The subscription entries, in file order.
+        default (dict): The first default subscription entry, or None.
+        default_user (str): User name of the last default subscription entry, or ''.
+        by_name (dict): First subscription entry for each subscription name.
+    '''
+    def __init__(self, profile):
+        self.subscriptions = profile.get('subscriptions', [])
+        self.default = None
+        self.default_user = ''
+        self.by_name = {}
+        for subscription_info in self.subscriptions:
+            if subscription_info.get('isDefault') is True:
+                if self.default is None:
+                    self.default = subscription_info
+                self.default_user = subscription_info['user']['name']
+            self.by_name.setdefault(subscription_info.get('name'), subscription_info)
+
+
+class CliTokens:
+    '''Parsed accessTokens.json, indexed by user, with expiry times parsed.
+
+    Attributes:
+        missing (str): Name of the first of accessToken, tokenType and expiresOn which the first
+            entry lacks, or None.
+        users (set): Every userId in the file.
+        by_user (dict): List of (expiry datetime, access token) for each userId, in file order.
+    '''
+    def __init__(self, keys):
+        self.missing = None
+        self.users = set(key.get('userId') for key in keys)
+        if keys:
+            for field in ('accessToken', 'tokenType', 'expiresOn'):
+                if field not in keys[0]:
+                    self.missing = field
+                    break
+        self.by_user = {}
+        for key in keys:
+            if 'accessToken' in key and 'expiresOn' in key:
+                self.by_user.setdefault(key.get('userId'), []).append(
+                    (_parse_expiry(key['expiresOn']), key['accessToken']))
+
+    def get_token(self, user):
+        '''Return the first unexpired access token for a user, or None.'''
+        now = dt.now()
+        for expiry, access_token in self.by_user.get(user, ()):
+            if expiry >= now:
+                return access_token
+        return None
+
+
+def get_cli_profile():
+    '''Get the parsed Azure CLI profile, reading azureProfile.json only if it has changed.
+
+    Returns:
+        A CliProfile object, or None if azureProfile.json does not exist.
+    '''
+    return _load(get_cli_path('azureProfile.json'), CliProfile)
+
+
+def get_cli_tokens():
+    '''Get the parsed Azure CLI token cache, reading accessTokens.json only if it has changed.
+
+    Returns:
+        A CliTokens object, or None if accessTokens.json does not exist.
+    '''
+    return _load(get_cli_path('accessTokens.json'), CliTokens)
@@ -0,0 +1,113 @@
+'''client.py - AzureRMClient, a client object which remembers its credential, subscription and
+cloud endpoints
+
+    client = azurerm.AzureRMClient(access_token, subscription_id)
+    vmss_list = client.list_vmss(rgname)
+    vm = client.get_vm(rgname, vm_name)
+
+The azurerm functions which take an access_token are available as methods of the client,
+without the access_token argument and, for those which take one, without the subscription_id
+argument. All other arguments are the same.
+'''
+import functools
+import importlib
+import inspect
+
+from .settings import get_auth_endpoint, get_resource_endpoint, get_rm_endpoint, use_endpoints
+
+_FILLED = ('access_token', 'subscription_id')
+
+
+class AzureRMClient:
+    '''Call azurerm functions with a stored credential, subscription and set of endpoints.
+
+    Endpoints are resolved once, when the client is created, and apply to calls made through
+    the client whatever the AZURE_*_ENDPOINT environment variables say later. Requests share
+    the pooled keep-alive sessions in restfns and the caches enabled there.
+
+    Args:
+        access_token (str): A valid Azure authentication token, or a function which returns
+            one, e.g. a credential which refreshes its token.
+        subscription_id (str): Optional Azure subscription id, passed to functions which take
+            one.
+        rm_endpoint (str): Optional Azure Resource Manager endpoint. Default get_rm_endpoint().
+        auth_endpoint (str): Optional Azure auth endpoint. Default get_auth_endpoint().
+        resource_endpoint (str): Optional Azure resource endpoint. Default
+            get_resource_endpoint().
+    '''
+    def __init__(self, access_token, subscription_id=None, rm_endpoint=None, auth_endpoint=None,
+                 resource_endpoint=None):
+        self.access_token = access_token
+        self.subscription_id = subscription_id
+        self.rm_endpoint = rm_endpoint or get_rm_endpoint()
+        self.auth_endpoint = auth_endpoint or get_auth_endpoint()
+        self.resource_endpoint = resource_endpoint or get_resource_endpoint()
+
+    def get_access_token(self):
+        '''Return the current access token of the client.'''
+        if callable(self.access_token):
+            return self.access_token()
+        return self.access_token
+
+    def endpoints(self):
+        '''Return a context manager which makes plain azurerm calls in a with block use the
+        endpoints of this client.'''
+        return use_endpoints(self.rm_endpoint, self.auth_endpoint, self.resource_endpoint)
+
+    def _bind(self, func):
+        '''Make a method from an azurerm function which takes an access_token.'''
+        signature = inspect.signature(func)
+        filled = [name for name in _FILLED if name in signature.parameters and
+                  (name == 'access_token' or self.subscription_id is not None)]
+        remaining = signature.replace(parameters=[
+            param for name, param in signature.parameters.items() if name not in filled])
+
+        def get_arguments(args, kwargs):
+            arguments = {name: kwargs.pop(name) for name in filled if name in kwargs}
+            arguments.update(remaining.bind(*args, **kwargs).arguments)
+            if 'access_token' not in arguments:
+                arguments['access_token'] = self.get_access_token()
+            if 'subscription_id' in filled and 'subscription_id' not in arguments:
+                arguments['subscription_id'] = self.subscription_id
+            # bound in the order of the full signature, so *args and **kwargs are passed through
+            return inspect.BoundArguments(signature, {
+                name: arguments[name] for name in signature.parameters if name in arguments})
+
+        if inspect.isgeneratorfunction(func):
+            # iter_* functions run as the caller iterates, so use the endpoints for each step
+            @functools.wraps(func)
+            def method(*args, **kwargs):
+                arguments = get_arguments(args, kwargs)
+                generator = func(*arguments.args, **arguments.kwargs)
+                while True:
+                    with self.endpoints():
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            return
+                    yield item
+        else:
+            @functools.wraps(func)
+            def method(*args, **kwargs):
+                arguments = get_arguments(args, kwargs)
+                with self.endpoints():
+                    return func(*arguments.args, **arguments.kwargs)
+        method.__signature__ = remaining
+        return method
+
+    def __getattr__(self, name):
+        package = importlib.import_module(__package__)
+        if name.startswith('_') or name not in package.__all__:
+            raise AttributeError("'AzureRMClient' object has no attribute '" + name + "'")
+        func = getattr(package, name)
+        if not inspect.isfunction(func) or \
+                'access_token' not in inspect.signature(func).parameters:
+            raise AttributeError("'AzureRMClient' object has no attribute '" + name + "'")
+        method = self._bind(func)
+        # cache the method on the instance so later lookups don't come back here
+        setattr(self, name, method)
+        return method
+
+    def __repr__(self):
+        return '<AzureRMClient subscription_id={} rm_endpoint={}>'.format(self.subscription_id,
+                                                                           self.rm_endpoint)
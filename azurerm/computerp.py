@@ -1,9 +1,101 @@
 '''computerp.py - azurerm functions for the Microsoft.Compute resource provider'''
 
+import concurrent.futures
+import functools
 import json
+import time
 
-from .restfns import do_delete, do_get, do_get_next, do_patch, do_post, do_put
-from .settings import COMP_API, NETWORK_API, get_rm_endpoint
+from .operations import OperationPoller
+from .restfns import do_delete, do_get, do_get_next, do_patch, do_post, do_put, iter_values, \
+    current_deadline, DeadlineExceeded, RequestCancelled, _run_under, _sleep
+from .settings import COMP_API, NETWORK_API, VMSS_BULK_CHUNK_SIZE, VMSS_BULK_WORKERS, \
+    VMSS_UPGRADE_PARALLEL_UDS, VMSS_UPGRADE_PARALLEL_FDS, VMSS_UPGRADE_HEALTH_TIMEOUT, \
+    LRO_POLL_INTERVAL, \
+    LRO_POLL_BACKOFF, LRO_MAX_POLL_INTERVAL, WATCH_MIN_INTERVAL, WATCH_MAX_INTERVAL, \
+    WATCH_BACKOFF, get_rm_endpoint
+
+
+def _run_vmss_chunk(action, access_token, subscription_id, resource_group, vmss_name, chunk,
+                    end):
+    '''Worker for bulk_vmss_vms(). Start the action for one chunk of instance ids and wait for
+    its long-running operation. Returns the chunk's entry in the report.
+
+    A chunk which would start after end isn't sent at all, and is reported as 'NotStarted'.
+    '''
+    report = {'instanceIds': chunk, 'status': 'NotStarted', 'error': None}
+    if end is not None and time.monotonic() >= end:
+        report['error'] = 'Timed out before the chunk was started'
+        return report
+    report['status'] = 'InProgress'
+    try:
+        response = action(access_token, subscription_id, resource_group, vmss_name,
+                          json.dumps(chunk))
+        poller = OperationPoller(response)
+        poller.wait(None if end is None else max(0.0, end - time.monotonic()))
+        report['status'] = poller.status
+        if poller.status != 'Succeeded':
+            report['error'] = poller.result
+    except TimeoutError as error:
+        report['error'] = str(error)
+    except (DeadlineExceeded, RequestCancelled):
+        raise
+    except Exception as error:  # e.g. a connection error, reported with the other failures
+        report['status'] = 'Failed'
+        report['error'] = str(error)
+    return report
+
+
+def bulk_vmss_vms(access_token, subscription_id, resource_group, vmss_name, action, instance_ids,
+                  chunk_size=VMSS_BULK_CHUNK_SIZE, max_concurrency=VMSS_BULK_WORKERS,
+                  timeout=None):
+    '''Run an action on many VMs in a scale set, in chunks of instance ids.
+
+    Large instance id lists are split into chunks of chunk_size, up to max_concurrency chunks
+    are started and tracked at once, and each chunk's long-running operation is waited for. A
+    chunk which fails doesn't stop the others.
+
+    E.g. bulk_vmss_vms(access_token, subscription_id, rgname, vmss_name, restart_vmss_vms,
+        range(1000))
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vmss_name (str): Name of the virtual machine scale set.
+        action (function): One of delete_vmss_vms, poweroff_vmss_vms, reimage_vmss_vms,
+            restart_vmss_vms, start_vmss_vms, stopdealloc_vmss_vms or upgrade_vmss_vms.
+        instance_ids (list): Instance ids, or a string representation of a JSON list of them.
+        chunk_size (int): Optional number of instance ids per request. Default
+            VMSS_BULK_CHUNK_SIZE.
+        max_concurrency (int): Optional maximum number of chunks in progress at once. Default
+            VMSS_BULK_WORKERS.
+        timeout (float): Optional maximum number of seconds to wait for all chunks. Chunks still
+            running then are reported with status 'InProgress', and chunks which hadn't started
+            are not sent and are reported with status 'NotStarted'.
+
+    Returns:
+        Dictionary with 'succeeded', 'failed', 'inProgress' and 'notStarted' lists of instance
+        ids, and a 'chunks' list with the 'instanceIds', 'status' and 'error' (the error body or
+        message) of each chunk, in order.
+    '''
+    if isinstance(instance_ids, str):
+        instance_ids = json.loads(instance_ids)
+    instance_ids = [str(instance_id) for instance_id in instance_ids]
+    chunks = [instance_ids[index:index + chunk_size]
+              for index in range(0, len(instance_ids), chunk_size)]
+    end = None if timeout is None else time.monotonic() + timeout
+    deadline = current_deadline()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [executor.submit(_run_under, deadline, _run_vmss_chunk, action, access_token,
+                                   subscription_id, resource_group, vmss_name, chunk, end)
+                   for chunk in chunks]
+        chunk_reports = [future.result() for future in futures]
+    result = {'succeeded': [], 'failed': [], 'inProgress': [], 'notStarted': [],
+              'chunks': chunk_reports}
+    lists = {'Succeeded': 'succeeded', 'InProgress': 'inProgress', 'NotStarted': 'notStarted'}
+    for report in chunk_reports:
+        result[lists.get(report['status'], 'failed')].extend(report['instanceIds'])
+    return result
 
 
 def create_as(access_token, subscription_id, resource_group, as_name,
@@ -563,6 +655,377 @@ def get_as(access_token, subscription_id, resource_group, as_name):
     return do_get(endpoint, access_token)
 
 
+def iter_as(access_token, subscription_id, resource_group):
+    '''Iterate over availability sets in a resource_group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each availability set.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Compute/availabilitySets',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_as_sub(access_token, subscription_id):
+    '''Iterate over availability sets in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each availability set.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Compute/availabilitySets',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vm_images_sub(access_token, subscription_id):
+    '''Iterate over VM images in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each VM image.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Compute/images',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vms(access_token, subscription_id, resource_group):
+    '''Iterate over VMs in a resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each VM model view.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Compute/virtualMachines',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vms_sub(access_token, subscription_id):
+    '''Iterate over VMs in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each VM model view.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Compute/virtualMachines',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vmss(access_token, subscription_id, resource_group):
+    '''Iterate over VM Scale Sets in a resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each VM scale set.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Compute/virtualMachineScaleSets',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vmss_skus(access_token, subscription_id, resource_group, vmss_name):
+    '''Iterate over the VM skus available for a VM Scale Set.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vmss_name (str): Name of the virtual machine scale set.
+
+    Yields:
+        JSON body of each available VM sku.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Compute/virtualMachineScaleSets/', vmss_name,
+                        '/skus',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vmss_sub(access_token, subscription_id):
+    '''Iterate over VM Scale Sets in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each VM scale set.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Compute/virtualMachineScaleSets',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vmss_vm_instance_view(access_token, subscription_id, resource_group, vmss_name,
+                               prefetch=0):
+    '''Iterate over the instance views for all the VMs in a VM scale set.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vmss_name (str): Name of the virtual machine scale set.
+        prefetch (int): Optional number of pages to fetch ahead in a background thread.
+
+    Yields:
+        JSON body of each VM instance view.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Compute/virtualMachineScaleSets/', vmss_name,
+                        '/virtualMachines?$expand=instanceView&$select=instanceView&api-version=',
+                        COMP_API])
+    return iter_values(endpoint, access_token, prefetch)
+
+
+def iter_vmss_vms_expanded(access_token, subscription_id, resource_group, vmss_name, prefetch=0):
+    '''Iterate over the VMs in a VM scale set, with both their model and instance view.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vmss_name (str): Name of the virtual machine scale set.
+        prefetch (int): Optional number of pages to fetch ahead in a background thread.
+
+    Yields:
+        JSON body of each VM, with its instance view in properties.instanceView.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Compute/virtualMachineScaleSets/', vmss_name,
+                        '/virtualMachines?$expand=instanceView&api-version=', COMP_API])
+    return iter_values(endpoint, access_token, prefetch)
+
+
+def iter_vmss_vms(access_token, subscription_id, resource_group, vmss_name, prefetch=0):
+    '''Iterate over the VMs in a VM Scale Set.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vmss_name (str): Name of the virtual machine scale set.
+        prefetch (int): Optional number of pages to fetch ahead in a background thread.
+
+    Yields:
+        JSON body of each VM model view.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Compute/virtualMachineScaleSets/', vmss_name,
+                        '/virtualMachines',
+                        '?api-version=', COMP_API])
+    return iter_values(endpoint, access_token, prefetch)
+
+
+# power states of a VM which is changing state, watched at the shortest interval
+_TRANSITION_POWER_STATES = ('PowerState/starting', 'PowerState/stopping',
+                            'PowerState/deallocating')
+
+
+class InstanceViewWatcher:
+    '''Poll the instance view of a VM, of the VMs in a scale set, or of a scale set, and
+    report only what changed.
+
+    The last known status codes of each instance (e.g. 'ProvisioningState/succeeded',
+    'PowerState/running') are kept, and each poll returns change events for instances which
+    were added, removed, or whose status codes changed. The poll interval drops to min_interval
+    while anything is changing or in transition (e.g. updating or starting), and grows by
+    WATCH_BACKOFF up to max_interval while everything is stable. E.g.
+
+        watcher = azurerm.InstanceViewWatcher(access_token, subscription_id, rgname,
+                                              vmss_name=vmssname)
+        for event in watcher.watch():
+            print(event['id'], event['change'], event['powerState'])
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vm_name (str): Name of a VM to watch, with get_vm_instance_view().
+        vmss_name (str): Name of a scale set to watch. Its VMs are watched with
+            list_vmss_vm_instance_view(), or the scale set itself with get_vmss_instance_view()
+            if instances is False.
+        instances (bool): Optional. Watch each VM in the scale set (the default), or only the
+            scale set's own instance view.
+        min_interval (float): Optional shortest poll interval in seconds. Default
+            WATCH_MIN_INTERVAL.
+        max_interval (float): Optional longest poll interval in seconds. Default
+            WATCH_MAX_INTERVAL.
+
+    Attributes:
+        state (dict): Tuple of the last known status codes of each instance, by instance id
+            (the VM or scale set name for a single instance view).
+        last_error (dict): The error body of the last poll if it failed, else None.
+    '''
+    def __init__(self, access_token, subscription_id, resource_group, vm_name=None,
+                 vmss_name=None, instances=True, min_interval=WATCH_MIN_INTERVAL,
+                 max_interval=WATCH_MAX_INTERVAL):
+        if (vm_name is None) == (vmss_name is None):
+            raise ValueError('Give one of vm_name or vmss_name')
+        self.access_token = access_token
+        self.subscription_id = subscription_id
+        self.resource_group = resource_group
+        self.vm_name = vm_name
+        self.vmss_name = vmss_name
+        self.instances = instances
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.next_poll = time.monotonic()
+        self.state = {}
+        self.last_error = None
+
+    def _instance_views(self):
+        '''Yield the id, instance view (None if the request failed) and JSON body of each
+        instance.'''
+        if self.vm_name is not None or not self.instances:
+            if self.vm_name is not None:
+                name, body = self.vm_name, get_vm_instance_view(
+                    self.access_token, self.subscription_id, self.resource_group, self.vm_name)
+            else:
+                name, body = self.vmss_name, get_vmss_instance_view(
+                    self.access_token, self.subscription_id, self.resource_group, self.vmss_name)
+            yield name, body if 'statuses' in body else None, body
+            return
+        for vm in iter_vmss_vm_instance_view(self.access_token, self.subscription_id,
+                                             self.resource_group, self.vmss_name):
+            if 'instanceId' not in vm:
+                yield None, None, vm
+                return
+            yield vm['instanceId'], vm.get('properties', {}).get('instanceView', {}), vm
+
+    def _fetch(self):
+        '''Get the current status codes of each instance, or None and set last_error.'''
+        current = {}
+        for instance_id, view, body in self._instance_views():
+            if view is None:
+                self.last_error = body
+                return None
+            # a status without a code has nothing to compare or report
+            current[instance_id] = tuple(status['code'] for status in view.get('statuses', [])
+                                         if status.get('code'))
+        self.last_error = None
+        return current
+
+    @staticmethod
+    def _event(instance_id, change, codes):
+        event = {'id': instance_id, 'change': change, 'statuses': list(codes),
+                 'provisioningState': None, 'powerState': None}
+        for code in codes:
+            if code.startswith('ProvisioningState/'):
+                event['provisioningState'] = code[len('ProvisioningState/'):].lower()
+            elif code.startswith('PowerState/'):
+                event['powerState'] = code[len('PowerState/'):].lower()
+        return event
+
+    def poll(self):
+        '''Get the instance views now and compare them with the last known state.
+
+        Returns:
+            List of change events. Each is a dictionary with the instance 'id', the 'change'
+            ('added', 'changed' or 'removed'), and the new 'statuses' codes,
+            'provisioningState' and 'powerState' (the last known ones for 'removed'). The first
+            poll reports every instance as 'added'. A failed poll returns no events and sets
+            last_error.
+        '''
+        current = self._fetch()
+        events = []
+        if current is not None:
+            for instance_id, codes in current.items():
+                old_codes = self.state.get(instance_id)
+                if old_codes is None:
+                    events.append(self._event(instance_id, 'added', codes))
+                elif old_codes != codes:
+                    events.append(self._event(instance_id, 'changed', codes))
+            for instance_id in self.state.keys() - current.keys():
+                events.append(self._event(instance_id, 'removed', self.state[instance_id]))
+            transition = any(
+                code in _TRANSITION_POWER_STATES or (code.startswith('ProvisioningState/') and
+                                                     code not in ('ProvisioningState/succeeded',
+                                                                  'ProvisioningState/failed'))
+                for codes in current.values() for code in codes)
+            self.state = current
+            if events or transition:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * WATCH_BACKOFF, self.max_interval)
+        self.next_poll = time.monotonic() + self.interval
+        return events
+
+    def delay(self):
+        '''Return the number of seconds until the next poll is due.'''
+        return max(0.0, self.next_poll - time.monotonic())
+
+    def watch(self, timeout=None):
+        '''Poll whenever the next poll is due and yield the change events.
+
+        Args:
+            timeout (float): Optional number of seconds after which to stop. Default: watch
+                until the caller stops iterating.
+
+        Yields:
+            Change events, see poll().
+        '''
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            delay = self.delay()
+            if end is not None and time.monotonic() + delay > end:
+                return
+            _sleep(delay)
+            for event in self.poll():
+                yield event
+
+
 def list_as(access_token, subscription_id, resource_group):
     '''List availability sets in a resource_group.
 
@@ -957,6 +1420,208 @@ def restart_vmss_vms(access_token, subscription_id, resource_group, vmss_name, i
     return do_post(endpoint, body, access_token)
 
 
+def _vmss_vm_status(vm):
+    '''Return the instance id, update domain, fault domain, provisioning state and power state
+    of a VMSS VM listed with its instance view. States are lower case, e.g. 'running'.'''
+    properties = vm.get('properties', {})
+    instance_view = properties.get('instanceView', {})
+    provisioning_state = properties.get('provisioningState')
+    power_state = None
+    for status in instance_view.get('statuses', []):
+        code = status.get('code', '')
+        if code.startswith('ProvisioningState/'):
+            provisioning_state = code[len('ProvisioningState/'):]
+        elif code.startswith('PowerState/'):
+            power_state = code[len('PowerState/'):]
+    return (vm.get('instanceId'), instance_view.get('platformUpdateDomain'),
+            instance_view.get('platformFaultDomain'),
+            None if provisioning_state is None else provisioning_state.lower(),
+            None if power_state is None else power_state.lower())
+
+
+def _vmss_vm_healthy(vm):
+    '''Default health check for rolling_upgrade_vmss(): provisioned and running.'''
+    _, _, _, provisioning_state, power_state = _vmss_vm_status(vm)
+    return provisioning_state == 'succeeded' and power_state == 'running'
+
+
+def _vmss_vm_health(access_token, subscription_id, resource_group, vmss_name, instance_id,
+                    health_check):
+    '''Worker for _wait_until_healthy(). Return True if one VM passes the health check.'''
+    try:
+        instance_view = get_vmss_vm_instance_view(access_token, subscription_id, resource_group,
+                                                  vmss_name, instance_id)
+    except (DeadlineExceeded, RequestCancelled):
+        raise
+    except Exception:  # e.g. a connection error: still unhealthy, try again next poll
+        return False
+    if 'error' in instance_view:
+        return False
+    # shaped like a VM listed by list_vmss_vm_instance_view(), for the health check
+    return bool(health_check({'instanceId': instance_id,
+                              'properties': {'instanceView': instance_view}}))
+
+
+def _wait_until_healthy(access_token, subscription_id, resource_group, vmss_name, instance_ids,
+                        timeout, health_check):
+    '''Poll the instance views of the given VMs until they pass the health check.
+
+    Only the VMs still unhealthy are fetched each poll, VMSS_BULK_WORKERS at a time.
+
+    Returns:
+        Sorted list of the instance ids which were still unhealthy after timeout seconds.
+    '''
+    pending = set(instance_ids)
+    end = time.monotonic() + timeout
+    interval = LRO_POLL_INTERVAL
+    deadline = current_deadline()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=VMSS_BULK_WORKERS) as executor:
+        while True:
+            checked = sorted(pending, key=int)
+            healthy = executor.map(functools.partial(
+                _run_under, deadline, _vmss_vm_health, access_token, subscription_id,
+                resource_group, vmss_name, health_check=health_check), checked)
+            for instance_id, passed in zip(checked, healthy):
+                if passed:
+                    pending.discard(instance_id)
+            remaining = end - time.monotonic()
+            if not pending or remaining <= 0:
+                return sorted(pending, key=int)
+            _sleep(min(interval, remaining))
+            interval = min(interval * LRO_POLL_BACKOFF, LRO_MAX_POLL_INTERVAL)
+
+
+def _domain_order(domain):
+    '''Sort key for update and fault domains, with unknown (None) domains last.'''
+    return (domain is None, domain)
+
+
+def rolling_upgrade_vmss(access_token, subscription_id, resource_group, vmss_name,
+                         max_parallel_uds=VMSS_UPGRADE_PARALLEL_UDS,
+                         max_parallel_fds=VMSS_UPGRADE_PARALLEL_FDS,
+                         health_timeout=VMSS_UPGRADE_HEALTH_TIMEOUT, health_check=None,
+                         progress=None):
+    '''Upgrade the VMs in a scale set to the latest model, a few update domains at a time.
+
+    The VMs and their instance views are listed once to index them by update domain and fault
+    domain. Update domains are upgraded in order, max_parallel_uds at a time. With
+    max_parallel_fds, the VMs of a batch of update domains are upgraded in steps which each
+    take down VMs in at most that many fault domains. After each step the instance views of the
+    upgraded VMs are polled until they are healthy, and the upgrade stops if a step fails or
+    stays unhealthy for health_timeout seconds. VMs which already run the latest model are
+    skipped, so calling this again after an interruption carries on where it stopped.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vmss_name (str): Name of the virtual machine scale set.
+        max_parallel_uds (int): Optional number of update domains upgraded at once. Default
+            VMSS_UPGRADE_PARALLEL_UDS.
+        max_parallel_fds (int): Optional number of fault domains with VMs being upgraded at
+            once. Default VMSS_UPGRADE_PARALLEL_FDS, None for no limit.
+        health_timeout (float): Optional seconds to wait for a step to become healthy. Default
+            VMSS_UPGRADE_HEALTH_TIMEOUT.
+        health_check (function): Optional function which takes a VM JSON body with its
+            instance view, as listed by list_vmss_vm_instance_view(), and returns True if it is
+            healthy. Default: provisioning succeeded and power state running.
+        progress (function): Optional function called with each update domain's entry in the
+            report when it finishes.
+
+    Returns:
+        Dictionary with 'status' ('Succeeded', 'Failed' or 'Unhealthy'), lists of 'upgraded',
+        'skipped' and 'failed' instance ids, and an 'updateDomains' list with the
+        'updateDomain', 'instanceIds', 'faultDomains' (instance ids by fault domain), 'status'
+        and 'error' of each update domain to upgrade. An update domain's status is
+        'NotStarted' if none of its VMs were upgraded, and 'Partial' if the upgrade stopped
+        after upgrading only some of them.
+        If the VMs can't be listed, 'status' is 'Failed' and 'error' is the error body.
+    '''
+    if health_check is None:
+        health_check = _vmss_vm_healthy
+    report = {'status': 'Succeeded', 'upgraded': [], 'skipped': [], 'failed': [],
+              'updateDomains': []}
+    # instance ids by update domain, then fault domain
+    domains = {}
+    for vm in iter_vmss_vms_expanded(access_token, subscription_id, resource_group, vmss_name):
+        if 'instanceId' not in vm:
+            report['status'] = 'Failed'
+            report['error'] = vm
+            return report
+        if vm['properties'].get('latestModelApplied', False):
+            report['skipped'].append(vm['instanceId'])
+            continue
+        _, update_domain, fault_domain, _, _ = _vmss_vm_status(vm)
+        domains.setdefault(update_domain, {}).setdefault(fault_domain, []).append(
+            vm['instanceId'])
+    entries = []
+    for update_domain in sorted(domains, key=_domain_order):
+        fault_domains = {fault_domain: sorted(instance_ids, key=int) for fault_domain,
+                         instance_ids in sorted(domains[update_domain].items(),
+                                                key=lambda item: _domain_order(item[0]))}
+        entries.append({'updateDomain': update_domain,
+                        'instanceIds': sorted((instance_id for instance_ids in
+                                               fault_domains.values()
+                                               for instance_id in instance_ids), key=int),
+                        'faultDomains': fault_domains, 'status': 'NotStarted', 'error': None})
+    report['updateDomains'] = entries
+    deadline = current_deadline()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_parallel_uds) as executor:
+        for start in range(0, len(entries), max_parallel_uds):
+            batch = entries[start:start + max_parallel_uds]
+            batch_fds = sorted({fault_domain for entry in batch
+                                for fault_domain in entry['faultDomains']}, key=_domain_order)
+            step = max_parallel_fds or len(batch_fds)
+            for fd_start in range(0, len(batch_fds), step):
+                fault_domains = batch_fds[fd_start:fd_start + step]
+                work = [(entry, sorted((instance_id for fault_domain in fault_domains
+                                        for instance_id in entry['faultDomains'].get(
+                                            fault_domain, [])), key=int))
+                        for entry in batch]
+                work = [(entry, instance_ids) for entry, instance_ids in work if instance_ids]
+                futures = [executor.submit(_run_under, deadline, _run_vmss_chunk,
+                                           upgrade_vmss_vms, access_token, subscription_id,
+                                           resource_group, vmss_name, instance_ids, None)
+                           for _, instance_ids in work]
+                chunks = [future.result() for future in futures]
+                upgraded = [instance_id for chunk in chunks if chunk['status'] == 'Succeeded'
+                            for instance_id in chunk['instanceIds']]
+                unhealthy = _wait_until_healthy(access_token, subscription_id, resource_group,
+                                                vmss_name, upgraded, health_timeout,
+                                                health_check) if upgraded else []
+                for (entry, instance_ids), chunk in zip(work, chunks):
+                    status, error = chunk['status'], chunk['error']
+                    if status == 'Succeeded' and set(instance_ids).intersection(unhealthy):
+                        status = 'Unhealthy'
+                        error = 'Unhealthy instances: ' + ', '.join(
+                            instance_id for instance_id in unhealthy
+                            if instance_id in instance_ids)
+                    if status == 'Succeeded':
+                        report['upgraded'].extend(instance_ids)
+                        continue
+                    report['failed'].extend(instance_ids)
+                    if entry['status'] == 'NotStarted':
+                        entry['status'], entry['error'] = status, error
+                    if status == 'Unhealthy':
+                        if report['status'] == 'Succeeded':
+                            report['status'] = 'Unhealthy'
+                    else:
+                        report['status'] = 'Failed'
+                if report['status'] != 'Succeeded':
+                    break
+            upgraded = set(report['upgraded'])
+            for entry in batch:
+                if entry['status'] == 'NotStarted' and upgraded.intersection(entry['instanceIds']):
+                    # the upgrade may have stopped before reaching all of its fault domains
+                    entry['status'] = 'Succeeded' if upgraded.issuperset(entry['instanceIds']) \
+                        else 'Partial'
+                if progress is not None:
+                    progress(entry)
+            if report['status'] != 'Succeeded':
+                break
+    return report
+
+
 def scale_vmss(access_token, subscription_id, resource_group, vmss_name, capacity):
     '''Change the instance count of an existing VM Scale Set.
 
@@ -1113,6 +1778,51 @@ def stop_vm(access_token, subscription_id, resource_group, vm_name, skip_shutdow
     return do_post(endpoint, body, access_token)
 
 
+def summarize_vmss_vms(access_token, subscription_id, resource_group, vmss_name, prefetch=1,
+                       health_check=None):
+    '''Count the VMs in a scale set by power state, provisioning state, update domain and fault
+    domain, in one pass over the paged instance view listing.
+
+    Only one page of instance views is held in memory at a time (plus prefetch pages), so the
+    memory used doesn't grow with the size of the scale set, apart from the unhealthy list.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vmss_name (str): Name of the virtual machine scale set.
+        prefetch (int): Optional number of pages to fetch ahead while the current page is
+            counted. Default 1.
+        health_check (function): Optional function which takes a VM JSON body with its
+            instance view, as listed by list_vmss_vm_instance_view(), and returns True if it is
+            healthy. Default: provisioning succeeded and power state running.
+
+    Returns:
+        Dictionary with the 'total' number of VMs, dictionaries of counts by 'powerState',
+        'provisioningState' (lower case states, e.g. 'running'), 'updateDomain' and
+        'faultDomain', and an 'unhealthy' list of instance ids. If listing fails part way,
+        'error' is the error body and the counts cover the VMs listed before it.
+    '''
+    if health_check is None:
+        health_check = _vmss_vm_healthy
+    summary = {'total': 0, 'powerState': {}, 'provisioningState': {}, 'updateDomain': {},
+               'faultDomain': {}, 'unhealthy': []}
+    counts = (summary['updateDomain'], summary['faultDomain'], summary['provisioningState'],
+              summary['powerState'])
+    for vm in iter_vmss_vm_instance_view(access_token, subscription_id, resource_group,
+                                         vmss_name, prefetch):
+        if 'instanceId' not in vm:
+            summary['error'] = vm
+            break
+        status = _vmss_vm_status(vm)
+        summary['total'] += 1
+        for count, value in zip(counts, status[1:]):
+            count[value] = count.get(value, 0) + 1
+        if not health_check(vm):
+            summary['unhealthy'].append(status[0])
+    return summary
+
+
 def update_vm(access_token, subscription_id, resource_group, vm_name, body):
     '''Update a virtual machine with a new JSON body. E.g. do a GET, change something, call this.
 
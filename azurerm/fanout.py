@@ -0,0 +1,134 @@
+'''fanout.py - run an azurerm list function across many subscriptions at once
+
+Inventory jobs call the same list function, e.g. list_vms_sub() or iter_storage_accounts_sub(),
+for every subscription an account can see. fan_out() runs those calls on a bounded pool of
+threads and streams the merged results back as they arrive, tagged with their subscription id.
+Requests for each subscription are paced by that subscription's rate limiting token buckets
+(ratelimit.py), so one large subscription can't use up the budget of the others. A subscription
+which fails is reported at the end instead of stopping the sweep.
+'''
+import concurrent.futures
+import queue
+import threading
+
+from .restfns import current_deadline, DeadlineExceeded, RequestCancelled, _run_under
+from .settings import FAN_OUT_WORKERS, FAN_OUT_QUEUE_SIZE
+
+_DONE = object()
+
+
+class FanOutError(Exception):
+    '''Raised by fan_out() at the end of a sweep in which some subscriptions failed.
+
+    Attributes:
+        errors (dict): The exception, or the JSON error body, for each failed subscription id.
+    '''
+    def __init__(self, errors):
+        super().__init__(str(len(errors)) + ' subscriptions failed: ' + ', '.join(sorted(errors)))
+        self.errors = errors
+
+
+def _is_error(body):
+    '''Return True if a JSON body is an Azure error response rather than a list item.'''
+    return isinstance(body, dict) and 'error' in body and 'id' not in body
+
+
+def _list_subscription(list_function, access_token, subscription_id, args, kwargs, results,
+                       stop):
+    '''Worker for fan_out(). Put (subscription_id, item) tuples on the results queue, then
+    (subscription_id, _DONE, error).'''
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    error = None
+    try:
+        if stop.is_set():
+            return
+        if callable(access_token):
+            access_token = access_token(subscription_id)
+        response = list_function(access_token, subscription_id, *args, **kwargs)
+        if isinstance(response, dict):
+            # a list_* function: a JSON body with a value list, or an error body
+            if 'value' not in response:
+                error = response
+                return
+            response = response['value']
+        for item in response:
+            if _is_error(item):
+                error = item
+                return
+            put((subscription_id, item))
+            if stop.is_set():
+                return
+    except Exception as exception:  # reported to the caller with the other failures
+        error = exception
+    finally:
+        put((subscription_id, _DONE, error))
+
+
+def fan_out(list_function, access_token, subscriptions, *args, errors=None,
+            max_workers=FAN_OUT_WORKERS, **kwargs):
+    '''Call a list function for many subscriptions at once and yield the merged results.
+
+    E.g. for subscription_id, vm in fan_out(list_vms_sub, access_token, subscription_ids): ...
+
+    Args:
+        list_function (function): An azurerm function which takes access_token and
+            subscription_id as its first two arguments and returns a JSON list (e.g.
+            list_vms_sub) or yields list items (e.g. iter_vms_sub).
+        access_token (str): A valid Azure authentication token, or a function which takes a
+            subscription id and returns a token for it, e.g.
+            lambda subscription_id: pool.get_token(subscription_id=subscription_id) for a
+            CredentialPool.
+        subscriptions (list): Subscription ids, or subscription JSON bodies as returned by
+            list_subscriptions().
+        args: Any other arguments to pass to list_function.
+        errors (dict): Optional dictionary to record failed subscriptions in, by subscription id,
+            instead of raising FanOutError.
+        max_workers (int): Maximum number of subscriptions listed at once. Default
+            FAN_OUT_WORKERS.
+        kwargs: Any other keyword arguments to pass to list_function.
+
+    Yields:
+        A (subscription_id, item) tuple for each list item, in the order they arrive.
+
+    Raises:
+        FanOutError: After all the other results have been yielded, if any subscription failed
+            and errors is None.
+        DeadlineExceeded: If the caller's Deadline passes during the sweep.
+    '''
+    subscription_ids = [subscription['subscriptionId'] if isinstance(subscription, dict)
+                        else subscription for subscription in subscriptions]
+    failures = {} if errors is None else errors
+    results = queue.Queue(maxsize=FAN_OUT_QUEUE_SIZE)
+    stop = threading.Event()
+    deadline = current_deadline()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for subscription_id in subscription_ids:
+            executor.submit(_run_under, deadline, _list_subscription, list_function,
+                            access_token, subscription_id, args, kwargs, results, stop)
+        running = len(subscription_ids)
+        while running:
+            result = results.get()
+            if len(result) == 2:
+                yield result
+                continue
+            subscription_id, _, error = result
+            running -= 1
+            # the time allowed for the whole sweep has run out, so don't wait for the others
+            if isinstance(error, (DeadlineExceeded, RequestCancelled)):
+                raise error
+            if error is not None:
+                failures[subscription_id] = error
+    finally:
+        # stops the workers if the caller abandons the iterator early
+        stop.set()
+        executor.shutdown(wait=False)
+    if failures and errors is None:
+        raise FanOutError(failures)
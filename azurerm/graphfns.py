@@ -2,11 +2,16 @@
    
      - Some functions depend on Azure cloud shell/Azure VMs for MSI endpoint
 '''
-import requests
-import os
+import threading
 
+from .msifns import get_msi_token
+from .restfns import get_session, get_timeouts
 from .settings import GRAPH_RESOURCE_HOST
 
+# object ids looked up by get_object_id_from_graph(), by access token
+_object_ids = {}
+_object_ids_lock = threading.Lock()
+
 
 def get_graph_token_from_msi():
     '''get a Microsoft Graph access token using Azure Cloud Shell's MSI_ENDPOINT.
@@ -15,19 +20,12 @@ def get_graph_token_from_msi():
         The auth token returned by this function is not an Azure auth token. Use it for querying
         the Microsoft Graph API.
         This function only works in an Azure cloud shell or virtual machine.
+        The token is cached until shortly before it expires, see get_msi_token().
 
     Returns:
         A Microsoft Graph authentication token string.
     '''
-    if 'ACC_CLOUD' in os.environ and 'MSI_ENDPOINT' in os.environ:
-        endpoint = os.environ['MSI_ENDPOINT']
-    else:
-        return None
-    
-    headers = {'Metadata': 'true'}
-    body = {"resource": 'https://' + GRAPH_RESOURCE_HOST + '/'}
-    ret = requests.post(endpoint, headers=headers, data=body)
-    return ret.json()['access_token']
+    return get_msi_token('https://' + GRAPH_RESOURCE_HOST + '/')
 
 
 def get_object_id_from_graph(access_token=None):
@@ -38,12 +36,21 @@ def get_object_id_from_graph(access_token=None):
                             If not provided, attempt to get it from MSI_ENDPOINT.
 
     Returns:
-        An object ID string for a user or service principal.
+        An object ID string for a user or service principal. Looked up once per access token.
     '''
     if access_token is None:
         access_token = get_graph_token_from_msi()
+    object_id = _object_ids.get(access_token)
+    if object_id is not None:
+        return object_id
 
     endpoint = 'https://' + GRAPH_RESOURCE_HOST + '/v1.0/me/'
     headers = {'Authorization': 'Bearer ' + access_token, 'Host': GRAPH_RESOURCE_HOST}
-    ret = requests.get(endpoint, headers=headers)
-    return ret.json()['id']
+    ret = get_session(endpoint).get(endpoint, headers=headers, timeout=get_timeouts())
+    object_id = ret.json()['id']
+    with _object_ids_lock:
+        # tokens are replaced about once an hour, so only keep a few
+        if len(_object_ids) >= 16:
+            _object_ids.clear()
+        _object_ids[access_token] = object_id
+    return object_id
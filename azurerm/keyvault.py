@@ -1,7 +1,7 @@
 '''keyvault.py - azurerm functions for the Microsoft.Keyvault resource provider'''
 import datetime
 import json
-from .restfns import do_delete, do_get, do_get_next, do_put, do_post
+from .restfns import do_delete, do_get, do_get_next, do_put, do_post, iter_values
 from .subfns import list_tenants
 from .settings import get_rm_endpoint, KEYVAULT_API
 
@@ -96,6 +96,42 @@ def get_keyvault(access_token, subscription_id, rgname, vault_name):
     return do_get(endpoint, access_token)
 
 
+def iter_keyvaults(access_token, subscription_id, rgname):
+    '''Iterate over key vaults in the named resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        rgname (str): Azure resource group name.
+
+    Yields:
+        JSON body of each key vault.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourcegroups/', rgname,
+                        '/providers/Microsoft.KeyVault/vaults',
+                        '?api-version=', KEYVAULT_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_keyvaults_sub(access_token, subscription_id):
+    '''Iterate over key vaults belonging to this subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each key vault.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.KeyVault/vaults',
+                        '?api-version=', KEYVAULT_API])
+    return iter_values(endpoint, access_token)
+
+
 def list_keyvaults(access_token, subscription_id, rgname):
     '''Lists key vaults in the named resource group.
 
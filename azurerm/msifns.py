@@ -0,0 +1,86 @@
+'''msifns.py - managed identity (MSI) token functions for azurerm
+
+In Azure Cloud Shell tokens come from the MSI_ENDPOINT. Only Cloud Shell is supported:
+get_msi_endpoint() needs both ACC_CLOUD and MSI_ENDPOINT to be set, and the Instance Metadata
+Service endpoint of VMs with a managed identity expects a GET, not the POST sent here. Tokens
+are cached per endpoint and resource until shortly before they expire, so helpers like
+get_access_token_from_cli() and get_graph_token_from_msi() only call the endpoint once an hour.
+
+Token requests use the pooled sessions and timeouts of restfns but not _send(), so the calling
+thread's Deadline and the rate limiter don't apply to them.
+'''
+import os
+import threading
+import time
+
+from .restfns import get_session, get_timeouts
+from .settings import TOKEN_REFRESH_MARGIN
+
+# cached MSI tokens by (endpoint, resource): (token, time to get a new one)
+_msi_tokens = {}
+_msi_lock = threading.Lock()
+
+
+def get_msi_endpoint():
+    '''Get the managed identity endpoint of the Azure Cloud Shell this is running in.
+
+    Returns:
+        The MSI_ENDPOINT URL string, or None if not running in Azure Cloud Shell.
+    '''
+    if 'ACC_CLOUD' in os.environ and 'MSI_ENDPOINT' in os.environ:
+        return os.environ['MSI_ENDPOINT']
+    return None
+
+
+def _token_lifetime(token_response):
+    '''Return the seconds until an MSI token expires, from expires_on or expires_in.'''
+    try:
+        return float(token_response['expires_on']) - time.time()
+    except (KeyError, ValueError):
+        pass
+    try:
+        return float(token_response['expires_in'])
+    except (KeyError, ValueError):
+        return 0.0
+
+
+def get_msi_token(resource, endpoint=None):
+    '''Get a managed identity access token for a resource, from a cache if one is still valid.
+
+    Args:
+        resource (str): Resource to get a token for, e.g. https://management.azure.com/.
+        endpoint (str): Optional MSI endpoint. Default get_msi_endpoint().
+
+    Returns:
+        An access token string, or None if there is no MSI endpoint.
+    '''
+    endpoint = endpoint or get_msi_endpoint()
+    if endpoint is None:
+        return None
+    key = (endpoint, resource)
+    cached = _msi_tokens.get(key)
+    if cached is not None and time.time() < cached[1]:
+        return cached[0]
+    with _msi_lock:
+        # another thread may have got a token while this one waited for the lock
+        cached = _msi_tokens.get(key)
+        if cached is not None and time.time() < cached[1]:
+            return cached[0]
+        headers = {'Metadata': 'true'}
+        body = {"resource": resource}
+        ret = get_session(endpoint).post(endpoint, headers=headers, data=body,
+                                         timeout=get_timeouts())
+        token_response = ret.json()
+        access_token = token_response['access_token']
+        lifetime = _token_lifetime(token_response)
+        if lifetime > 0:
+            _msi_tokens[key] = (access_token,
+                                time.time() + max(lifetime - TOKEN_REFRESH_MARGIN, lifetime / 2))
+        return access_token
+
+
+def clear_msi_tokens():
+    '''Drop all cached managed identity tokens.
+    '''
+    with _msi_lock:
+        _msi_tokens.clear()
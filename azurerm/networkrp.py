@@ -1,6 +1,6 @@
 '''networkrp.py - azurerm functions for the Microsoft.Network resource provider'''
 import json
-from .restfns import do_delete, do_get, do_put
+from .restfns import do_delete, do_get, do_put, iter_values
 from .settings import get_rm_endpoint, NETWORK_API
 
 
@@ -459,6 +459,225 @@ def get_vnet(access_token, subscription_id, resource_group, vnet_name):
     return do_get(endpoint, access_token)
 
 
+def iter_asgs(access_token, subscription_id, resource_group):
+    '''Iterate over the application security groups in a resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each application security group.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Network/applicationSecurityGroups',
+                        '?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_asgs_all(access_token, subscription_id):
+    '''Iterate over the application security groups in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each application security group.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Network/applicationSecurityGroups',
+                        '?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_lb_nat_rules(access_token, subscription_id, resource_group, lb_name):
+    '''Iterate over the inbound NAT rules for a load balancer.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        lb_name (str): Name of the load balancer.
+
+    Yields:
+        JSON body of each inbound NAT rule.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Network/loadBalancers/', lb_name,
+                        '/inboundNatRules?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_load_balancers(access_token, subscription_id):
+    '''Iterate over the load balancers in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each load balancer.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Network/',
+                        '/loadBalancers?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_load_balancers_rg(access_token, subscription_id, resource_group):
+    '''Iterate over the load balancers in a resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each load balancer.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Network/',
+                        '/loadBalancers?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_nics(access_token, subscription_id):
+    '''Iterate over the network interfaces in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each network interface.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Network/',
+                        '/networkInterfaces?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_nics_rg(access_token, subscription_id, resource_group):
+    '''Iterate over network interface cards within a resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each network interface.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Network/',
+                        '/networkInterfaces?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_nsgs(access_token, subscription_id, resource_group):
+    '''Iterate over the network security groups in a resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each network security group.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Network/',
+                        '/networkSecurityGroups?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_nsgs_all(access_token, subscription_id):
+    '''Iterate over all network security groups in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each network security group.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Network/',
+                        'networkSecurityGroups?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_public_ips(access_token, subscription_id, resource_group):
+    '''Iterate over the public ip addresses in a resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each public ip address.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Network/',
+                        'publicIPAddresses?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vnets(access_token, subscription_id):
+    '''Iterate over the VNETs in a subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each VNET.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Network/',
+                        '/virtualNetworks?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_vnets_rg(access_token, subscription_id, resource_group):
+    '''Iterate over the VNETs in a resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+
+    Yields:
+        JSON body of each VNET.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourceGroups/', resource_group,
+                        '/providers/Microsoft.Network/',
+                        '/virtualNetworks?api-version=', NETWORK_API])
+    return iter_values(endpoint, access_token)
+
+
 def list_asgs(access_token, subscription_id, resource_group):
     '''Get details about the application security groups for a resource group.
 
@@ -0,0 +1,352 @@
+'''operations.py - azurerm functions for waiting on long-running operations
+
+Create, update, delete and action calls like create_vm(), delete_resource_group() or
+scale_vmss() return as soon as Azure accepts the request, often with a 201 or 202 status and an
+Azure-AsyncOperation or Location header which points at the status of the operation. An
+OperationPoller follows those headers instead of re-reading the whole resource, honors
+Retry-After, and otherwise backs off from LRO_POLL_INTERVAL up to LRO_MAX_POLL_INTERVAL.
+'''
+import heapq
+import threading
+import time
+import concurrent.futures
+
+import requests
+
+from .ratelimit import TokenBucket
+from .restfns import do_get_raw, current_deadline, DeadlineExceeded, RequestCancelled, \
+    _run_under, _sleep
+from .settings import LRO_POLL_INTERVAL, LRO_POLL_BACKOFF, LRO_MAX_POLL_INTERVAL, \
+    LRO_POLL_MAX_ERRORS, LRO_WAIT_WORKERS, LRO_WAIT_REQUESTS_PER_SECOND
+
+TERMINAL_STATES = ('Succeeded', 'Failed', 'Canceled')
+
+
+def _json_or_none(response):
+    '''Return the JSON body of a response, or None if it has none.'''
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def _provisioning_state(body):
+    '''Return properties.provisioningState from a resource body, or None.'''
+    if isinstance(body, dict) and isinstance(body.get('properties'), dict):
+        return body['properties'].get('provisioningState')
+    return None
+
+
+def _retry_after(response):
+    '''Return the Retry-After header of a response in seconds, or None.'''
+    try:
+        return float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        return None
+
+
+class OperationPoller:
+    '''Track a long-running Azure operation until it succeeds, fails or is canceled.
+
+    Attributes:
+        status (str): 'InProgress', 'Succeeded', 'Failed' or 'Canceled'.
+        result (dict): When finished, the JSON body of the resource (PUT/PATCH), of the operation
+            result (POST) or of the final operation status. None if there is no body.
+        polls (int): Number of status requests made so far.
+        error (Exception): The last connection error or timeout of a status request, or None.
+            Status requests are retried with backoff after an error, and the operation is
+            finished as 'Failed' after LRO_POLL_MAX_ERRORS errors in a row.
+
+    Args:
+        response (Response): HTTP response of the call which started the operation.
+        access_token (str): Optional token to poll with. Default is the token the operation was
+            started with.
+    '''
+    def __init__(self, response, access_token=None):
+        request = response.request
+        if access_token is None:
+            access_token = request.headers.get('Authorization', '')[len('Bearer '):]
+        self.access_token = access_token
+        self.response = response
+        self.status = 'InProgress'
+        self.result = None
+        self.polls = 0
+        self.error = None
+        self._errors = 0
+        self._method = request.method
+        self._resource_url = request.url
+        self._async_url = response.headers.get('Azure-AsyncOperation')
+        self._location_url = response.headers.get('Location')
+        self._interval = LRO_POLL_INTERVAL
+        self._lock = threading.RLock()
+        self._finished = threading.Event()
+        self._callbacks = []
+        self._callback_thread = None
+        self.next_poll = time.monotonic() + (_retry_after(response) or self._interval)
+        if response.status_code >= 400:
+            self._finish('Failed', _json_or_none(response))
+        elif self._async_url is None and self._location_url is None:
+            body = _json_or_none(response)
+            state = _provisioning_state(body)
+            # a PUT or PATCH without status headers is tracked by the resource provisioningState
+            if self._method not in ('PUT', 'PATCH') or state is None or \
+                    state in TERMINAL_STATES:
+                self._finish(state if state in TERMINAL_STATES else 'Succeeded', body)
+
+    def done(self):
+        '''Return True if the operation has finished.'''
+        return self._finished.is_set()
+
+    def delay(self):
+        '''Return the number of seconds until the next status request is due.'''
+        return max(0.0, self.next_poll - time.monotonic())
+
+    def _finish(self, status, result):
+        self.status = status
+        self.result = result
+        self._finished.set()
+        for callback in self._callbacks:
+            callback(self)
+
+    def _final_result(self, status_body):
+        '''Get the result of a successful operation tracked by Azure-AsyncOperation.'''
+        if self._method in ('PUT', 'PATCH'):
+            return _json_or_none(do_get_raw(self._resource_url, self.access_token))
+        if self._method == 'POST' and self._location_url is not None:
+            return _json_or_none(do_get_raw(self._location_url, self.access_token))
+        return status_body
+
+    def poll(self):
+        '''Request the operation status once, now.
+
+        Returns:
+            True if the operation has finished.
+        '''
+        with self._lock:
+            if self.done():
+                return True
+            self.polls += 1
+            try:
+                response = self._request_status()
+            except (DeadlineExceeded, RequestCancelled):
+                raise
+            except requests.exceptions.RequestException as error:
+                # e.g. an unreachable status URL: try again later, up to LRO_POLL_MAX_ERRORS
+                self.error = error
+                self._errors += 1
+                if self._errors >= LRO_POLL_MAX_ERRORS:
+                    self._finish('Failed', None)
+                    return True
+                self._schedule(None)
+                return False
+            self._errors = 0
+            # 5xx responses are treated as transient, other errors end the operation
+            if not self.done() and 400 <= response.status_code < 500:
+                self._finish('Failed', _json_or_none(response))
+            if self.done():
+                return True
+            self._schedule(response)
+            return False
+
+    def _schedule(self, response):
+        '''Set when the next status request is due, and back off the interval.'''
+        self.next_poll = time.monotonic() + \
+            ((response is not None and _retry_after(response)) or self._interval)
+        self._interval = min(self._interval * LRO_POLL_BACKOFF, LRO_MAX_POLL_INTERVAL)
+
+    def _request_status(self):
+        '''Request the operation status once, finishing the operation if it is done.
+
+        Returns:
+            The HTTP response of the status request.
+        '''
+        if self._async_url is not None:
+            response = do_get_raw(self._async_url, self.access_token)
+            body = _json_or_none(response)
+            status = body.get('status') if isinstance(body, dict) else None
+            if status == 'Succeeded':
+                self._finish(status, self._final_result(body))
+            elif status in TERMINAL_STATES:
+                self._finish(status, body)
+        elif self._location_url is not None:
+            response = do_get_raw(self._location_url, self.access_token)
+            if response.status_code in (200, 201, 204):
+                self._finish('Succeeded', _json_or_none(response))
+        else:
+            response = do_get_raw(self._resource_url, self.access_token)
+            body = _json_or_none(response)
+            state = _provisioning_state(body)
+            if state in TERMINAL_STATES:
+                self._finish(state, body)
+        return response
+
+    def wait(self, timeout=None):
+        '''Block until the operation finishes.
+
+        Args:
+            timeout (float): Optional maximum number of seconds to wait.
+
+        Returns:
+            The final status string: 'Succeeded', 'Failed' or 'Canceled'.
+
+        Raises:
+            TimeoutError: If the operation is still running after timeout seconds.
+        '''
+        end = None if timeout is None else time.monotonic() + timeout
+        while not self.done():
+            delay = self.delay()
+            if end is not None and time.monotonic() + delay > end:
+                raise TimeoutError('Operation still ' + self.status + ' after ' + str(timeout) +
+                                   ' seconds')
+            _sleep(delay)
+            self.poll()
+        return self.status
+
+    def add_done_callback(self, callback):
+        '''Call a function when the operation finishes, polling in a background thread.
+
+        Args:
+            callback (function): Called with this OperationPoller as its argument. Called at
+                once if the operation has already finished.
+        '''
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                if self._callback_thread is None:
+                    self._callback_thread = threading.Thread(
+                        target=_run_under, args=(current_deadline(), self.wait), daemon=True)
+                    self._callback_thread.start()
+                return
+        callback(self)
+
+
+def wait_for_operation(response, access_token=None, timeout=None):
+    '''Wait for the long-running operation started by an azurerm call to finish.
+
+    E.g. poller = wait_for_operation(create_vm(access_token, ...))
+
+    Args:
+        response (Response): HTTP response of the call which started the operation.
+        access_token (str): Optional token to poll with. Default is the token the operation was
+            started with.
+        timeout (float): Optional maximum number of seconds to wait.
+
+    Returns:
+        The finished OperationPoller. Check its status and result attributes.
+
+    Raises:
+        TimeoutError: If the operation is still running after timeout seconds.
+    '''
+    poller = OperationPoller(response, access_token)
+    poller.wait(timeout)
+    return poller
+
+
+def iter_completed(operations, access_token=None, timeout=None, max_workers=LRO_WAIT_WORKERS,
+                   requests_per_second=LRO_WAIT_REQUESTS_PER_SECOND):
+    '''Wait for many long-running operations, yielding each one as it finishes.
+
+    All operations share one scheduler: a heap ordered by when each operation is next due to be
+    polled, a pool of max_workers threads to make the status requests, and an overall budget of
+    requests_per_second. Each operation keeps its own Retry-After and backoff interval, so
+    thousands of operations can be tracked without a thread each.
+
+    A status request which can't connect or times out doesn't stop the others: that operation
+    is polled again later, and yielded as 'Failed' with its error attribute set after
+    LRO_POLL_MAX_ERRORS errors in a row.
+
+    E.g. for poller in iter_completed([delete_vm(...), delete_nic(...), ...]): ...
+
+    Args:
+        operations (list): HTTP responses of the calls which started the operations, and/or
+            OperationPoller objects.
+        access_token (str): Optional token to poll with. Default is the token each operation was
+            started with.
+        timeout (float): Optional maximum number of seconds to wait for all operations.
+        max_workers (int): Maximum number of status requests in flight at once.
+        requests_per_second (float): Maximum number of status requests per second overall.
+
+    Yields:
+        Each OperationPoller once it has finished, in order of completion.
+
+    Raises:
+        TimeoutError: If operations are still running after timeout seconds.
+    '''
+    end = None if timeout is None else time.monotonic() + timeout
+    deadline = current_deadline()
+    budget = TokenBucket(max(1, requests_per_second), requests_per_second, None)
+    due = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, OperationPoller):
+            operation = OperationPoller(operation, access_token)
+        if operation.done():
+            yield operation
+        else:
+            heapq.heappush(due, (operation.next_poll, index, operation))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        polling = {}
+        while due or polling:
+            # start the status requests which are due, within the worker and request budgets
+            delay = None
+            while due and len(polling) < max_workers:
+                wait_for = due[0][0] - time.monotonic()
+                if wait_for <= 0:
+                    wait_for = budget.reserve()
+                if wait_for > 0:
+                    delay = wait_for
+                    break
+                _, index, poller = heapq.heappop(due)
+                polling[executor.submit(_run_under, deadline, poller.poll)] = (index, poller)
+            if end is not None:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(str(len(due) + len(polling)) + \
+                                       ' operations still running after ' + str(timeout) + \
+                                       ' seconds')
+                delay = remaining if delay is None else min(delay, remaining)
+            if deadline is not None:
+                deadline.check()
+                remaining = deadline.remaining()
+                if remaining is not None:
+                    delay = remaining if delay is None else min(delay, remaining)
+            if not polling:
+                _sleep(delay)
+                continue
+            finished, _ = concurrent.futures.wait(
+                polling, timeout=delay, return_when=concurrent.futures.FIRST_COMPLETED)
+            if deadline is not None:
+                deadline.check()
+            for future in finished:
+                index, poller = polling.pop(future)
+                if future.result():
+                    yield poller
+                else:
+                    heapq.heappush(due, (poller.next_poll, index, poller))
+
+
+def wait_for_operations(operations, access_token=None, timeout=None,
+                        max_workers=LRO_WAIT_WORKERS,
+                        requests_per_second=LRO_WAIT_REQUESTS_PER_SECOND):
+    '''Wait for many long-running operations to finish. See iter_completed().
+
+    Args:
+        operations (list): HTTP responses of the calls which started the operations, and/or
+            OperationPoller objects.
+        access_token (str): Optional token to poll with. Default is the token each operation was
+            started with.
+        timeout (float): Optional maximum number of seconds to wait for all operations.
+        max_workers (int): Maximum number of status requests in flight at once.
+        requests_per_second (float): Maximum number of status requests per second overall.
+
+    Returns:
+        List of finished OperationPoller objects, in the same order as operations.
+
+    Raises:
+        TimeoutError: If operations are still running after timeout seconds.
+    '''
+    pollers = [operation if isinstance(operation, OperationPoller)
+               else OperationPoller(operation, access_token) for operation in operations]
+    for _ in iter_completed(pollers, timeout=timeout, max_workers=max_workers,
+                            requests_per_second=requests_per_second):
+        pass
+    return pollers
@@ -0,0 +1,160 @@
+'''ratelimit.py - client side rate limiting of Azure Resource Manager requests for azurerm
+
+Azure Resource Manager limits the number of reads and writes per subscription, reports the
+remaining budget in x-ms-ratelimit-remaining-subscription-reads/writes response headers and
+returns 429 with a Retry-After header when the budget runs out. The token buckets here learn
+the remaining budget from those headers and pace requests to stay under it, so parallel jobs
+run at a sustained rate instead of bursting into throttling.
+'''
+import random
+import re
+import threading
+import time
+
+from .settings import RATE_LIMIT_READS, RATE_LIMIT_WRITES
+
+_SUBSCRIPTION_RE = re.compile(r'/subscriptions/([^/?]+)', re.IGNORECASE)
+_READ_METHODS = ('GET', 'HEAD')
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_enabled = True
+
+
+class TokenBucket:
+    '''A token bucket which refills continuously and learns its level from response headers.
+
+    Args:
+        capacity (int): Maximum number of tokens, i.e. requests allowed in a burst.
+        refill_rate (float): Tokens added per second.
+        header (str): Name of the response header which reports the remaining budget.
+    '''
+    def __init__(self, capacity, refill_rate, header):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.header = header
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def reserve(self):
+        '''Take a token if one is available, else say how long to wait for one.
+
+        Returns:
+            0 if a token was taken, otherwise the number of seconds to wait before trying again.
+        '''
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = self.blocked_until - now
+            if wait > 0:
+                return wait
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.refill_rate
+
+    def acquire(self):
+        '''Take a token, sleeping until one is available and any Retry-After block has passed.
+        '''
+        wait = self.reserve()
+        while wait > 0:
+            time.sleep(wait)
+            wait = self.reserve()
+
+    def update(self, headers):
+        '''Set the token level to the remaining budget reported by Azure, if present.
+
+        Args:
+            headers (dict): HTTP response headers.
+        '''
+        remaining = headers.get(self.header)
+        if remaining is None:
+            return
+        try:
+            remaining = float(remaining)
+        except ValueError:
+            return
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, remaining)
+
+    def block(self, seconds):
+        '''Hold back all requests from this bucket for a number of seconds.
+
+        Args:
+            seconds (float): Time to wait before the next request, e.g. from Retry-After.
+        '''
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def get_bucket(endpoint, method):
+    '''Get the rate limiting token bucket for a request.
+
+    Args:
+        endpoint (str): Request URL. Buckets are kept per subscription id in the URL.
+        method (str): HTTP method. Reads and writes have separate buckets.
+
+    Returns:
+        A TokenBucket, or None if rate limiting is disabled or the URL has no subscription.
+    '''
+    if not _enabled:
+        return None
+    match = _SUBSCRIPTION_RE.search(endpoint)
+    if match is None:
+        return None
+    is_read = method.upper() in _READ_METHODS
+    key = (match.group(1).lower(), is_read)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(key)
+            if bucket is None:
+                if is_read:
+                    bucket = TokenBucket(RATE_LIMIT_READS, RATE_LIMIT_READS / 3600.0,
+                                         'x-ms-ratelimit-remaining-subscription-reads')
+                else:
+                    bucket = TokenBucket(RATE_LIMIT_WRITES, RATE_LIMIT_WRITES / 3600.0,
+                                         'x-ms-ratelimit-remaining-subscription-writes')
+                _buckets[key] = bucket
+    return bucket
+
+
+def retry_delay(response, attempt):
+    '''Work out how long to wait before retrying a throttled (429) request.
+
+    Uses the Retry-After header when present, else exponential backoff, plus up to 25% jitter so
+    that throttled workers don't all retry at the same moment.
+
+    Args:
+        response (Response): The throttled HTTP response.
+        attempt (int): Number of retries already made for this request.
+
+    Returns:
+        Delay in seconds.
+    '''
+    try:
+        delay = float(response.headers['Retry-After'])
+    except (KeyError, ValueError):
+        delay = 2.0 ** attempt
+    return delay * (1 + random.uniform(0, 0.25))
+
+
+def enable_rate_limiting():
+    '''Turn on client side rate limiting of Azure Resource Manager requests (the default).
+    '''
+    global _enabled
+    _enabled = True
+
+
+def disable_rate_limiting():
+    '''Turn off client side rate limiting. 429 responses are still retried after Retry-After.
+    '''
+    global _enabled
+    _enabled = False
@@ -1,21 +1,485 @@
 '''azurerm restfns - REST functions for azurerm'''
 
+import json
 import platform
-import pkg_resources  # to get version
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+import concurrent.futures
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from .ratelimit import get_bucket, retry_delay
 from .settings import json_acceptformat, json_only_acceptformat, xml_acceptformat, \
-charset, dsversion_min, dsversion_max, xmsversion, ams_rest_endpoint
+charset, dsversion_min, dsversion_max, xmsversion, ams_rest_endpoint, HTTP_POOL_SIZES, \
+GRAPH_RESOURCE_HOST, RATE_LIMIT_MAX_RETRIES, BATCH_API, BATCH_MAX_REQUESTS, ETAG_CACHE_SIZE, \
+HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HEDGE_PERCENTILE, HEDGE_BUDGET, HEDGE_WORKERS, \
+HEDGE_LATENCY_SAMPLES, get_rm_endpoint
+
+try:
+    from importlib.metadata import version as _package_version  # Python 3.8+
+except ImportError:
+    _package_version = None
+
+# pooled keep-alive sessions, one per host, shared by every thread
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# ETag keyed response cache for do_get(), an LRU ordered OrderedDict when enabled
+_etag_cache = None
+_etag_cache_size = ETAG_CACHE_SIZE
+_etag_lock = threading.Lock()
+
+# in-flight do_get() calls by (endpoint, token) when single-flight is enabled, else None
+_flights = None
+_flights_lock = threading.Lock()
+
+# set by BatchGet.add_call() to capture a request instead of sending it
+_capture = threading.local()
+
+# hedged GET state, see enable_hedging(). _hedge_pool is None when hedging is off
+_hedge_pool = None
+_hedge_percentile = HEDGE_PERCENTILE
+_hedge_budget = HEDGE_BUDGET
+_hedge_tokens = 0.0
+_hedge_latencies = {}
+_hedge_lock = threading.Lock()
+
+# User-Agent header value, see get_user_agent()
+_user_agent = None
+
+# (connect, read) timeouts in seconds for every request, see set_timeouts()
+_timeouts = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+# stack of the Deadline objects each thread is running under, innermost last
+_deadlines = threading.local()
+
+
+class _CapturedRequest(Exception):
+    '''Raised by _send() in capture mode, carrying the request it would have sent.'''
+    def __init__(self, method, endpoint):
+        Exception.__init__(self, method, endpoint)
+        self.method = method
+        self.endpoint = endpoint
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    '''Raised when a call runs past the Deadline it was made under.'''
+
+
+class RequestCancelled(requests.exceptions.RequestException):
+    '''Raised when a call is made under a Deadline which has been cancelled.'''
+
+
+def current_deadline():
+    '''Get the innermost Deadline the calling thread is running under.
+
+    Returns:
+        A Deadline object, or None.
+    '''
+    stack = getattr(_deadlines, 'stack', None)
+    return stack[-1] if stack else None
+
+
+class Deadline:
+    '''An overall time limit and cancellation switch for the azurerm calls in a with block.
+
+    Every request made in the block shares the deadline, including nextLink pages, rate limiter
+    waits, 429 retries, iter_values() prefetch threads and long-running operation polling. The
+    timeouts of each request are cut to the time remaining, and once the deadline has passed or
+    cancel() has been called the next request or wait raises instead. E.g.
+
+        with azurerm.Deadline(30):
+            vms = azurerm.list_vmss_vms(access_token, subscription_id, rgname, vmssname)
+
+    Another thread can call cancel() to stop the calls early. Waits end at once; a request
+    already in flight ends when its response arrives or its shortened read timeout expires.
+    A Deadline created inside another one can't outlive it, and is cancelled with it.
+
+    Args:
+        seconds (float): Optional time limit. Default None (no time limit, cancel only).
+    '''
+    def __init__(self, seconds=None):
+        self.parent = current_deadline()
+        self.expires = None if seconds is None else time.monotonic() + seconds
+        self._cancelled = threading.Event()
+        self._children = weakref.WeakSet()
+        if self.parent is not None:
+            if self.parent.expires is not None:
+                self.expires = self.parent.expires if self.expires is None else \
+                    min(self.expires, self.parent.expires)
+            self.parent._children.add(self)
+            if self.parent.cancelled():
+                self._cancelled.set()
+
+    def cancel(self):
+        '''Cancel the calls made under this deadline, and under deadlines created in it.'''
+        self._cancelled.set()
+        for child in list(self._children):
+            child.cancel()
+
+    def cancelled(self):
+        '''Return True if cancel() has been called.'''
+        return self._cancelled.is_set()
+
+    def remaining(self):
+        '''Return the number of seconds left, or None if there is no time limit.'''
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def check(self):
+        '''Raise RequestCancelled or DeadlineExceeded if calls should stop now.'''
+        if self.cancelled():
+            raise RequestCancelled('Request cancelled')
+        if self.expires is not None and time.monotonic() >= self.expires:
+            raise DeadlineExceeded('Deadline exceeded')
+
+    def sleep(self, seconds):
+        '''Sleep, waking to raise if the deadline is cancelled or passes first.
+
+        Args:
+            seconds (float): Time to sleep.
+        '''
+        self.check()
+        remaining = self.remaining()
+        if remaining is not None and seconds >= remaining:
+            self._cancelled.wait(remaining)
+            self.check()
+            raise DeadlineExceeded('Deadline exceeded')
+        self._cancelled.wait(seconds)
+        self.check()
+
+    def __enter__(self):
+        if getattr(_deadlines, 'stack', None) is None:
+            _deadlines.stack = []
+        _deadlines.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _deadlines.stack.pop()
+
+
+def _run_under(deadline, func, *args, **kwargs):
+    '''Call a function under a deadline captured from another thread, if there is one.'''
+    if deadline is None:
+        return func(*args, **kwargs)
+    with deadline:
+        return func(*args, **kwargs)
+
+
+def _sleep(seconds):
+    '''Sleep, honoring the calling thread's Deadline if it has one.'''
+    deadline = current_deadline()
+    if deadline is None:
+        time.sleep(seconds)
+    else:
+        deadline.sleep(seconds)
+
+
+def set_timeouts(connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT):
+    '''Set the connect and read timeouts for every request. Call with no arguments to restore
+    the defaults.
+
+    Args:
+        connect (float): Seconds to wait for a connection. None waits forever.
+        read (float): Seconds to wait for data from the server. None waits forever.
+    '''
+    global _timeouts
+    _timeouts = (connect, read)
+
+
+def get_timeouts():
+    '''Get the connect and read timeouts used for every request.
+
+    Returns:
+        A (connect, read) tuple of seconds.
+    '''
+    return _timeouts
+
+
+def _host_kind(host):
+    '''Classify a host name into one of the HTTP_POOL_SIZES keys.'''
+    if host == urlsplit(get_rm_endpoint()).netloc.lower():
+        return 'arm'
+    if host.endswith('.vault.azure.net'):
+        return 'keyvault'
+    if host == GRAPH_RESOURCE_HOST:
+        return 'graph'
+    if host == urlsplit(ams_rest_endpoint).netloc or host.endswith('.media.azure.net'):
+        return 'media'
+    if host.endswith('.blob.core.windows.net'):
+        return 'blob'
+    return 'default'
+
+
+def get_session(endpoint):
+    '''Get the shared pooled HTTP session for the host of an endpoint.
+
+    Sessions keep connections alive between calls so repeated requests to the same host skip
+    the TCP and TLS handshakes. The pool size depends on the host, see HTTP_POOL_SIZES in
+    settings.py.
+
+    Args:
+        endpoint (str): Any URL on the host.
+
+    Returns:
+        A requests.Session object.
+    '''
+    host = urlsplit(endpoint).netloc.lower()
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                pool_size = HTTP_POOL_SIZES[_host_kind(host)]
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _sessions[host] = session
+    return session
+
+
+def close_sessions():
+    '''Close all pooled HTTP sessions. New sessions are created on the next request.
+    '''
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _send(method, endpoint, **kwargs):
+    '''Send an HTTP request using the pooled session for the endpoint host.
+
+    Requests are paced by the per-subscription rate limiter (see ratelimit.py), and throttled
+    (429) requests are retried after their Retry-After interval up to RATE_LIMIT_MAX_RETRIES times.
+    Requests use the connect/read timeouts from set_timeouts(), cut short by the calling thread's
+    Deadline if it has one.
+    '''
+    if getattr(_capture, 'active', False):
+        raise _CapturedRequest(method, endpoint)
+    session = get_session(endpoint)
+    bucket = get_bucket(endpoint, method)
+    deadline = current_deadline()
+    attempt = 0
+    while True:
+        if bucket is not None:
+            wait = bucket.reserve()
+            while wait > 0:
+                _sleep(wait)
+                wait = bucket.reserve()
+        timeout = _timeouts
+        if deadline is not None:
+            deadline.check()
+            remaining = deadline.remaining()
+            if remaining is not None:
+                timeout = tuple(remaining if limit is None else min(limit, remaining)
+                                for limit in _timeouts)
+        start = time.monotonic()
+        try:
+            response = session.request(method, endpoint, timeout=timeout, **kwargs)
+        except requests.exceptions.Timeout:
+            if deadline is not None:
+                deadline.check()
+            raise
+        if _hedge_pool is not None and method == 'GET':
+            # only the HTTP call is timed, not the rate limiter wait above
+            _record_latency(endpoint, time.monotonic() - start)
+        if bucket is not None:
+            bucket.update(response.headers)
+        if response.status_code != 429 or attempt >= RATE_LIMIT_MAX_RETRIES:
+            return response
+        delay = retry_delay(response, attempt)
+        if bucket is not None:
+            bucket.block(delay)
+        else:
+            _sleep(delay)
+        attempt += 1
+
+
+def _record_latency(endpoint, seconds):
+    '''Record the latency of a GET for the endpoint host, used to work out hedge delays.'''
+    host = urlsplit(endpoint).netloc.lower()
+    with _hedge_lock:
+        latencies = _hedge_latencies.get(host)
+        if latencies is None:
+            latencies = _hedge_latencies[host] = deque(maxlen=HEDGE_LATENCY_SAMPLES)
+        latencies.append(seconds)
+
+
+def _hedge_delay(host):
+    '''Get how long to wait before hedging a GET to a host, or None if it shouldn't be hedged.
+
+    Returns None until there are enough latency samples for the host to estimate the
+    percentile, or when the hedge budget is used up. Otherwise takes a hedge from the budget.
+    '''
+    global _hedge_tokens
+    with _hedge_lock:
+        # every GET earns a fraction of a hedge, saved up to a burst of 10
+        _hedge_tokens = min(_hedge_tokens + _hedge_budget, 10)
+        latencies = _hedge_latencies.get(host)
+        if latencies is None or len(latencies) < 20 or _hedge_tokens < 1:
+            return None
+        ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * _hedge_percentile / 100.0))]
+
+
+def _submit(pool, *args, **kwargs):
+    '''Submit a call to the hedge pool, or return None if disable_hedging() has shut it down.'''
+    try:
+        return pool.submit(*args, **kwargs)
+    except RuntimeError:
+        return None
+
+
+def _start(func, *args, **kwargs):
+    '''Run a call on a new thread of its own, or return None if no thread can be started.
+
+    Used for the first request of a hedged GET, so the number of GETs in flight isn't capped by
+    the hedge pool and the hedge delay isn't eaten up waiting for a pool thread.
+    '''
+    future = concurrent.futures.Future()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except BaseException as error:  # handed to the thread waiting on the future
+            future.set_exception(error)
+    try:
+        threading.Thread(target=run, daemon=True).start()
+    except RuntimeError:
+        return None
+    return future
+
+
+def _close_response(future):
+    '''Done callback for an abandoned hedged request: release its connection to the pool.'''
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _get(endpoint, headers):
+    '''Send a GET request, hedged with a second identical request if hedging is enabled.
+
+    The first request runs on a thread of its own. When it hasn't answered within the hedge
+    delay for its host a second one is sent from the hedge pool, and the first response to
+    arrive is returned. A request which is already running can't be stopped, so the other one
+    is left to finish and its response is closed, which returns its connection to the pool.
+    '''
+    global _hedge_tokens
+    pool = _hedge_pool
+    if pool is None or getattr(_capture, 'active', False):
+        return _send('GET', endpoint, headers=headers)
+    delay = _hedge_delay(urlsplit(endpoint).netloc.lower())
+    if delay is None:
+        return _send('GET', endpoint, headers=headers)
+    deadline = current_deadline()
+    first = _start(_run_under, deadline, _send, 'GET', endpoint, headers=headers)
+    if first is None:
+        return _send('GET', endpoint, headers=headers)
+    finished, _ = concurrent.futures.wait([first], timeout=delay)
+    if finished:
+        return first.result()
+    # take a hedge from the budget, but never wait for a request while holding the lock
+    with _hedge_lock:
+        hedge = _hedge_tokens >= 1
+        if hedge:
+            _hedge_tokens -= 1
+    second = None
+    if hedge:
+        second = _submit(pool, _run_under, deadline, _send, 'GET', endpoint, headers=headers)
+    if second is None:
+        return first.result()
+    pending = [first, second]
+    while pending:
+        finished, pending = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        # a success wins over a failure which finished at the same time
+        for future in sorted(finished, key=lambda future: future.exception() is not None):
+            if future.exception() is None or not pending:
+                for loser in pending:
+                    loser.add_done_callback(_close_response)
+                return future.result()
+
+
+def _azurerm_version():
+    '''Get the installed azurerm version, or 'unknown' if it isn't installed as a package.'''
+    try:
+        if _package_version is not None:
+            return _package_version('azurerm')
+        import pkg_resources  # slow to import, so only used where importlib.metadata is missing
+        return pkg_resources.require('azurerm')[0].version
+    except Exception:  # not installed, e.g. run from a source checkout
+        return 'unknown'
+
 
 def get_user_agent():
     '''User-Agent Header. Sends library identification to Azure endpoint.
+
+    Worked out on the first call and reused after that.
     '''
-    version = pkg_resources.require("azurerm")[0].version
-    user_agent = "python/{} ({}) requests/{} azurerm/{}".format(
-        platform.python_version(),
-        platform.platform(),
-        requests.__version__,
-        version)
-    return user_agent
+    global _user_agent
+    if _user_agent is None:
+        _user_agent = "python/{} ({}) requests/{} azurerm/{}".format(
+            platform.python_version(),
+            platform.platform(),
+            requests.__version__,
+            _azurerm_version())
+    return _user_agent
+
+
+class _Flight:
+    '''A do_get() call in progress, shared by the callers which asked for the same GET.'''
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _get_json(endpoint, access_token):
+    '''Send a GET request and return JSON, using the ETag cache if it is enabled.'''
+    headers = {"Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    if _etag_cache is None:
+        return _get(endpoint, headers).json()
+    key = (endpoint, access_token)
+    with _etag_lock:
+        cached = _etag_cache.get(key)
+        if cached is not None:
+            _etag_cache.move_to_end(key)
+    if cached is not None:
+        headers['If-None-Match'] = cached[0]
+    response = _get(endpoint, headers)
+    if response.status_code == 304 and cached is not None:
+        return cached[1]
+    get_return = response.json()
+    etag = response.headers.get('ETag')
+    if response.status_code == 200 and etag is not None:
+        with _etag_lock:
+            if _etag_cache is not None:
+                _etag_cache[key] = (etag, get_return)
+                _etag_cache.move_to_end(key)
+                while len(_etag_cache) > _etag_cache_size:
+                    _etag_cache.popitem(last=False)
+    return get_return
+
+
+def _wait_for_flight(flight):
+    '''Wait for another thread's do_get() call, honoring the calling thread's Deadline.'''
+    deadline = current_deadline()
+    if deadline is None:
+        flight.done.wait()
+        return
+    while not flight.done.wait(0.1):
+        deadline.check()
+
 
 def do_get(endpoint, access_token):
     '''Do an HTTP GET request and return JSON.
@@ -27,9 +491,133 @@ def do_get(endpoint, access_token):
     Returns:
         HTTP response. JSON body.
     '''
+    flights = _flights
+    if flights is None or getattr(_capture, 'active', False):
+        return _get_json(endpoint, access_token)
+    key = (endpoint, access_token)
+    with _flights_lock:
+        flight = flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = flights[key] = _Flight()
+    if not leader:
+        _wait_for_flight(flight)
+        if isinstance(flight.error, (DeadlineExceeded, RequestCancelled)):
+            # the first caller ran out of time, which says nothing about this caller's request
+            return do_get(endpoint, access_token)
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = _get_json(endpoint, access_token)
+        return flight.result
+    except Exception as error:
+        flight.error = error
+        raise
+    finally:
+        with _flights_lock:
+            del flights[key]
+        flight.done.set()
+
+
+def enable_single_flight():
+    '''Turn on single-flight GETs: identical do_get() calls made at the same time share one
+    request.
+
+    When a thread calls do_get() (or a get function which uses it) for an endpoint and token
+    which another thread is already waiting on, it waits for that request instead of sending its
+    own, and both get the same JSON body. The shared body must not be modified.
+    '''
+    global _flights
+    with _flights_lock:
+        if _flights is None:
+            _flights = {}
+
+
+def disable_single_flight():
+    '''Turn off single-flight GETs (the default). Calls already waiting are not affected.
+    '''
+    global _flights
+    with _flights_lock:
+        _flights = None
+
+
+def do_get_raw(endpoint, access_token):
+    '''Do an HTTP GET request and return the HTTP response, for callers which need the status
+    code or headers as well as the body.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        HTTP response.
+    '''
     headers = {"Authorization": 'Bearer ' + access_token}
     headers['User-Agent'] = get_user_agent()
-    return requests.get(endpoint, headers=headers).json()
+    return _get(endpoint, headers)
+
+
+def enable_etag_cache(max_entries=ETAG_CACHE_SIZE):
+    '''Turn on the ETag response cache for do_get() and the get functions which use it.
+
+    Responses with an ETag header are cached, and later GETs of the same endpoint with the same
+    token send If-None-Match. When Azure answers 304 Not Modified the cached body is returned,
+    saving the download and JSON parse. The least recently used entries are dropped once there
+    are more than max_entries. Cached bodies are shared between callers, so don't modify them.
+
+    Args:
+        max_entries (int): Optional maximum number of cached responses. Default ETAG_CACHE_SIZE.
+    '''
+    global _etag_cache, _etag_cache_size
+    with _etag_lock:
+        _etag_cache_size = max_entries
+        if _etag_cache is None:
+            _etag_cache = OrderedDict()
+        while len(_etag_cache) > _etag_cache_size:
+            _etag_cache.popitem(last=False)
+
+
+def disable_etag_cache():
+    '''Turn off the ETag response cache and drop its contents.
+    '''
+    global _etag_cache
+    with _etag_lock:
+        _etag_cache = None
+
+
+def enable_hedging(percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET):
+    '''Turn on hedged GET requests, to cut tail latency for read-heavy callers.
+
+    When a GET hasn't answered within the given percentile of recent latencies for its host,
+    an identical second request is sent and whichever response arrives first is used. Hedges
+    are limited to a fraction of all GETs so they don't use up the subscription read quota;
+    they also go through the rate limiter like any other request. Only GETs are hedged, since
+    repeating them is safe.
+
+    Args:
+        percentile (float): Optional latency percentile after which to hedge. Default
+            HEDGE_PERCENTILE (95).
+        budget (float): Optional maximum fraction of GETs which may be hedged. Default
+            HEDGE_BUDGET (0.05).
+    '''
+    global _hedge_pool, _hedge_percentile, _hedge_budget
+    with _hedge_lock:
+        _hedge_percentile = percentile
+        _hedge_budget = budget
+        if _hedge_pool is None:
+            _hedge_pool = concurrent.futures.ThreadPoolExecutor(max_workers=HEDGE_WORKERS)
+
+
+def disable_hedging():
+    '''Turn off hedged GET requests (the default).
+    '''
+    global _hedge_pool
+    with _hedge_lock:
+        pool = _hedge_pool
+        _hedge_pool = None
+    if pool is not None:
+        pool.shutdown(wait=False)
 
 
 def do_get_next(endpoint, access_token):
@@ -48,7 +636,7 @@ def do_get_next(endpoint, access_token):
     value_list = []
     vm_dict = {}
     while looping:
-        get_return = requests.get(endpoint, headers=headers).json()
+        get_return = _get(endpoint, headers).json()
         if not 'value' in get_return:
             return get_return
         if not 'nextLink' in get_return:
@@ -60,6 +648,83 @@ def do_get_next(endpoint, access_token):
     return vm_dict
 
 
+def _fetch_pages(endpoint, headers, pages, stop):
+    '''Worker for iter_values() prefetch mode. Put nextLink pages on a bounded queue.'''
+    def put(item):
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+    try:
+        while endpoint is not None and not stop.is_set():
+            get_return = _get(endpoint, headers).json()
+            endpoint = get_return.get('nextLink') if 'value' in get_return else None
+            put(get_return)
+    except Exception as error:  # handed to the consuming thread and raised there
+        put(error)
+    put(None)
+
+
+def _iter_pages(endpoint, headers, prefetch):
+    '''Yield the JSON body of each page in a nextLink chain.'''
+    if prefetch <= 0:
+        while endpoint is not None:
+            get_return = _get(endpoint, headers).json()
+            endpoint = get_return.get('nextLink') if 'value' in get_return else None
+            yield get_return
+        return
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    worker = threading.Thread(target=_run_under,
+                              args=(current_deadline(), _fetch_pages, endpoint, headers, pages,
+                                    stop),
+                              daemon=True)
+    worker.start()
+    try:
+        while True:
+            get_return = pages.get()
+            if get_return is None:
+                return
+            if isinstance(get_return, Exception):
+                raise get_return
+            yield get_return
+    finally:
+        # stops the worker if the caller abandons the iterator early
+        stop.set()
+
+
+def iter_values(endpoint, access_token, prefetch=0):
+    '''Do HTTP GET requests following the nextLink chain, and yield list items as they arrive.
+
+    A lazy alternative to do_get_next(). Only the current page is held in memory and the first
+    items are available as soon as the first page arrives. The next page is requested when the
+    items of the current page have been consumed, unless prefetch is set, in which case a
+    background thread fetches up to prefetch pages ahead while the caller works on the current
+    page.
+
+    Args:
+        endpoint (str): Azure Resource Manager management endpoint.
+        access_token (str): A valid Azure authentication token.
+        prefetch (int): Optional number of pages to fetch ahead. Default 0 (no prefetch).
+
+    Yields:
+        JSON body of each list item. If a page has no value list (e.g. an error response) its
+        JSON body is yielded instead and iteration stops.
+    '''
+    headers = {"Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    for get_return in _iter_pages(endpoint, headers, prefetch):
+        if not 'value' in get_return:
+            yield get_return
+            return
+        page = get_return['value']
+        del get_return
+        for value in page:
+            yield value
+
+
 def do_delete(endpoint, access_token):
     '''Do an HTTP GET request and return JSON.
 
@@ -72,7 +737,7 @@ def do_delete(endpoint, access_token):
     '''
     headers = {"Authorization": 'Bearer ' + access_token}
     headers['User-Agent'] = get_user_agent()
-    return requests.delete(endpoint, headers=headers)
+    return _send('DELETE', endpoint, headers=headers)
 
 
 def do_patch(endpoint, body, access_token):
@@ -88,7 +753,7 @@ def do_patch(endpoint, body, access_token):
     '''
     headers = {"content-type": "application/json", "Authorization": 'Bearer ' + access_token}
     headers['User-Agent'] = get_user_agent()
-    return requests.patch(endpoint, data=body, headers=headers)
+    return _send('PATCH', endpoint, data=body, headers=headers)
 
 
 def do_post(endpoint, body, access_token):
@@ -104,7 +769,7 @@ def do_post(endpoint, body, access_token):
     '''
     headers = {"content-type": "application/json", "Authorization": 'Bearer ' + access_token}
     headers['User-Agent'] = get_user_agent()
-    return requests.post(endpoint, data=body, headers=headers)
+    return _send('POST', endpoint, data=body, headers=headers)
 
 
 def do_put(endpoint, body, access_token):
@@ -120,7 +785,141 @@ def do_put(endpoint, body, access_token):
     '''
     headers = {"content-type": "application/json", "Authorization": 'Bearer ' + access_token}
     headers['User-Agent'] = get_user_agent()
-    return requests.put(endpoint, data=body, headers=headers)
+    return _send('PUT', endpoint, data=body, headers=headers)
+
+
+def _do_batch(endpoints, access_token):
+    '''Send one Azure Resource Manager batch request of up to BATCH_MAX_REQUESTS GETs.'''
+    headers = {"content-type": "application/json", "Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = get_user_agent()
+    batch_requests = []
+    for index, endpoint in enumerate(endpoints):
+        batch_requests.append({'httpMethod': 'GET', 'name': str(index), 'url': endpoint})
+    batch_endpoint = ''.join([get_rm_endpoint(), '/batch?api-version=', BATCH_API])
+    response = _send('POST', batch_endpoint, data=json.dumps({'requests': batch_requests}),
+                     headers=headers)
+    # a batch which takes longer to run is accepted with 202 and a Location to poll for results
+    while response.status_code == 202 and 'Location' in response.headers:
+        _sleep(float(response.headers.get('Retry-After', 1)))
+        response = _send('GET', response.headers['Location'], headers=headers)
+    try:
+        batch_return = response.json()
+    except ValueError:
+        batch_return = {'error': {'code': str(response.status_code), 'message': response.text}}
+    if not 'responses' in batch_return:
+        return [batch_return] * len(endpoints)
+    results = [{'error': {'code': 'MissingBatchResponse',
+                          'message': 'No response for this request in the batch.'}}] * \
+        len(endpoints)
+    for index, item in enumerate(batch_return['responses']):
+        results[int(item.get('name', index))] = item.get('content', {})
+    return results
+
+
+def do_batch_get(endpoints, access_token):
+    '''Do HTTP GET requests through the Azure Resource Manager batch endpoint and return JSON.
+
+    Sends the requests in groups of BATCH_MAX_REQUESTS, one round trip per group, instead of one
+    round trip per request.
+
+    Args:
+        endpoints (list): Azure Resource Manager management endpoints to GET.
+        access_token (str): A valid Azure authentication token.
+
+    Returns:
+        List of JSON bodies in the same order as endpoints. The item for a failed request is its
+        error JSON body, the same as do_get() would return.
+    '''
+    results = []
+    for start in range(0, len(endpoints), BATCH_MAX_REQUESTS):
+        results += _do_batch(endpoints[start:start + BATCH_MAX_REQUESTS], access_token)
+    return results
+
+
+class BatchGet:
+    '''Collect GET requests and send them through the batch endpoint in groups.
+
+    Requests are sent each time batch_size of them have been added, and when results() is
+    called or a with block ends. E.g.
+
+        batch = azurerm.BatchGet(access_token)
+        for vm_name in vm_names:
+            batch.add_call(azurerm.get_vm, access_token, subscription_id, rgname, vm_name)
+        vms = batch.results()
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        batch_size (int): Optional number of requests per batch. Default (and maximum)
+            BATCH_MAX_REQUESTS.
+    '''
+    def __init__(self, access_token, batch_size=BATCH_MAX_REQUESTS):
+        self.access_token = access_token
+        self.batch_size = min(batch_size, BATCH_MAX_REQUESTS)
+        self._pending = []
+        self._results = []
+
+    def add(self, endpoint):
+        '''Queue a GET request.
+
+        Args:
+            endpoint (str): Azure Resource Manager management endpoint.
+
+        Returns:
+            Index of the response in the list returned by results().
+        '''
+        index = len(self._results) + len(self._pending)
+        self._pending.append(endpoint)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return index
+
+    def add_call(self, func, *args, **kwargs):
+        '''Queue the GET request an azurerm get function would send, e.g. get_vm() or get_nic().
+
+        The function is called with the given arguments but its request is captured instead of
+        sent, so it must be one which sends a single GET and returns the do_get() result.
+
+        Args:
+            func (function): An azurerm get function.
+            args, kwargs: Arguments for func.
+
+        Returns:
+            Index of the response in the list returned by results().
+        '''
+        _capture.active = True
+        try:
+            func(*args, **kwargs)
+        except _CapturedRequest as captured:
+            request = captured
+        else:
+            raise ValueError(func.__name__ + ' does not send a request')
+        finally:
+            _capture.active = False
+        if request.method != 'GET':
+            raise ValueError(func.__name__ + ' sends a ' + request.method + ' request')
+        return self.add(request.endpoint)
+
+    def flush(self):
+        '''Send the queued requests now.'''
+        if self._pending:
+            self._results += do_batch_get(self._pending, self.access_token)
+            self._pending = []
+
+    def results(self):
+        '''Send any queued requests and return all the responses.
+
+        Returns:
+            List of JSON bodies, in the order the requests were added.
+        '''
+        self.flush()
+        return self._results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
 
 
 def get_url(access_token, endpoint=ams_rest_endpoint, flag=True):
@@ -147,7 +946,7 @@ def do_ams_auth(endpoint, body):
     '''
     headers = {"content-type": "application/x-www-form-urlencoded",
                "Accept": json_acceptformat}
-    return requests.post(endpoint, data=body, headers=headers)
+    return _send('POST', endpoint, data=body, headers=headers)
 
 
 def do_ams_get(endpoint, path, access_token):
@@ -168,12 +967,12 @@ def do_ams_get(endpoint, path, access_token):
              		"Authorization": "Bearer " + access_token,
              		"x-ms-version" : xmsversion}
     body = ''
-    response = requests.get(endpoint, headers=headers, allow_redirects=False)
+    response = _send('GET', endpoint, headers=headers, allow_redirects=False)
     # AMS response to the first call can be a redirect,
     # so we handle it here to make it transparent for the caller...
     if response.status_code == 301:
         redirected_url = ''.join([response.headers['location'], path])
-        response = requests.get(redirected_url, data=body, headers=headers)
+        response = _send('GET', redirected_url, data=body, headers=headers)
     return response
 
 
@@ -202,12 +1001,12 @@ def do_ams_put(endpoint, path, body, access_token, rformat="json", ds_min_versio
                    "Accept-Charset" : charset,
                    "Authorization": "Bearer " + access_token,
                    "x-ms-version" : xmsversion}
-    response = requests.put(endpoint, data=body, headers=headers, allow_redirects=False)
+    response = _send('PUT', endpoint, data=body, headers=headers, allow_redirects=False)
     # AMS response to the first call can be a redirect,
     # so we handle it here to make it transparent for the caller...
     if response.status_code == 301:
         redirected_url = ''.join([response.headers['location'], path])
-        response = requests.put(redirected_url, data=body, headers=headers)
+        response = _send('PUT', redirected_url, data=body, headers=headers)
         return response
 
 
@@ -240,12 +1039,12 @@ def do_ams_post(endpoint, path, body, access_token, rformat="json", ds_min_versi
                "Accept-Charset" : charset,
                "Authorization": "Bearer " + access_token,
                "x-ms-version" : xmsversion}
-    response = requests.post(endpoint, data=body, headers=headers, allow_redirects=False)
+    response = _send('POST', endpoint, data=body, headers=headers, allow_redirects=False)
     # AMS response to the first call can be a redirect,
     # so we handle it here to make it transparent for the caller...
     if response.status_code == 301:
         redirected_url = ''.join([response.headers['location'], path])
-        response = requests.post(redirected_url, data=body, headers=headers)
+        response = _send('POST', redirected_url, data=body, headers=headers)
     return response
 
 
@@ -267,12 +1066,12 @@ def do_ams_patch(endpoint, path, body, access_token):
                "Accept-Charset" : charset,
                "Authorization": "Bearer " + access_token,
                "x-ms-version" : xmsversion}
-    response = requests.patch(endpoint, data=body, headers=headers, allow_redirects=False)
+    response = _send('PATCH', endpoint, data=body, headers=headers, allow_redirects=False)
     # AMS response to the first call can be a redirect,
     # so we handle it here to make it transparent for the caller...
     if response.status_code == 301:
         redirected_url = ''.join([response.headers['location'], path])
-        response = requests.patch(redirected_url, data=body, headers=headers)
+        response = _send('PATCH', redirected_url, data=body, headers=headers)
     return response
 
 
@@ -292,12 +1091,12 @@ def do_ams_delete(endpoint, path, access_token):
                "Accept-Charset" : charset,
                "Authorization": 'Bearer ' + access_token,
                "x-ms-version" : xmsversion}
-    response = requests.delete(endpoint, headers=headers, allow_redirects=False)
+    response = _send('DELETE', endpoint, headers=headers, allow_redirects=False)
     # AMS response to the first call can be a redirect,
     # so we handle it here to make it transparent for the caller...
     if response.status_code == 301:
         redirected_url = ''.join([response.headers['location'], path])
-        response = requests.delete(redirected_url, headers=headers)
+        response = _send('DELETE', redirected_url, headers=headers)
     return response
 
 
@@ -318,7 +1117,7 @@ def do_ams_sto_put(endpoint, body, content_length):
                "x-ms-meta-m2": "v2",
                "x-ms-version" : "2015-02-21",
                "Content-Length" : str(content_length)}
-    return requests.put(endpoint, data=body, headers=headers)
+    return _send('PUT', endpoint, data=body, headers=headers)
 
 
 def do_ams_get_url(endpoint, access_token, flag=True):
@@ -339,8 +1138,8 @@ def do_ams_get_url(endpoint, access_token, flag=True):
                "Authorization": "Bearer " + access_token,
                "x-ms-version" : xmsversion}
     body = ''
-    response = requests.get(endpoint, headers=headers, allow_redirects=flag)
+    response = _send('GET', endpoint, headers=headers, allow_redirects=flag)
     if flag:
         if response.status_code == 301:
-            response = requests.get(response.headers['location'], data=body, headers=headers)
+            response = _send('GET', response.headers['location'], data=body, headers=headers)
     return response
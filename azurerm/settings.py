@@ -1,5 +1,7 @@
 '''settings.py - place to store constants for azurerm'''
+import contextlib
 import os
+import threading
 
 #AMS Endpoints...
 ams_auth_endpoint = 'https://wamsprodglobal001acs.accesscontrol.windows.net/v2/OAuth2-13'
@@ -13,6 +15,7 @@ GRAPH_RESOURCE_HOST = 'graph.microsoft.com'
 
 ACS_API = '2017-01-31'
 BASE_API = '2016-06-01'
+BATCH_API = '2015-11-01'
 COMP_API = '2019-03-01'
 CONTAINER_API = '2017-08-01-preview'
 COSMOSDB_API = '2015-04-08'
@@ -37,14 +40,112 @@ dsversion_min = "3.0;NetFx"
 dsversion_max = "3.0;NetFx"
 charset = "UTF-8"
 
+# HTTP keep-alive connection pool size per host type (connections kept open per host)
+HTTP_POOL_SIZES = {'arm': 50, 'keyvault': 20, 'graph': 10, 'media': 10, 'blob': 20, 'default': 10}
+
+# default seconds to wait for a connection, and for data from the server, see set_timeouts()
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 120
+
+# Azure Resource Manager request limits per subscription per hour, used by the rate limiter
+RATE_LIMIT_READS = 12000
+RATE_LIMIT_WRITES = 1200
+# times a throttled (429) request is retried before the response is returned to the caller
+RATE_LIMIT_MAX_RETRIES = 3
+
+# maximum number of responses kept by the do_get() ETag cache, see enable_etag_cache()
+ETAG_CACHE_SIZE = 256
+
+# hedged GETs, see enable_hedging(): send a second request when the first is slower than this
+# percentile of recent latencies for the host, with at most this fraction of GETs hedged
+HEDGE_PERCENTILE = 95
+HEDGE_BUDGET = 0.05
+# threads which send the second request of hedged GETs, and recent latencies kept per host
+HEDGE_WORKERS = 32
+HEDGE_LATENCY_SAMPLES = 200
+
+# long-running operation polling: first interval, growth factor and cap, in seconds
+LRO_POLL_INTERVAL = 1
+LRO_POLL_BACKOFF = 1.5
+LRO_MAX_POLL_INTERVAL = 30
+# status requests which fail to connect or time out in a row before an operation is 'Failed'
+LRO_POLL_MAX_ERRORS = 5
+# iter_completed(): status requests in flight at once, and status requests per second overall
+LRO_WAIT_WORKERS = 8
+LRO_WAIT_REQUESTS_PER_SECOND = 20
+
+# seconds before expiry that cached service principal tokens are refreshed in the background,
+# and seconds to wait before retrying a failed refresh
+TOKEN_REFRESH_MARGIN = 300
+TOKEN_REFRESH_RETRY = 30
+# tokens acquired or refreshed at once by CredentialPool and the background refresh thread
+CREDENTIAL_POOL_WORKERS = 16
+
+# fan_out(): subscriptions listed at once, and list items buffered ahead of the caller
+FAN_OUT_WORKERS = 8
+FAN_OUT_QUEUE_SIZE = 1000
+
+# bulk_vmss_vms(): instance ids per request, and requests in progress at once
+VMSS_BULK_CHUNK_SIZE = 50
+VMSS_BULK_WORKERS = 4
+# rolling_upgrade_vmss(): update domains upgraded at once, fault domains taken down at once
+# within them (None for no limit), and seconds to wait for them to be healthy before stopping
+VMSS_UPGRADE_PARALLEL_UDS = 1
+VMSS_UPGRADE_PARALLEL_FDS = None
+VMSS_UPGRADE_HEALTH_TIMEOUT = 600
+
+# InstanceViewWatcher: shortest and longest poll intervals in seconds, and the interval growth
+# factor while nothing changes
+WATCH_MIN_INTERVAL = 5
+WATCH_MAX_INTERVAL = 120
+WATCH_BACKOFF = 2
+
+# maximum sub-requests in one Azure Resource Manager batch request
+BATCH_MAX_REQUESTS = 20
+
+# maximum requests in flight at once per event loop in azurerm.aio
+AIO_MAX_CONCURRENCY = 100
+
+
+# endpoints set for the current thread by use_endpoints(), which take precedence over the
+# environment variables
+_endpoints = threading.local()
+
+
+@contextlib.contextmanager
+def use_endpoints(rm_endpoint=None, auth_endpoint=None, resource_endpoint=None):
+    '''Use the given endpoints for calls made by the current thread in a with block.
+
+    Used by AzureRMClient so each client can talk to its own cloud. Endpoints left as None
+    keep their current value.
+
+    Args:
+        rm_endpoint (str): Optional Azure Resource Manager endpoint.
+        auth_endpoint (str): Optional Azure auth endpoint.
+        resource_endpoint (str): Optional Azure resource endpoint.
+    '''
+    saved = vars(_endpoints).copy()
+    for name, value in (('rm', rm_endpoint), ('auth', auth_endpoint),
+                        ('resource', resource_endpoint)):
+        if value is not None:
+            setattr(_endpoints, name, value)
+    try:
+        yield
+    finally:
+        vars(_endpoints).clear()
+        vars(_endpoints).update(saved)
+
 
 def get_rm_endpoint():
     '''Set Azure Resource Manager endpoint by environment variable, else return default value.
 
     These functions facilitate the use of national and isolated clouds by allowing endpoints to
     be set dynamically. The default settings, if no environment varibles are used,
-    are for public cloud.
+    are for public cloud. An endpoint set with use_endpoints() takes precedence.
     '''
+    rm_endpoint = getattr(_endpoints, 'rm', None)
+    if rm_endpoint is not None:
+        return rm_endpoint
     rm_endpoint = os.environ.get('AZURE_RM_ENDPOINT')
     if rm_endpoint is None:
         return AZURE_RM_ENDPOINT
@@ -55,6 +156,9 @@ def get_rm_endpoint():
 def get_auth_endpoint():
     '''Set Azure auth endpoint by environment variable, else return default value.
     '''
+    auth_endpoint = getattr(_endpoints, 'auth', None)
+    if auth_endpoint is not None:
+        return auth_endpoint
     auth_endpoint = os.environ.get('AZURE_AUTH_ENDPOINT')
     if auth_endpoint is None:
         return AZURE_AUTH_ENDPOINT
@@ -65,6 +169,9 @@ def get_auth_endpoint():
 def get_resource_endpoint():
     '''Set Azure reosurce endpoint by environment variable, else return default value.
     '''
+    resource_endpoint = getattr(_endpoints, 'resource', None)
+    if resource_endpoint is not None:
+        return resource_endpoint
     resource_endpoint = os.environ.get('AZURE_RESOURCE_ENDPOINT')
     if resource_endpoint is None:
         return AZURE_RESOURCE_ENDPOINT
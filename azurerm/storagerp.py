@@ -1,6 +1,6 @@
 '''storagerp.py - azurerm functions for the Microsoft.Storage resource provider'''
 import json
-from .restfns import do_delete, do_get, do_put, do_post
+from .restfns import do_delete, do_get, do_put, do_post, iter_values
 from .settings import get_rm_endpoint, STORAGE_API
 
 
@@ -112,6 +112,42 @@ def get_storage_usage(access_token, subscription_id, location):
     return do_get(endpoint, access_token)
 
 
+def iter_storage_accounts_rg(access_token, subscription_id, rgname):
+    '''Iterate over the storage accounts in the specified resource group.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        rgname (str): Azure resource group name.
+
+    Yields:
+        JSON body of each storage account.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/resourcegroups/', rgname,
+                        '/providers/Microsoft.Storage/storageAccounts',
+                        '?api-version=', STORAGE_API])
+    return iter_values(endpoint, access_token)
+
+
+def iter_storage_accounts_sub(access_token, subscription_id):
+    '''Iterate over the storage accounts in the specified subscription.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+
+    Yields:
+        JSON body of each storage account.
+    '''
+    endpoint = ''.join([get_rm_endpoint(),
+                        '/subscriptions/', subscription_id,
+                        '/providers/Microsoft.Storage/storageAccounts',
+                        '?api-version=', STORAGE_API])
+    return iter_values(endpoint, access_token)
+
+
 def list_storage_accounts_rg(access_token, subscription_id, rgname):
     '''List the storage accounts in the specified resource group.
 
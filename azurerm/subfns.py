@@ -1,8 +1,5 @@
 '''subnfs - place to store azurerm functions related to subscriptions'''
-import io
-import json
-import os
-
+from .clicache import get_cli_path, get_cli_profile
 from .restfns import do_get
 from .settings import BASE_API, get_rm_endpoint
 
@@ -21,19 +18,15 @@ def get_subscription_from_cli(name=None):
     Requirements:
         User has run 'az login' once, or is in Azure Cloud Shell.
     '''
-    home = os.path.expanduser('~')
-    azure_profile_path = home + os.sep + '.azure' + os.sep + 'azureProfile.json'
-    if os.path.isfile(azure_profile_path) is False:
+    profile = get_cli_profile()
+    if profile is None:
         print('Error from get_subscription_from_cli(): Cannot find ' +
-              azure_profile_path)
+              get_cli_path('azureProfile.json'))
+        return None
+    subscription_info = profile.default if name is None else profile.by_name.get(name)
+    if subscription_info is None:
         return None
-    with io.open(azure_profile_path, 'r', encoding='utf-8-sig') as azure_profile_fd:
-        azure_profile = json.load(azure_profile_fd)
-    for subscription_info in azure_profile['subscriptions']:
-        if (name is None and subscription_info['isDefault'] is True) or \
-                                            subscription_info['name'] == name:
-            return subscription_info['id']
-    return None
+    return subscription_info['id']
 
 
 def list_locations(access_token, subscription_id):
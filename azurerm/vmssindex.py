@@ -0,0 +1,223 @@
+'''vmssindex.py - compact, indexed table of the VMs in a VM scale set
+
+list_vmss_vms() and list_vmss_vm_instance_view() return a deeply nested JSON body per VM.
+VmssInstanceTable keeps only what schedulers ask about - instance id, update domain, fault
+domain, zone, provisioning state and power state - in typed arrays, with an index on each
+column, so questions like "which instances in UD 3 are stopped?" are answered without scanning.
+Each index holds the set of rows with each value, so adding, updating or removing a VM changes
+one set entry per column, and a selection on several columns intersects the sets, starting from
+the smallest.
+'''
+from array import array
+
+from .computerp import iter_vmss_vms_expanded, _vmss_vm_status
+
+# array type code, and the number stored for a missing value, by column
+_COLUMN_TYPES = {'update_domain': 'h', 'fault_domain': 'h', 'zone': 'b',
+                 'provisioning_state': 'b', 'power_state': 'b'}
+# columns whose string values are stored as small integer codes
+_CODED_COLUMNS = ('zone', 'provisioning_state', 'power_state')
+
+
+class VmssInstanceTable:
+    '''The VMs of a scale set, one row of typed array columns per VM, with an index per column.
+
+    Columns are update_domain and fault_domain (int), and zone, provisioning_state and
+    power_state (str, states in lower case, e.g. 'running' or 'deallocated'). Missing values
+    are None. E.g.
+
+        table = azurerm.get_vmss_instance_table(access_token, subscription_id, rgname, vmssname)
+        stopped = table.select(update_domain=3, power_state='stopped')
+
+    Args:
+        vms (iterable): Optional VM JSON bodies to add, e.g. the 'value' list of
+            list_vmss_vms() or list_vmss_vm_instance_view(), or iter_vmss_vm_instance_view().
+    '''
+    __slots__ = ('_rows', '_instance_ids', '_free', '_columns', '_indexes', '_codes', '_values')
+
+    COLUMNS = ('update_domain', 'fault_domain', 'zone', 'provisioning_state', 'power_state')
+
+    def __init__(self, vms=()):
+        self._rows = {}
+        self._instance_ids = []
+        self._free = []
+        self._columns = {column: array(_COLUMN_TYPES[column]) for column in self.COLUMNS}
+        self._indexes = {column: {} for column in self.COLUMNS}
+        self._codes = {column: {} for column in _CODED_COLUMNS}
+        self._values = {column: [] for column in _CODED_COLUMNS}
+        for vm in vms:
+            self.add(vm)
+
+    def _encode(self, column, value):
+        if value is None:
+            return -1
+        if column not in self._codes:
+            return value
+        code = self._codes[column].get(value)
+        if code is None:
+            code = self._codes[column][value] = len(self._values[column])
+            self._values[column].append(value)
+        return code
+
+    def _decode(self, column, code):
+        if code == -1:
+            return None
+        if column not in self._codes:
+            return code
+        return self._values[column][code]
+
+    def add(self, vm):
+        '''Add a VM to the table, or update its row if it is already there.
+
+        Args:
+            vm (dict): JSON body of a scale set VM with its instance view, as listed by
+                list_vmss_vms() or list_vmss_vm_instance_view().
+        '''
+        instance_id, update_domain, fault_domain, provisioning_state, power_state = \
+            _vmss_vm_status(vm)
+        zones = vm.get('zones')
+        self.set(instance_id, update_domain=update_domain, fault_domain=fault_domain,
+                 zone=zones[0] if zones else None, provisioning_state=provisioning_state,
+                 power_state=power_state)
+
+    def set(self, instance_id, **values):
+        '''Set column values for a VM, adding a row for it if it isn't in the table.
+
+        Args:
+            instance_id (str): VM instance id.
+            values: Column values, e.g. power_state='running'. Columns not given are unchanged,
+                or None for a new row.
+
+        Raises:
+            TypeError: If a column name is unknown.
+        '''
+        for column in values:
+            if column not in self._indexes:
+                raise TypeError('Unknown column: ' + column)
+        instance_id = str(instance_id)
+        row = self._rows.get(instance_id)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+                self._instance_ids[row] = instance_id
+            else:
+                row = len(self._instance_ids)
+                self._instance_ids.append(instance_id)
+                for column in self.COLUMNS:
+                    self._columns[column].append(-1)
+            self._rows[instance_id] = row
+            for column in self.COLUMNS:
+                self._columns[column][row] = -1
+                self._indexes[column].setdefault(-1, set()).add(row)
+        for column, value in values.items():
+            code = self._encode(column, value)
+            old_code = self._columns[column][row]
+            if code == old_code:
+                continue
+            index = self._indexes[column]
+            index[old_code].discard(row)
+            self._columns[column][row] = code
+            index.setdefault(code, set()).add(row)
+
+    def remove(self, instance_id):
+        '''Remove a VM from the table, e.g. after a scale in. Its row is reused.
+
+        Raises:
+            KeyError: If the VM isn't in the table.
+        '''
+        row = self._rows.pop(str(instance_id))
+        for column in self.COLUMNS:
+            self._indexes[column][self._columns[column][row]].discard(row)
+        self._instance_ids[row] = None
+        self._free.append(row)
+
+    def get(self, instance_id):
+        '''Return a dictionary of a VM's column values.
+
+        Raises:
+            KeyError: If the VM isn't in the table.
+        '''
+        row = self._rows[str(instance_id)]
+        return {column: self._decode(column, self._columns[column][row])
+                for column in self.COLUMNS}
+
+    def _match(self, criteria):
+        '''Return the set of rows matching every column=value criterion.'''
+        matches = []
+        for column, value in criteria.items():
+            if column not in self._indexes:
+                raise TypeError('Unknown column: ' + column)
+            if column in self._codes and value is not None and value not in self._codes[column]:
+                return set()
+            matches.append(self._indexes[column].get(self._encode(column, value), set()))
+        if not matches:
+            return set(self._rows.values())
+        # intersecting from the smallest set keeps the work proportional to it
+        matches.sort(key=len)
+        return matches[0].intersection(*matches[1:])
+
+    def select(self, **criteria):
+        '''Return the instance ids of the VMs matching all the given column values.
+
+        E.g. table.select(update_domain=3, power_state='stopped')
+
+        Args:
+            criteria: Column values to match. With none, every VM is selected.
+
+        Returns:
+            List of instance id strings.
+        '''
+        return [self._instance_ids[row] for row in sorted(self._match(criteria))]
+
+    def count(self, **criteria):
+        '''Return the number of VMs matching all the given column values. See select().'''
+        return len(self._match(criteria))
+
+    def counts(self, column):
+        '''Return the number of VMs for each value of a column.
+
+        E.g. table.counts('power_state') returns {'running': 980, 'deallocated': 20}
+
+        Returns:
+            Dictionary of value to count, for values with at least one VM.
+        '''
+        return {self._decode(column, code): len(rows)
+                for code, rows in self._indexes[column].items() if rows}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, instance_id):
+        return str(instance_id) in self._rows
+
+    def __iter__(self):
+        return iter(list(self._rows))
+
+    def __repr__(self):
+        return '<VmssInstanceTable: ' + str(len(self)) + ' VMs>'
+
+
+def get_vmss_instance_table(access_token, subscription_id, resource_group, vmss_name):
+    '''Build a VmssInstanceTable for a VM scale set.
+
+    The VMs are listed with their instance views a page at a time, so the JSON of only one page
+    is held in memory at once.
+
+    Args:
+        access_token (str): A valid Azure authentication token.
+        subscription_id (str): Azure subscription id.
+        resource_group (str): Azure resource group name.
+        vmss_name (str): Name of the virtual machine scale set.
+
+    Returns:
+        A VmssInstanceTable.
+
+    Raises:
+        ValueError: If the VMs can't be listed. The message includes the error body.
+    '''
+    table = VmssInstanceTable()
+    for vm in iter_vmss_vms_expanded(access_token, subscription_id, resource_group, vmss_name):
+        if 'instanceId' not in vm:
+            raise ValueError('Error listing VMs: ' + str(vm))
+        table.add(vm)
+    return table
@@ -0,0 +1,66 @@
+'''import_time.py - benchmark the startup cost of importing azurerm
+
+Runs each snippet in a fresh interpreter, several times, and reports the best wall clock time
+and which heavy dependencies ended up loaded. Also prints the slowest imports reported by
+python -X importtime for "import azurerm", and for importing computerp, which is what the first
+use of azurerm.list_vmss loads. (importtime doesn't see modules loaded through
+importlib.import_module(), which is how lazy names are loaded, so that import is made directly.)
+
+Usage: python benchmarks/import_time.py [runs]
+'''
+import subprocess
+import sys
+
+SNIPPETS = [
+    ('import azurerm', 'import azurerm'),
+    ('azurerm.list_vmss', 'import azurerm; azurerm.list_vmss'),
+    ('azurerm.get_access_token', 'import azurerm; azurerm.get_access_token'),
+    ('from azurerm import * (eager)', 'from azurerm import *'),
+]
+
+TIMER = '''
+import sys, time
+start = time.perf_counter()
+{}
+elapsed = time.perf_counter() - start
+print(elapsed, ','.join(m for m in ('adal', 'requests', 'cryptography') if m in sys.modules))
+'''
+
+
+def run_snippet(code, runs):
+    '''Return the best time in seconds and the heavy modules loaded by a snippet.'''
+    best = None
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', TIMER.format(code)])
+        elapsed, loaded = output.decode().split(' ', 1)
+        best = float(elapsed) if best is None else min(best, float(elapsed))
+    return best, loaded.strip()
+
+
+def importtime_report(code, top=10):
+    '''Return the slowest imports reported by python -X importtime for a snippet.'''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, check=True)
+    rows = []
+    for line in result.stderr.decode().splitlines()[1:]:
+        self_us, cumulative_us, name = line.split('|')
+        self_us = self_us.split(':')[1]
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for name, code in SNIPPETS:
+        best, loaded = run_snippet(code, runs)
+        print('{:<32} {:>8.1f} ms  loads: {}'.format(name, best * 1000, loaded or '-'))
+    for code in ('import azurerm', 'import azurerm.computerp'):
+        print()
+        print('python -X importtime -c "' + code + '" (cumulative us, self us, module):')
+        for cumulative_us, self_us, name in importtime_report(code):
+            print('{:>10} {:>10} {}'.format(cumulative_us, self_us, name))
+
+
+if __name__ == '__main__':
+    main()
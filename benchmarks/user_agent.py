@@ -0,0 +1,59 @@
+'''user_agent.py - benchmark the per-request cost of building azurerm request headers
+
+Compares the header building done for every request before the User-Agent string was cached
+(pkg_resources.require() and platform.platform() on each call) with the current
+get_user_agent(). Does not make any HTTP requests.
+
+Usage: python benchmarks/user_agent.py [iterations]
+'''
+import platform
+import sys
+import time
+import timeit
+
+import requests
+
+import azurerm
+
+
+def uncached_headers(access_token):
+    '''Build request headers the way restfns did before the User-Agent was cached.'''
+    import pkg_resources
+    version = pkg_resources.require("azurerm")[0].version
+    user_agent = "python/{} ({}) requests/{} azurerm/{}".format(
+        platform.python_version(),
+        platform.platform(),
+        requests.__version__,
+        version)
+    headers = {"Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = user_agent
+    return headers
+
+
+def cached_headers(access_token):
+    '''Build request headers the way restfns does now.'''
+    headers = {"Authorization": 'Bearer ' + access_token}
+    headers['User-Agent'] = azurerm.get_user_agent()
+    return headers
+
+
+def report(name, func, iterations):
+    seconds = min(timeit.repeat(lambda: func('token'), number=iterations, repeat=3))
+    print('{:<10} {:>10.2f} us per call'.format(name, seconds / iterations * 1e6))
+    return seconds
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    start = time.perf_counter()
+    import pkg_resources  # noqa: F401
+    print('import pkg_resources: {:.1f} ms'.format((time.perf_counter() - start) * 1000))
+
+    before = report('before', uncached_headers, iterations)
+    after = report('after', cached_headers, iterations)
+    print('speedup: {:.0f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
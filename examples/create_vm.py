@@ -2,7 +2,6 @@
 import argparse
 import json
 import sys
-import time
 
 import azurerm
 from haikunator import Haikunator
@@ -80,12 +79,7 @@ def main():
     print('ip_id = ' + ip_id)
 
     print('Waiting for IP provisioning..')
-    waiting = True
-    while waiting:
-        ipa = azurerm.get_public_ip(access_token, subscription_id, rgname, public_ip_name)
-        if ipa['properties']['provisioningState'] == 'Succeeded':
-            waiting = False
-        time.sleep(1)
+    azurerm.wait_for_operation(rmreturn)
 
     # create NIC
     nic_name = name + 'nic'
@@ -96,12 +90,7 @@ def main():
     nic_id = rmreturn.json()['id']
 
     print('Waiting for NIC provisioning..')
-    waiting = True
-    while waiting:
-        nic = azurerm.get_nic(access_token, subscription_id, rgname, nic_name)
-        if nic['properties']['provisioningState'] == 'Succeeded':
-            waiting = False
-        time.sleep(1)
+    azurerm.wait_for_operation(rmreturn)
 
     # create VM
     vm_name = name
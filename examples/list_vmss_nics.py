@@ -46,12 +46,14 @@ def main():
         vms = azurerm.list_vmss_vms(
             access_token, subscription_id, rgname, name)
         #print(json.dumps(vms, sort_keys=False, indent=2, separators=(',', ': ')))
+        # get the VM NICs through the batch endpoint, 20 VMs per request
+        batch = azurerm.BatchGet(access_token)
         for vmssvm in vms['value']:
-            vm_id = vmssvm['instanceId']
-            print(vm_id + ', ' + vmssvm['name'] + '\n')
+            batch.add_call(azurerm.get_vmss_vm_nics, access_token, subscription_id, rgname, name,
+                           vmssvm['instanceId'])
+        for vmssvm, vmnics in zip(vms['value'], batch.results()):
+            print(vmssvm['instanceId'] + ', ' + vmssvm['name'] + '\n')
             print('VMSS VM NICs...')
-            vmnics = azurerm.get_vmss_vm_nics(access_token, subscription_id, rgname, name,
-                                              vm_id)
             print(json.dumps(vmnics, sort_keys=False,
                              indent=2, separators=(',', ': ')))
 
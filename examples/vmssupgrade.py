@@ -43,6 +43,12 @@ def main():
                             action='store', type=int, help='Single VM ID (int)')
     arg_parser.add_argument('--vmlist', '-l', dest='vmlist',
                             action='store', help='List of VM IDs e.g. "["1", "2"]"')
+    arg_parser.add_argument('--rolling', '-a', action='store_true', default=False,
+                            help='Upgrade all update domains in turn, checking health')
+    arg_parser.add_argument('--paralleluds', '-p', dest='paralleluds', action='store', type=int,
+                            default=1, help='Update domains to upgrade at once with --rolling')
+    arg_parser.add_argument('--parallelfds', '-f', dest='parallelfds', action='store', type=int,
+                            help='Fault domains to take down at once with --rolling')
     arg_parser.add_argument('--nowait', '-w', action='store_true',
                             default=False, help='Start upgrades and then exit without waiting')
     arg_parser.add_argument('--verbose', '-v', action='store_true',
@@ -70,7 +76,9 @@ def main():
         arg_parser.error(
             'You must specify a new version for platform images or a custom uri for custom images')
 
-    if args.updatedomain is not None:
+    if args.rolling:
+        upgrademode = 'rolling'
+    elif args.updatedomain is not None:
         updatedomain = args.updatedomain
         upgrademode = 'updatedomain'
     elif args.vmid is not None:
@@ -81,7 +89,7 @@ def main():
         upgrademode = 'vmlist'
     else:
         arg_parser.error(
-            'You must specify an update domain, a vm id, or a vm list')
+            'You must specify an update domain, a vm id, a vm list, or --rolling')
 
     # Load Azure app defaults
     try:
@@ -155,6 +163,21 @@ def main():
             print('Image URI updated to ' + customuri +
                   ' in model for VM Scale Set: ' + vmssname)
 
+    # upgrade every update domain in turn, stopping if a batch fails or stays unhealthy
+    if upgrademode == 'rolling':
+        print('Rolling upgrade of ' + vmssname + ', ' + str(args.paralleluds) + ' UD(s) at a time')
+        report = azurerm.rolling_upgrade_vmss(
+            access_token, subscription_id, resource_group, vmssname,
+            max_parallel_uds=args.paralleluds, max_parallel_fds=args.parallelfds,
+            progress=lambda entry: print('UD ' + str(entry['updateDomain']) + ': ' +
+                                         entry['status']))
+        print('Upgrade ' + report['status'] + ': ' + str(len(report['upgraded'])) +
+              ' upgraded, ' + str(len(report['skipped'])) + ' already up to date, ' +
+              str(len(report['failed'])) + ' failed')
+        if verbose:
+            print(json.dumps(report, sort_keys=False, indent=2, separators=(',', ': ')))
+        return
+
     # build the list of VMs to upgrade depending on the upgrademode setting
     if upgrademode == 'updatedomain':
         # list the VMSS VM instance views to determine their update domains
@@ -178,20 +201,13 @@ def main():
     print(upgraderesult)
 
     # now wait for upgrade to complete
-    # query VM scale set instance view
     if not nowait:
-        updatecomplete = False
-        provisioningstate = ''
-        while not updatecomplete:
-            vmssinstance_view = azurerm.get_vmss_instance_view(
-                access_token, subscription_id, resource_group, vmssname)
-            for status in vmssinstance_view['statuses']:
-                provisioningstate = status['code']
-                if provisioningstate == 'ProvisioningState/succeeded':
-                    updatecomplete = True
+        poller = azurerm.OperationPoller(upgraderesult)
+        while not poller.done():
+            time.sleep(poller.delay())
+            poller.poll()
             if verbose:
-                print(provisioningstate)
-            time.sleep(5)
+                print(poller.status)
     else:
         print('Check Scale Set provisioning state to determine when upgrade is complete.')
 
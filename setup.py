@@ -16,9 +16,12 @@ setup(name='azurerm',
       author='sendmarsh',
       author_email='guybo@outlook.com',
       license='MIT',
-      packages=['azurerm'],
+      packages=['azurerm', 'azurerm.aio'],
       install_requires=[
           'adal',
           'requests',
       ],
+      extras_require={
+          'aio': ['aiohttp'],
+      },
       zip_safe=False)
@@ -0,0 +1,96 @@
+# azurerm unit tests - service principal token cache
+# To run tests: python -m unittest adalfns_test.py
+# Note: Like aio_test.py these tests don't call Azure. Azure AD is replaced by a stand-in adal
+#  AuthenticationContext which only accepts the secret 'good', so no azurermconfig.json is needed.
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import azurerm
+from azurerm import adalfns
+
+
+class StandInContext:
+    '''Stand-in for adal.AuthenticationContext.'''
+    calls = []
+
+    def __init__(self, authority, api_version=None):
+        self.authority = authority
+
+    def acquire_token_with_client_credentials(self, resource, application_id, secret):
+        StandInContext.calls.append((self.authority, application_id, secret))
+        if secret != 'good':
+            raise ValueError('AADSTS7000215: Invalid client secret')
+        return {'accessToken': 'token-' + self.authority.rsplit('/', 1)[1], 'expiresIn': 3600}
+
+
+class TestAzurermAdalfns(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(adalfns.adal, 'AuthenticationContext', StandInContext)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        StandInContext.calls = []
+        adalfns._token_cache.clear()
+
+    def test_cached_token(self):
+        self.assertEqual(azurerm.get_access_token('tenant', 'app', 'good'), 'token-tenant')
+        self.assertEqual(azurerm.get_access_token('tenant', 'app', 'good'), 'token-tenant')
+        self.assertEqual(len(StandInContext.calls), 1)
+
+    def test_wrong_secret_not_served_from_cache(self):
+        self.assertEqual(azurerm.get_access_token('tenant', 'app', 'good'), 'token-tenant')
+        with self.assertRaises(ValueError):
+            azurerm.get_access_token('tenant', 'app', 'WRONG')
+        self.assertEqual(len(StandInContext.calls), 2)
+        # the good credential's cached entry still has the good secret
+        credential = azurerm.ServicePrincipalCredential('tenant', 'app', 'good')
+        credential._entry.refresh()
+        self.assertEqual(StandInContext.calls[-1][2], 'good')
+
+    def test_authority_in_key(self):
+        azurerm.get_access_token('tenant', 'app', 'good')
+        with azurerm.settings.use_endpoints(auth_endpoint='https://login.example.cn/'):
+            azurerm.get_access_token('tenant', 'app', 'good')
+        self.assertEqual([call[0] for call in StandInContext.calls],
+                         [azurerm.settings.get_auth_endpoint() + 'tenant',
+                          'https://login.example.cn/tenant'])
+
+    def test_credential_pool(self):
+        pool = azurerm.CredentialPool()
+        for tenant_id in ('tenant-a', 'tenant-b'):
+            pool.add(tenant_id, 'app', 'good')
+        pool.add('tenant-c', 'app', 'WRONG')
+        errors = pool.acquire_all()
+        self.assertEqual(list(errors), ['tenant-c'])
+        self.assertEqual(pool.get_token(tenant_id='tenant-b'), 'token-tenant-b')
+
+
+    def test_credential_pool_maps_subscriptions_on_miss(self):
+        listed = []
+
+        def list_subscriptions(access_token):
+            listed.append(access_token)
+            tenant = access_token[len('token-'):]
+            return {'value': [{'subscriptionId': 'sub-' + tenant + str(i)} for i in range(2)]}
+
+        pool = azurerm.CredentialPool()
+        for tenant_id in ('tenant-a', 'tenant-b'):
+            pool.add(tenant_id, 'app', 'good')
+        with mock.patch.object(adalfns, 'list_subscriptions', list_subscriptions):
+            # concurrent lookups before map_subscriptions() has been called map them once
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                tokens = list(executor.map(lambda _: pool.get_token(
+                    subscription_id='SUB-TENANT-B1'), range(8)))
+            self.assertEqual(tokens, ['token-tenant-b'] * 8)
+            self.assertEqual(sorted(listed), ['token-tenant-a', 'token-tenant-b'])
+            self.assertEqual(pool.get_token(subscription_id='sub-tenant-a0'), 'token-tenant-a')
+            self.assertEqual(len(listed), 2)
+            # a subscription no credential can see is looked for once more, then raises
+            with self.assertRaises(KeyError):
+                pool.get_token(subscription_id='sub-other')
+            self.assertEqual(len(listed), 4)
+
+if __name__ == '__main__':
+    unittest.main()
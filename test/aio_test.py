@@ -0,0 +1,136 @@
+# azurerm unit tests - asyncio functions
+# To run tests: python -m unittest aio_test.py
+# Note: Unlike the other units these tests don't call Azure. They run the azurerm.aio functions
+#  against a local stand-in HTTP server, so no azurermconfig.json is needed. Requires aiohttp.
+
+import asyncio
+import json
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import azurerm.aio
+
+SUB = '00000000-0000-0000-0000-000000000000'
+VMSS_PATH = '/subscriptions/' + SUB + \
+    '/resourceGroups/rg/providers/Microsoft.Compute/virtualMachineScaleSets/vmss'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''Answers a few Compute RP requests with canned JSON.'''
+    protocol_version = 'HTTP/1.1'
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        with StandInHandler.lock:
+            StandInHandler.in_flight += 1
+            StandInHandler.max_in_flight = max(StandInHandler.max_in_flight,
+                                               StandInHandler.in_flight)
+        time.sleep(0.01)
+        path, _, query = self.path.partition('?')
+        if path.startswith(VMSS_PATH + '/virtualMachines/'):
+            self.reply(200, {'instanceId': path.rsplit('/', 1)[1]})
+        elif path == VMSS_PATH + '/virtualMachines':
+            page = int(query.split('page=')[1]) if 'page=' in query else 0
+            body = {'value': [{'instanceId': str(page * 2)}, {'instanceId': str(page * 2 + 1)}]}
+            if page < 2:
+                body['nextLink'] = self.server.url + path + '?page=' + str(page + 1)
+            self.reply(200, body)
+        elif path == VMSS_PATH:
+            self.reply(200, {'name': 'vmss'})
+        else:
+            self.reply(404, {'error': {'code': 'ResourceNotFound'}})
+        with StandInHandler.lock:
+            StandInHandler.in_flight -= 1
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length).decode('utf-8'))
+        self.reply(202, body)
+
+
+class TestAzurermAio(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.url = 'http://127.0.0.1:' + str(cls.server.server_port)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.saved_endpoint = os.environ.get('AZURE_RM_ENDPOINT')
+        os.environ['AZURE_RM_ENDPOINT'] = cls.server.url
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        if cls.saved_endpoint is None:
+            del os.environ['AZURE_RM_ENDPOINT']
+        else:
+            os.environ['AZURE_RM_ENDPOINT'] = cls.saved_endpoint
+
+    def run_async(self, coroutine):
+        async def run_and_close():
+            try:
+                return await coroutine
+            finally:
+                await azurerm.aio.close_session()
+        return asyncio.run(run_and_close())
+
+    def test_get(self):
+        response = self.run_async(azurerm.aio.get_vmss('token', SUB, 'rg', 'vmss'))
+        self.assertEqual(response['name'], 'vmss')
+
+    def test_get_next_and_iter(self):
+        response = self.run_async(azurerm.aio.list_vmss_vms('token', SUB, 'rg', 'vmss'))
+        self.assertEqual([vm['instanceId'] for vm in response['value']],
+                         ['0', '1', '2', '3', '4', '5'])
+
+        async def collect():
+            return [vm['instanceId'] async for vm in
+                    azurerm.aio.iter_vmss_vms('token', SUB, 'rg', 'vmss')]
+        self.assertEqual(self.run_async(collect()), ['0', '1', '2', '3', '4', '5'])
+
+        async def collect_prefetch():
+            return [vm['instanceId'] async for vm in
+                    azurerm.aio.iter_vmss_vms('token', SUB, 'rg', 'vmss', prefetch=2)]
+        self.assertEqual(self.run_async(collect_prefetch()), ['0', '1', '2', '3', '4', '5'])
+
+    def test_post(self):
+        response = self.run_async(azurerm.aio.restart_vmss_vms('token', SUB, 'rg', 'vmss',
+                                                               '["1", "2"]'))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'instanceIds': ['1', '2']})
+
+    def test_bounded_concurrency(self):
+        azurerm.aio.set_max_concurrency(10)
+        StandInHandler.max_in_flight = 0
+
+        async def fan_out():
+            return await asyncio.gather(*[
+                azurerm.aio.get_vmss_vm('token', SUB, 'rg', 'vmss', str(instance_id))
+                for instance_id in range(200)])
+        try:
+            responses = self.run_async(fan_out())
+        finally:
+            azurerm.aio.set_max_concurrency(azurerm.settings.AIO_MAX_CONCURRENCY)
+        self.assertEqual([vm['instanceId'] for vm in responses],
+                         [str(instance_id) for instance_id in range(200)])
+        self.assertTrue(StandInHandler.max_in_flight <= 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
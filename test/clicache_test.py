@@ -0,0 +1,66 @@
+# azurerm unit tests - Azure CLI profile and token cache
+# To run tests: python -m unittest clicache_test.py
+# Note: Like aio_test.py these tests don't call Azure. They write CLI files to a temporary home
+#  directory, so no azurermconfig.json or 'az login' is needed.
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import azurerm
+
+
+class TestAzurermCliCache(unittest.TestCase):
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.saved_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.home
+        os.mkdir(os.path.join(self.home, '.azure'))
+        self.subscriptions = [
+            {'id': 'sub-a', 'name': 'a', 'isDefault': False, 'user': {'name': 'alice'}},
+            {'id': 'sub-b', 'name': 'b', 'isDefault': True, 'user': {'name': 'bob'}}]
+        self.write_profile()
+        self.write_json('accessTokens.json', [
+            {'userId': 'bob', 'accessToken': 'expired', 'tokenType': 'Bearer',
+             'expiresOn': '2018-01-01 00:00:00.000000'},
+            {'userId': 'alice', 'accessToken': 'alice-token', 'tokenType': 'Bearer',
+             'expiresOn': '2099-01-01T00:00:00.000000Z'},
+            {'userId': 'bob', 'accessToken': 'bob-token', 'tokenType': 'Bearer',
+             'expiresOn': '2099-01-01 00:00:00.000000'}])
+
+    def tearDown(self):
+        if self.saved_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self.saved_home
+        shutil.rmtree(self.home)
+
+    def write_json(self, file_name, data):
+        with open(os.path.join(self.home, '.azure', file_name), 'w') as file_fd:
+            json.dump(data, file_fd)
+
+    def write_profile(self):
+        self.write_json('azureProfile.json', {'subscriptions': self.subscriptions})
+
+    def test_cli_cache(self):
+        self.assertEqual(azurerm.get_subscription_from_cli(), 'sub-b')
+        self.assertEqual(azurerm.get_subscription_from_cli('a'), 'sub-a')
+        self.assertIsNone(azurerm.get_subscription_from_cli('missing'))
+        self.assertEqual(azurerm.get_access_token_from_cli(), 'bob-token')
+        self.assertIs(azurerm.get_cli_profile(), azurerm.get_cli_profile())
+
+        # a changed file is read again
+        time.sleep(0.01)
+        self.subscriptions[0]['isDefault'] = True
+        self.subscriptions[1]['isDefault'] = False
+        self.write_profile()
+        self.assertEqual(azurerm.get_subscription_from_cli(), 'sub-a')
+        self.assertEqual(azurerm.get_access_token_from_cli(), 'alice-token')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -169,6 +169,15 @@ class TestAzurermPy(unittest.TestCase):
         # print(json.dumps(response, sort_keys=False, indent=2, separators=(',', ': ')))
         self.assertEqual(response['statuses'][0]['displayStatus'], 'Creating')
 
+        # watch VM instance view
+        print('Watching VM instance view')
+        watcher = azurerm.InstanceViewWatcher(self.access_token, self.subscription_id, \
+            self.rgname, vm_name=self.vmname)
+        events = watcher.poll()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['change'], 'added')
+        self.assertEqual(watcher.interval, azurerm.WATCH_MIN_INTERVAL)
+
         # get availability set details
         print('Getting availability set details')
         response = azurerm.get_as(self.access_token, self.subscription_id, self.rgname, self.asname)
@@ -181,6 +190,12 @@ class TestAzurermPy(unittest.TestCase):
         # print(json.dumps(response, sort_keys=False, indent=2, separators=(',', ': ')))
         self.assertTrue(len(response['value']) > 0)
 
+        # iterate VMSS skus
+        print('Iterating VMSS skus')
+        skus = list(azurerm.iter_vmss_skus(self.access_token, self.subscription_id, \
+            self.rgname, self.vmssname))
+        self.assertEqual(len(skus), len(response['value']))
+
         # list VMSS nics
         print('Getting VMSS NICs')
         response = azurerm.get_vmss_nics(self.access_token, self.subscription_id, \
@@ -188,23 +203,60 @@ class TestAzurermPy(unittest.TestCase):
         print(json.dumps(response, sort_keys=False, indent=2, separators=(',', ': ')))
         # self.assertTrue(len(response['value']) > 0)
 
+        # summarize VMSS VM states
+        print('Summarizing VMSS VM states')
+        summary = azurerm.summarize_vmss_vms(self.access_token, self.subscription_id, \
+            self.rgname, self.vmssname)
+        self.assertNotIn('error', summary)
+        self.assertEqual(summary['total'], sum(summary['powerState'].values()))
+        self.assertEqual(summary['total'], sum(summary['updateDomain'].values()))
+
+        # restart VMSS VMs in chunks
+        print('Restarting VMSS VMs in chunks')
+        vms = azurerm.list_vmss_vms(self.access_token, self.subscription_id, self.rgname, \
+            self.vmssname)
+        instance_ids = [vm['instanceId'] for vm in vms['value']]
+        report = azurerm.bulk_vmss_vms(self.access_token, self.subscription_id, self.rgname, \
+            self.vmssname, azurerm.restart_vmss_vms, instance_ids, chunk_size=2, timeout=1200)
+        self.assertEqual(len(report['chunks']), (len(instance_ids) + 1) // 2)
+        self.assertEqual(sorted(report['succeeded']), sorted(instance_ids))
+        self.assertEqual(report['failed'], [])
+
+        # rolling upgrade, with every VM already on the latest model
+        print('Rolling upgrade of VMSS')
+        report = azurerm.rolling_upgrade_vmss(self.access_token, self.subscription_id, \
+            self.rgname, self.vmssname, max_parallel_uds=2)
+        self.assertEqual(report['status'], 'Succeeded')
+        self.assertEqual(sorted(report['skipped'] + report['upgraded']), sorted(instance_ids))
+
         # stop VM using skip_shutdown
         print('Stopping VM: ' + self.vmname)
         response = azurerm.stop_vm(self.access_token, self.subscription_id, self.rgname, \
             self.vmname, skip_shutdown=True)
         self.assertEqual(response.status_code, 202)
 
+        # wait for VM stop operation
+        print('Waiting for VM stop to complete')
+        poller = azurerm.wait_for_operation(response, timeout=600)
+        self.assertEqual(poller.status, 'Succeeded')
+
         # delete VM
         print('Deleting VM: ' + self.vmname)
-        response = azurerm.delete_vm(self.access_token, self.subscription_id, self.rgname, \
+        vm_response = azurerm.delete_vm(self.access_token, self.subscription_id, self.rgname, \
             self.vmname)
-        self.assertEqual(response.status_code, 202)
+        self.assertEqual(vm_response.status_code, 202)
 
         # delete VMSS
         print('Deleting VMSS: ' + self.vmssname)
-        response = azurerm.delete_vmss(self.access_token, self.subscription_id, self.rgname, \
-            self.vmssname)
-        self.assertEqual(response.status_code, 202)
+        vmss_response = azurerm.delete_vmss(self.access_token, self.subscription_id, \
+            self.rgname, self.vmssname)
+        self.assertEqual(vmss_response.status_code, 202)
+
+        # wait for VM and VMSS deletes
+        print('Waiting for VM and VMSS deletes to complete')
+        pollers = list(azurerm.iter_completed([vm_response, vmss_response], timeout=1200))
+        self.assertEqual(len(pollers), 2)
+        self.assertTrue(all(poller.status == 'Succeeded' for poller in pollers))
 
         # delete Availability Set
         print('Deleting Availability Set: ' + self.asname)
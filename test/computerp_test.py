@@ -0,0 +1,235 @@
+# azurerm unit tests - compute helpers which run many requests
+# To run tests: python -m unittest computerp_test.py
+# Note: Like aio_test.py these tests don't call Azure. Scale set requests go to the local
+#  stand-in server from restfns_test.py, so no azurermconfig.json is needed.
+
+import os
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+import azurerm
+from azurerm import computerp, operations
+from restfns_test import StandInHandler
+
+VMSS_PATH = '/subscriptions/sub-compute/resourceGroups/rg1/providers/Microsoft.Compute/' \
+    'virtualMachineScaleSets/vmss1'
+
+
+def vmss_vm(instance_id, update_domain, fault_domain, latest=False, power_state='running'):
+    '''JSON body of a scale set VM listed with its model and instance view.'''
+    return {'instanceId': str(instance_id),
+            'properties': {'latestModelApplied': latest, 'provisioningState': 'Succeeded',
+                           'instanceView': {'platformUpdateDomain': update_domain,
+                                            'platformFaultDomain': fault_domain,
+                                            'statuses': [
+                                                {'code': 'ProvisioningState/succeeded'},
+                                                {'code': 'PowerState/' + power_state}]}}}
+
+
+class TestAzurermComputeRp(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.daemon_threads = True
+        cls.url = 'http://127.0.0.1:' + str(cls.server.server_port)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        StandInHandler.routes = {
+            '/succeeded': lambda handler: (200, {}, {'status': 'Succeeded'}),
+            '/inprogress': lambda handler: (200, {}, {'status': 'InProgress'})}
+        StandInHandler.log = []
+        # set for every thread, unlike use_endpoints()
+        for patcher in (mock.patch.dict(os.environ, {'AZURE_RM_ENDPOINT': self.url}),
+                        mock.patch.object(operations, 'LRO_POLL_INTERVAL', 0.01),
+                        mock.patch.object(computerp, 'LRO_POLL_INTERVAL', 0.01)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def requests_to(self, path):
+        with StandInHandler.lock:
+            return [entry for entry in StandInHandler.log if entry[1].partition('?')[0] == path]
+
+    def accepted(self, status_path):
+        '''Answer for an action: accepted, with an operation status URL.'''
+        return 202, {'Azure-AsyncOperation': self.url + status_path}, None
+
+    def bulk_restart(self, instance_ids, **kwargs):
+        return azurerm.bulk_vmss_vms('token', 'sub-compute', 'rg1', 'vmss1',
+                                     azurerm.restart_vmss_vms, instance_ids, **kwargs)
+
+    def test_bulk_vmss_vms(self):
+        def restart(handler):
+            if '4' in handler.body['instanceIds']:
+                return 409, {}, {'error': {'code': 'OperationNotAllowed'}}
+            return self.accepted('/succeeded')
+
+        StandInHandler.routes[VMSS_PATH + '/restart'] = restart
+        report = self.bulk_restart(range(10), chunk_size=3, max_concurrency=2)
+        self.assertEqual(sorted(entry[3]['instanceIds'] for entry in
+                                self.requests_to(VMSS_PATH + '/restart')),
+                         [['0', '1', '2'], ['3', '4', '5'], ['6', '7', '8'], ['9']])
+        self.assertEqual([chunk['status'] for chunk in report['chunks']],
+                         ['Succeeded', 'Failed', 'Succeeded', 'Succeeded'])
+        self.assertEqual(report['chunks'][1]['error'], {'error': {'code': 'OperationNotAllowed'}})
+        self.assertEqual(report['succeeded'], ['0', '1', '2', '6', '7', '8', '9'])
+        self.assertEqual(report['failed'], ['3', '4', '5'])
+        self.assertEqual(report['inProgress'] + report['notStarted'], [])
+
+    def test_bulk_vmss_vms_timeout(self):
+        def restart(handler):
+            time.sleep(0.2)
+            return self.accepted('/inprogress')
+
+        StandInHandler.routes[VMSS_PATH + '/restart'] = restart
+        report = self.bulk_restart(range(8), chunk_size=2, max_concurrency=1, timeout=0.5)
+        # the chunks queued when the timeout passed were never sent
+        self.assertEqual(len(self.requests_to(VMSS_PATH + '/restart')), 1)
+        self.assertEqual([chunk['status'] for chunk in report['chunks']],
+                         ['InProgress'] + ['NotStarted'] * 3)
+        self.assertEqual(report['inProgress'], ['0', '1'])
+        self.assertEqual(report['notStarted'], [str(i) for i in range(2, 8)])
+        self.assertEqual(report['succeeded'] + report['failed'], [])
+
+
+    def serve_vms(self, vms, fail_ids=()):
+        '''Serve the listing, instance views and upgrade action for a scale set's VMs.'''
+        def upgrade(handler):
+            if set(handler.body['instanceIds']).intersection(fail_ids):
+                return 409, {}, {'error': {'code': 'OperationNotAllowed'}}
+            return self.accepted('/succeeded')
+
+        routes = StandInHandler.routes
+        routes[VMSS_PATH + '/virtualMachines'] = lambda handler: (200, {}, {'value': vms})
+        routes[VMSS_PATH + '/manualupgrade'] = upgrade
+        for vm in vms:
+            routes[VMSS_PATH + '/virtualMachines/' + vm['instanceId'] + '/instanceView'] = \
+                lambda handler, vm=vm: (200, {}, vm['properties']['instanceView'])
+
+    def upgrades(self):
+        '''The instance ids sent in each upgrade request, in the order they arrived.'''
+        return [entry[3]['instanceIds'] for entry in self.requests_to(VMSS_PATH + '/manualupgrade')]
+
+    def rolling_upgrade(self, **kwargs):
+        return azurerm.rolling_upgrade_vmss('token', 'sub-compute', 'rg1', 'vmss1', **kwargs)
+
+    def test_rolling_upgrade_fault_domains(self):
+        vms = [vmss_vm(i, i % 2, i % 3, latest=i == 0) for i in range(12)]
+        self.serve_vms(vms)
+        report = self.rolling_upgrade(max_parallel_uds=2, max_parallel_fds=1)
+        self.assertEqual(report['status'], 'Succeeded')
+        self.assertEqual(report['skipped'], ['0'])
+        self.assertEqual(sorted(report['upgraded'], key=int), [str(i) for i in range(1, 12)])
+        self.assertEqual(report['updateDomains'][0]['faultDomains'],
+                         {0: ['6'], 1: ['4', '10'], 2: ['2', '8']})
+        self.assertEqual([entry['status'] for entry in report['updateDomains']],
+                         ['Succeeded', 'Succeeded'])
+        # both update domains at once, one fault domain at a time
+        upgrades = self.upgrades()
+        self.assertEqual(sorted(upgrades), [['1', '7'], ['2', '8'], ['3', '9'], ['4', '10'],
+                                            ['5', '11'], ['6']])
+        fault_domains = [int(instance_ids[0]) % 3 for instance_ids in upgrades]
+        self.assertEqual(fault_domains, sorted(fault_domains))
+        # health is checked with the instance views of the upgraded VMs only
+        self.assertEqual(len(self.requests_to(VMSS_PATH + '/virtualMachines')), 1)
+        self.assertEqual(len(self.requests_to(VMSS_PATH + '/virtualMachines/0/instanceView')), 0)
+        self.assertEqual(len(self.requests_to(VMSS_PATH + '/virtualMachines/5/instanceView')), 1)
+
+    def test_rolling_upgrade_failed_step_and_resume(self):
+        vms = [vmss_vm(i, i % 2, i % 3) for i in range(12)]
+        self.serve_vms(vms, fail_ids=['4'])
+        report = self.rolling_upgrade(max_parallel_uds=2, max_parallel_fds=1)
+        self.assertEqual(report['status'], 'Failed')
+        # fault domain 1 of update domain 0 failed, so fault domain 2 was never started
+        self.assertEqual(sorted(report['upgraded'], key=int), ['0', '1', '3', '6', '7', '9'])
+        self.assertEqual(report['failed'], ['4', '10'])
+        self.assertEqual([entry['status'] for entry in report['updateDomains']],
+                         ['Failed', 'Partial'])
+        self.assertEqual(report['updateDomains'][0]['error'],
+                         {'error': {'code': 'OperationNotAllowed'}})
+        self.assertEqual(len(self.upgrades()), 4)
+
+        # run again once the VMs upgraded so far are on the latest model: only the rest are
+        for vm in vms:
+            vm['properties']['latestModelApplied'] = vm['instanceId'] in report['upgraded']
+        StandInHandler.log = []
+        self.serve_vms(vms)
+        report = self.rolling_upgrade(max_parallel_uds=2, max_parallel_fds=1)
+        self.assertEqual(report['status'], 'Succeeded')
+        self.assertEqual(sorted(report['skipped'], key=int), ['0', '1', '3', '6', '7', '9'])
+        self.assertEqual(sorted(sum(self.upgrades(), []), key=int),
+                         ['2', '4', '5', '8', '10', '11'])
+
+    def test_rolling_upgrade_unhealthy(self):
+        vms = [vmss_vm(i, i % 2, i % 3, power_state='stopped' if i == 3 else 'running')
+               for i in range(6)]
+        self.serve_vms(vms)
+        report = self.rolling_upgrade(health_timeout=0.2)
+        self.assertEqual(report['status'], 'Unhealthy')
+        self.assertEqual([entry['status'] for entry in report['updateDomains']],
+                         ['Succeeded', 'Unhealthy'])
+        self.assertEqual(report['updateDomains'][1]['error'], 'Unhealthy instances: 3')
+        self.assertEqual(report['upgraded'], ['0', '2', '4'])
+        self.assertEqual(report['failed'], ['1', '3', '5'])
+        # the stopped VM was polled until the timeout, the healthy ones only once
+        self.assertGreater(len(self.requests_to(VMSS_PATH + '/virtualMachines/3/instanceView')),
+                           1)
+        self.assertEqual(len(self.requests_to(VMSS_PATH + '/virtualMachines/5/instanceView')), 1)
+
+    def test_instance_view_watcher(self):
+        def view(instance_id, power_state):
+            return {'instanceId': str(instance_id), 'properties': {'instanceView': {'statuses': [
+                {'code': 'ProvisioningState/succeeded'}, {'code': 'PowerState/' + power_state}]}}}
+
+        vms = [view(0, 'running'), view(1, 'running')]
+        StandInHandler.routes[VMSS_PATH + '/virtualMachines'] = \
+            lambda handler: (200, {}, {'value': vms})
+        watcher = azurerm.InstanceViewWatcher('token', 'sub-compute', 'rg1', vmss_name='vmss1',
+                                              min_interval=1, max_interval=3)
+        events = watcher.poll()
+        self.assertEqual(sorted((event['id'], event['change'], event['powerState'])
+                                for event in events), [('0', 'added', 'running'),
+                                                       ('1', 'added', 'running')])
+        self.assertEqual(watcher.interval, 1)
+        # while nothing changes the interval backs off up to max_interval
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.interval, azurerm.settings.WATCH_BACKOFF)
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.interval, 3)
+
+        vms[1] = view(1, 'stopping')
+        events = watcher.poll()
+        self.assertEqual([(event['id'], event['change'], event['powerState'])
+                          for event in events], [('1', 'changed', 'stopping')])
+        self.assertEqual(watcher.interval, 1)
+        # a VM in transition keeps the interval short
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.interval, 1)
+
+        # a status without a code is ignored
+        vms[:] = [view(0, 'running'), view(2, 'running')]
+        vms[1]['properties']['instanceView']['statuses'].append({'displayStatus': 'Ready'})
+        events = watcher.poll()
+        self.assertEqual(sorted((event['id'], event['change'], event['powerState'])
+                                for event in events), [('1', 'removed', 'stopping'),
+                                                       ('2', 'added', 'running')])
+        self.assertEqual(watcher.state['2'],
+                         ('ProvisioningState/succeeded', 'PowerState/running'))
+
+        # a failed poll keeps the last known state
+        StandInHandler.routes[VMSS_PATH + '/virtualMachines'] = \
+            lambda handler: (500, {}, {'error': {'code': 'InternalServerError'}})
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.last_error, {'error': {'code': 'InternalServerError'}})
+        self.assertEqual(sorted(watcher.state), ['0', '2'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# azurerm unit tests - cross-subscription fan-out
+# To run tests: python -m unittest fanout_test.py
+# Note: Like aio_test.py these tests don't call Azure. The list functions are stand-ins which
+#  return or yield JSON bodies, so no azurermconfig.json is needed.
+
+import threading
+import time
+import unittest
+
+import azurerm
+
+
+def list_things_sub(access_token, subscription_id, count=2):
+    '''Stand-in for a list_*_sub function.'''
+    if subscription_id == 'sub-error':
+        return {'error': {'code': 'AuthorizationFailed'}}
+    if subscription_id == 'sub-raise':
+        raise ValueError('connection reset')
+    return {'value': [{'id': subscription_id + '/thing' + str(i), 'token': access_token}
+                      for i in range(count)]}
+
+
+def iter_things_sub(access_token, subscription_id):
+    '''Stand-in for an iter_*_sub function, which yields an error body last when a page fails.'''
+    yield {'id': subscription_id + '/thing0'}
+    if subscription_id == 'sub-error':
+        yield {'error': {'code': 'InternalServerError'}}
+
+
+class TestAzurermFanOut(unittest.TestCase):
+
+    def test_merged_results(self):
+        subscriptions = ['sub-' + str(i) for i in range(10)]
+        results = list(azurerm.fan_out(list_things_sub, 'token', subscriptions, count=3))
+        self.assertEqual(len(results), 30)
+        for subscription_id, item in results:
+            self.assertTrue(item['id'].startswith(subscription_id + '/'))
+
+    def test_subscription_bodies_and_token_function(self):
+        subscriptions = [{'subscriptionId': 'sub-a'}, {'subscriptionId': 'sub-b'}]
+        results = dict(azurerm.fan_out(list_things_sub, lambda sub: 'token-' + sub, subscriptions,
+                                       count=1))
+        self.assertEqual(results['sub-a']['token'], 'token-sub-a')
+        self.assertEqual(results['sub-b']['token'], 'token-sub-b')
+
+    def test_partial_failures(self):
+        subscriptions = ['sub-a', 'sub-error', 'sub-raise', 'sub-b']
+        results = []
+        with self.assertRaises(azurerm.FanOutError) as context:
+            for result in azurerm.fan_out(list_things_sub, 'token', subscriptions):
+                results.append(result)
+        # the other subscriptions were still listed
+        self.assertEqual(len(results), 4)
+        errors = context.exception.errors
+        self.assertEqual(sorted(errors), ['sub-error', 'sub-raise'])
+        self.assertIsInstance(errors['sub-raise'], ValueError)
+
+        errors = {}
+        results = list(azurerm.fan_out(iter_things_sub, 'token', subscriptions[:2],
+                                       errors=errors))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(errors['sub-error'], {'error': {'code': 'InternalServerError'}})
+
+    def test_bounded_concurrency(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow_list(access_token, subscription_id):
+            with lock:
+                running.append(subscription_id)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.remove(subscription_id)
+            return {'value': [{'id': subscription_id}]}
+
+        subscriptions = ['sub-' + str(i) for i in range(12)]
+        start = time.monotonic()
+        results = list(azurerm.fan_out(slow_list, 'token', subscriptions, max_workers=4))
+        self.assertEqual(len(results), 12)
+        self.assertEqual(max(peak), 4)
+        self.assertLess(time.monotonic() - start, 12 * 0.05)
+
+    def test_deadline(self):
+        def slow_list(access_token, subscription_id):
+            azurerm.restfns._sleep(10)
+            return {'value': []}
+
+        with azurerm.Deadline(0.2):
+            with self.assertRaises(azurerm.DeadlineExceeded):
+                list(azurerm.fan_out(slow_list, 'token', ['sub-a', 'sub-b']))
+
+    def test_client_fan_out(self):
+        def list_things(access_token, subscription_id, resource_group, *names, count=1):
+            return {'value': [{'id': subscription_id + '/' + resource_group + '/' + name,
+                               'count': count} for name in names]}
+
+        client = azurerm.AzureRMClient('token', subscription_id='sub-client')
+        results = sorted(client.fan_out(list_things, ['sub-a', 'sub-b'], 'rg1', 'x', 'y',
+                                        count=2), key=lambda result: result[1]['id'])
+        self.assertEqual([item['id'] for _, item in results],
+                         ['sub-a/rg1/x', 'sub-a/rg1/y', 'sub-b/rg1/x', 'sub-b/rg1/y'])
+        self.assertEqual({item['count'] for _, item in results}, {2})
+        # a function with *args of its own, bound as a client method
+        method = client._bind(list_things)
+        self.assertEqual(method('rg1', 'x', 'y', count=3)['value'][1],
+                         {'id': 'sub-client/rg1/y', 'count': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -58,6 +58,11 @@ class TestAzurermPy(unittest.TestCase):
         # print(json.dumps(response, sort_keys=False, indent=2, separators=(',', ': ')))
         self.assertTrue('value' in response)
 
+        # iterate keyvaults
+        print('Iterate key vaults')
+        vaults = list(azurerm.iter_keyvaults(self.access_token, self.subscription_id, self.rgname))
+        self.assertEqual(len(vaults), len(response['value']))
+
         # list keyvaults in subscription
         print('List key vaults in subscription')
         response = azurerm.list_keyvaults_sub(self.access_token, self.subscription_id)
@@ -0,0 +1,55 @@
+# azurerm unit tests - lazy loading of azurerm names
+# To run tests: python -m unittest lazy_import_test.py
+# Note: Like aio_test.py these tests don't call Azure, so no azurermconfig.json is needed.
+
+import importlib
+import inspect
+import pkgutil
+import subprocess
+import sys
+import unittest
+
+import azurerm
+
+
+class TestAzurermLazyImport(unittest.TestCase):
+
+    def test_import_is_light(self):
+        code = 'import sys, azurerm; print(" ".join(sorted(sys.modules)))'
+        modules = subprocess.check_output([sys.executable, '-c', code]).decode().split()
+        for heavy in ('adal', 'requests', 'azurerm.adalfns', 'azurerm.computerp'):
+            self.assertNotIn(heavy, modules)
+
+    def test_table_names_resolve(self):
+        for module_name, names in azurerm._MODULE_NAMES.items():
+            module = importlib.import_module('azurerm.' + module_name)
+            for name in names:
+                self.assertIs(getattr(azurerm, name), getattr(module, name), name)
+
+    def test_table_is_complete(self):
+        # every public function, class and constant defined in a module must be in the table
+        for module_info in pkgutil.iter_modules(azurerm.__path__):
+            if module_info.ispkg:
+                continue
+            module = importlib.import_module('azurerm.' + module_info.name)
+            for name, value in vars(module).items():
+                if name.startswith('_') or inspect.ismodule(value):
+                    continue
+                if inspect.isfunction(value) or inspect.isclass(value):
+                    if value.__module__ != module.__name__:
+                        continue
+                elif module_info.name != 'settings' and \
+                        (not name.isupper() or hasattr(azurerm.settings, name)):
+                    continue
+                self.assertIn(name, azurerm._MODULE_NAMES.get(module_info.name, ()),
+                              module_info.name + '.' + name)
+
+    def test_submodules_and_errors(self):
+        self.assertIs(azurerm.settings, importlib.import_module('azurerm.settings'))
+        with self.assertRaises(AttributeError):
+            azurerm.no_such_function
+        self.assertIn('list_vmss', dir(azurerm))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# azurerm unit tests - managed identity tokens
+# To run tests: python -m unittest msifns_test.py
+# Note: Like aio_test.py these tests don't call Azure. Tokens come from a stand-in MSI endpoint
+#  on the local server from restfns_test.py, so no azurermconfig.json is needed.
+
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+import azurerm
+from restfns_test import StandInHandler
+
+
+class TestAzurermMsi(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.daemon_threads = True
+        cls.url = 'http://127.0.0.1:' + str(cls.server.server_port)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        StandInHandler.routes = {'/msi': self.msi_route}
+        StandInHandler.log = []
+        self.lifetime = 3600
+        azurerm.clear_msi_tokens()
+        self.addCleanup(azurerm.clear_msi_tokens)
+
+    def msi_route(self, handler):
+        '''Stand-in MSI endpoint: the token names the resource and the request number.'''
+        resource = parse_qs(handler.body)['resource'][0]
+        with StandInHandler.lock:
+            count = len(StandInHandler.log)
+        return 200, {}, {'access_token': resource + '#' + str(count),
+                         'expires_on': str(int(time.time() + self.lifetime))}
+
+    def token_requests(self):
+        with StandInHandler.lock:
+            return [entry for entry in StandInHandler.log if entry[1] == '/msi']
+
+    def test_token_cache(self):
+        endpoint = self.url + '/msi'
+        token = azurerm.get_msi_token('https://management.azure.com/', endpoint)
+        self.assertEqual(token, 'https://management.azure.com/#1')
+        self.assertEqual(azurerm.get_msi_token('https://management.azure.com/', endpoint), token)
+        self.assertEqual(len(self.token_requests()), 1)
+        self.assertEqual(self.token_requests()[0][2]['Metadata'], 'true')
+        # tokens are cached per resource
+        self.assertEqual(azurerm.get_msi_token('https://graph.windows.net/', endpoint),
+                         'https://graph.windows.net/#2')
+        azurerm.clear_msi_tokens()
+        self.assertEqual(azurerm.get_msi_token('https://management.azure.com/', endpoint),
+                         'https://management.azure.com/#3')
+
+    def test_expiring_tokens(self):
+        # a token which has expired is never cached, one close to expiry is kept for a while
+        endpoint = self.url + '/msi'
+        self.lifetime = -10
+        azurerm.get_msi_token('https://management.azure.com/', endpoint)
+        azurerm.get_msi_token('https://management.azure.com/', endpoint)
+        self.assertEqual(len(self.token_requests()), 2)
+        self.lifetime = 60
+        azurerm.get_msi_token('https://management.azure.com/', endpoint)
+        azurerm.get_msi_token('https://management.azure.com/', endpoint)
+        self.assertEqual(len(self.token_requests()), 3)
+
+    def test_concurrent_requests(self):
+        endpoint = self.url + '/msi'
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            tokens = list(executor.map(lambda _: azurerm.get_msi_token(
+                'https://management.azure.com/', endpoint), range(8)))
+        self.assertEqual(set(tokens), {'https://management.azure.com/#1'})
+        self.assertEqual(len(self.token_requests()), 1)
+
+    def test_cloud_shell_endpoint(self):
+        with mock.patch.dict(os.environ, {'MSI_ENDPOINT': self.url + '/msi'}):
+            os.environ.pop('ACC_CLOUD', None)
+            # outside Cloud Shell there is no endpoint
+            self.assertIsNone(azurerm.get_msi_endpoint())
+            self.assertIsNone(azurerm.get_msi_token('https://management.azure.com/'))
+            os.environ['ACC_CLOUD'] = 'shell'
+            self.assertEqual(azurerm.get_msi_endpoint(), self.url + '/msi')
+            self.assertEqual(azurerm.get_msi_token('https://management.azure.com/'),
+                             'https://management.azure.com/#1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -144,6 +144,11 @@ class TestAzurermPy(unittest.TestCase):
         response = azurerm.list_nics_rg(self.access_token, self.subscription_id, self.rgname)
         self.assertEqual(response['value'][0]['name'], nic_name)
 
+        # iterate nics in resource group
+        print('Iterating nics in resource group: ' + self.rgname)
+        nics = list(azurerm.iter_nics_rg(self.access_token, self.subscription_id, self.rgname))
+        self.assertEqual(nics[0]['name'], nic_name)
+
         # list nics in subscription
         print('Listing nics in subscription.')
         response = azurerm.list_nics(self.access_token, self.subscription_id)
@@ -0,0 +1,99 @@
+# azurerm unit tests - long-running operations
+# To run tests: python -m unittest operations_test.py
+# Note: Like aio_test.py these tests don't call Azure. The operations are started against the
+#  local stand-in server from restfns_test.py, so no azurermconfig.json is needed.
+
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer
+
+import azurerm
+from azurerm import operations
+from restfns_test import StandInHandler, closed_port_url
+
+
+class TestAzurermOperations(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.daemon_threads = True
+        cls.url = 'http://127.0.0.1:' + str(cls.server.server_port)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        StandInHandler.log = []
+        self.polls = {}
+        StandInHandler.routes = {'/start': self.start, '/status': self.status}
+        self.saved_interval = operations.LRO_POLL_INTERVAL
+        operations.LRO_POLL_INTERVAL = 0.01
+
+    def tearDown(self):
+        operations.LRO_POLL_INTERVAL = self.saved_interval
+
+    def start(self, handler):
+        '''Start an operation whose status URL is given in the request body.'''
+        return 202, {'Azure-AsyncOperation': handler.body['status']}, None
+
+    def status(self, handler):
+        '''Operation status: in progress for the first two polls, then succeeded.'''
+        with StandInHandler.lock:
+            self.polls[handler.path] = self.polls.get(handler.path, 0) + 1
+            polls = self.polls[handler.path]
+        return 200, {}, {'status': 'Succeeded' if polls > 2 else 'InProgress'}
+
+    def start_operation(self, status_url):
+        return azurerm.do_post(self.url + '/start', '{"status": "' + status_url + '"}', 'token')
+
+    def test_iter_completed(self):
+        responses = [self.start_operation(self.url + '/status?op=' + str(index))
+                     for index in range(5)]
+        pollers = list(azurerm.iter_completed(responses, timeout=30))
+        self.assertEqual(len(pollers), 5)
+        self.assertTrue(all(poller.status == 'Succeeded' for poller in pollers))
+        self.assertTrue(all(poller.polls == 3 for poller in pollers))
+
+    def test_unreachable_status_url(self):
+        responses = [self.start_operation(self.url + '/status?op=' + str(index))
+                     for index in range(5)]
+        responses.append(self.start_operation(closed_port_url() + '/status'))
+        pollers = list(azurerm.iter_completed(responses, timeout=30))
+        self.assertEqual(len(pollers), 6)
+        # the dead operation fails after its retries without stopping the others
+        failed = [poller for poller in pollers if poller.status == 'Failed']
+        self.assertEqual(len(failed), 1)
+        self.assertEqual(failed[0].response, responses[-1])
+        self.assertIsInstance(failed[0].error, azurerm.restfns.requests.ConnectionError)
+        self.assertEqual(failed[0].polls, azurerm.settings.LRO_POLL_MAX_ERRORS)
+        self.assertTrue(all(poller.status == 'Succeeded' and poller.error is None
+                            for poller in pollers if poller is not failed[0]))
+
+    def test_wait_recovers_from_errors(self):
+        calls = []
+
+        def flaky(handler):
+            calls.append(handler.path)
+            if len(calls) == 1:
+                # answer after the read timeout
+                time.sleep(0.5)
+            return 200, {}, {'status': 'Succeeded'}
+
+        StandInHandler.routes['/flaky'] = flaky
+        response = self.start_operation(self.url + '/flaky')
+        azurerm.set_timeouts(read=0.2)
+        try:
+            poller = azurerm.wait_for_operation(response, timeout=30)
+        finally:
+            azurerm.set_timeouts()
+        self.assertEqual(poller.status, 'Succeeded')
+        self.assertIsNotNone(poller.error)
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ import unittest
 from haikunator import Haikunator
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import azurerm
 
@@ -65,6 +66,46 @@ class TestAzurermPy(unittest.TestCase):
             self.access_token, self.subscription_id)
         self.assertTrue('value' in response)
 
+        # list resource groups under a deadline
+        print('List resource groups with a deadline')
+        with azurerm.Deadline(60):
+            response = azurerm.list_resource_groups(self.access_token, self.subscription_id)
+        self.assertTrue('value' in response)
+        with self.assertRaises(azurerm.RequestCancelled):
+            with azurerm.Deadline() as deadline:
+                deadline.cancel()
+                azurerm.list_resource_groups(self.access_token, self.subscription_id)
+
+        # list resource groups with hedged requests
+        print('List resource groups with hedging')
+        azurerm.enable_hedging()
+        try:
+            for _ in range(25):
+                response = azurerm.list_resource_groups(self.access_token, self.subscription_id)
+                self.assertTrue('value' in response)
+        finally:
+            azurerm.disable_hedging()
+
+        # list resource groups from several threads sharing one request
+        print('List resource groups with single-flight')
+        azurerm.enable_single_flight()
+        try:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                responses = list(executor.map(
+                    lambda _: azurerm.list_resource_groups(self.access_token,
+                                                           self.subscription_id), range(8)))
+        finally:
+            azurerm.disable_single_flight()
+        self.assertTrue(all('value' in response for response in responses))
+
+        # list resource groups through a client object
+        print('List resource groups with AzureRMClient')
+        client = azurerm.AzureRMClient(self.access_token, self.subscription_id)
+        response = client.list_resource_groups()
+        self.assertTrue('value' in response)
+        response = client.get_resource_group(self.rgname)
+        self.assertEqual(response['name'], self.rgname)
+
         # delete resource group
         print('Deleting resource group: ' + self.rgname)
         response = azurerm.delete_resource_group(
@@ -0,0 +1,441 @@
+# azurerm unit tests - REST functions
+# To run tests: python -m unittest restfns_test.py
+# Note: Like aio_test.py these tests don't call Azure. They run the restfns functions against a
+#  local stand-in HTTP server, so no azurermconfig.json is needed.
+
+import json
+import socket
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import azurerm
+from azurerm import restfns
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''Answers requests with the function registered for their path in routes.
+
+    A route takes the handler and returns (status, headers, body). Every request is logged as
+    (method, path, headers, body), with a JSON request body parsed and any other left as text.
+    '''
+    protocol_version = 'HTTP/1.1'
+    routes = {}
+    log = []
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def handle_request(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.body = self.rfile.read(length).decode('utf-8') if length else None
+        if self.body is not None:
+            try:
+                self.body = json.loads(self.body)
+            except ValueError:  # e.g. a form body
+                pass
+        with StandInHandler.lock:
+            StandInHandler.log.append((self.command, self.path, dict(self.headers), self.body))
+        route = StandInHandler.routes.get(self.path.partition('?')[0])
+        if route is None:
+            status, headers, body = 404, {}, {'error': {'code': 'ResourceNotFound'}}
+        else:
+            status, headers, body = route(self)
+        data = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = handle_request
+
+
+class StandInServer(ThreadingHTTPServer):
+    '''Threaded server with a listen backlog big enough for many concurrent callers.'''
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def closed_port_url():
+    '''Return the URL of a local port which nothing listens on.'''
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    listener.close()
+    return 'http://127.0.0.1:' + str(port)
+
+
+class TestAzurermRestfns(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandInServer(('127.0.0.1', 0), StandInHandler)
+        cls.url = 'http://127.0.0.1:' + str(cls.server.server_port)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        StandInHandler.routes = {}
+        StandInHandler.log = []
+
+    def tearDown(self):
+        azurerm.disable_hedging()
+        restfns._hedge_latencies.clear()
+        restfns._hedge_tokens = 0.0
+
+    def requests_to(self, path):
+        with StandInHandler.lock:
+            return [entry for entry in StandInHandler.log if entry[1].partition('?')[0] == path]
+
+    def test_hedging(self):
+        calls = []
+
+        def slow_first_call(handler):
+            with StandInHandler.lock:
+                calls.append(handler.path)
+                first = len(calls) == 1
+            if first:
+                time.sleep(1.0)
+            return 200, {}, {'name': 'slow'}
+
+        StandInHandler.routes['/fast'] = lambda handler: (200, {}, {'name': 'fast'})
+        StandInHandler.routes['/slow'] = slow_first_call
+        azurerm.enable_hedging(percentile=95, budget=0.05)
+        # just enough samples to start hedging, so no fast GET can use up the budget
+        for _ in range(20):
+            self.assertEqual(azurerm.do_get(self.url + '/fast', 'token')['name'], 'fast')
+
+        # the first request is slower than the 95th percentile, so a hedge answers first
+        start = time.monotonic()
+        self.assertEqual(azurerm.do_get(self.url + '/slow', 'token')['name'], 'slow')
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual(len(calls), 2)
+
+    def test_hedging_budget_used_up(self):
+        # concurrent slow GETs when there is only budget to hedge one of them
+        def slow(handler):
+            time.sleep(0.3)
+            return 200, {}, {'name': 'slow'}
+
+        StandInHandler.routes['/fast'] = lambda handler: (200, {}, {'name': 'fast'})
+        StandInHandler.routes['/slow'] = slow
+        azurerm.enable_hedging(percentile=95, budget=0.05)
+        for _ in range(25):
+            azurerm.do_get(self.url + '/fast', 'token')
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(azurerm.do_get, self.url + '/slow', 'token')
+                       for _ in range(4)]
+            results = [future.result(timeout=10) for future in futures]
+        self.assertEqual([result['name'] for result in results], ['slow'] * 4)
+        self.assertFalse(restfns._hedge_lock.locked())
+        # at most one hedge was sent
+        self.assertLessEqual(len(self.requests_to('/slow')), 5)
+
+        # turning hedging off while GETs are in flight doesn't break them
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(azurerm.do_get, self.url + '/slow', 'token')
+                       for _ in range(4)]
+            azurerm.disable_hedging()
+            results = [future.result(timeout=10) for future in futures]
+        self.assertEqual([result['name'] for result in results], ['slow'] * 4)
+
+    def test_hedge_latency_excludes_rate_limiter(self):
+        path = '/subscriptions/sub-latency/resourcegroups'
+        StandInHandler.routes[path] = lambda handler: (200, {}, {'value': []})
+        azurerm.enable_hedging()
+        bucket = azurerm.ratelimit.get_bucket(self.url + path, 'GET')
+        bucket.block(0.3)
+        azurerm.do_get(self.url + path, 'token')
+        latencies = restfns._hedge_latencies['127.0.0.1:' + str(self.server.server_port)]
+        self.assertEqual(len(latencies), 1)
+        self.assertLess(latencies[0], 0.2)
+
+    def page_route(self, pages, size=3):
+        '''Route for a list of pages of size items, linked by nextLink.'''
+        def route(handler):
+            page = int(handler.path.partition('page=')[2] or 0)
+            body = {'value': [page * size + i for i in range(size)]}
+            if page + 1 < pages:
+                body['nextLink'] = self.url + '/pages?page=' + str(page + 1)
+            return 200, {}, body
+        return route
+
+    def test_iter_values_prefetch(self):
+        StandInHandler.routes['/pages'] = self.page_route(5)
+        for prefetch in (0, 1, 3):
+            StandInHandler.log = []
+            items = list(azurerm.iter_values(self.url + '/pages', 'token', prefetch=prefetch))
+            self.assertEqual(items, list(range(15)))
+            self.assertEqual(len(self.requests_to('/pages')), 5)
+
+    def test_iter_values_prefetch_stops(self):
+        # an abandoned iterator stops fetching once the queue of prefetched pages is full
+        StandInHandler.routes['/pages'] = self.page_route(50)
+        items = azurerm.iter_values(self.url + '/pages', 'token', prefetch=2)
+        self.assertEqual(next(items), 0)
+        items.close()
+        time.sleep(0.5)
+        self.assertLessEqual(len(self.requests_to('/pages')), 5)
+
+    def test_iter_values_prefetch_errors(self):
+        # an error body ends the iteration, and a request error is raised in the caller
+        def error_page(handler):
+            return 500, {}, {'error': {'code': 'InternalServerError'}}
+
+        StandInHandler.routes['/pages'] = lambda handler: (
+            200, {}, {'value': [1, 2], 'nextLink': self.url + '/error'})
+        StandInHandler.routes['/error'] = error_page
+        self.assertEqual(list(azurerm.iter_values(self.url + '/pages', 'token', prefetch=2)),
+                         [1, 2, {'error': {'code': 'InternalServerError'}}])
+
+        closed_url = closed_port_url() + '/pages'
+        StandInHandler.routes['/pages'] = lambda handler: (
+            200, {}, {'value': [1, 2], 'nextLink': closed_url})
+        items = azurerm.iter_values(self.url + '/pages', 'token', prefetch=2)
+        self.assertEqual([next(items), next(items)], [1, 2])
+        with self.assertRaises(azurerm.restfns.requests.ConnectionError):
+            next(items)
+    def test_token_bucket(self):
+        header = 'x-ms-ratelimit-remaining-subscription-reads'
+        bucket = azurerm.ratelimit.TokenBucket(2, 10.0, header)
+        self.assertEqual([bucket.reserve(), bucket.reserve()], [0, 0])
+        # empty: the next token is a tenth of a second away
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.02)
+        time.sleep(0.1)
+        self.assertEqual(bucket.reserve(), 0)
+        # Azure reports the budget is used up, then a Retry-After holds every request back
+        bucket.update({header: '0'})
+        self.assertGreater(bucket.reserve(), 0.05)
+        bucket.update({header: '5'})
+        bucket.block(0.3)
+        self.assertAlmostEqual(bucket.reserve(), 0.3, delta=0.05)
+
+    def test_rate_limited_requests(self):
+        path = '/subscriptions/sub-ratelimit/resourcegroups'
+        StandInHandler.routes[path] = lambda handler: (
+            200, {'x-ms-ratelimit-remaining-subscription-reads': '0'}, {'value': []})
+        azurerm.do_get(self.url + path, 'token')
+        # the next read waits for the bucket to refill from the level Azure reported
+        bucket = azurerm.ratelimit.get_bucket(self.url + path, 'GET')
+        self.assertLess(bucket.tokens, 1)
+        self.assertGreater(bucket.reserve(), 0)
+        # writes have their own bucket
+        self.assertEqual(azurerm.ratelimit.get_bucket(self.url + path, 'PUT').reserve(), 0)
+
+    def test_throttled_requests_retried(self):
+        path = '/subscriptions/sub-throttled/resourcegroups'
+        calls = []
+
+        def throttled(handler):
+            calls.append(time.monotonic())
+            if len(calls) <= 2:
+                return 429, {'Retry-After': '0.2'}, {'error': {'code': 'TooManyRequests'}}
+            return 200, {}, {'value': []}
+
+        StandInHandler.routes[path] = throttled
+        self.assertEqual(azurerm.do_get(self.url + path, 'token'), {'value': []})
+        self.assertEqual(len(calls), 3)
+        # each retry waited for Retry-After
+        self.assertGreaterEqual(calls[1] - calls[0], 0.2)
+        self.assertGreaterEqual(calls[2] - calls[1], 0.2)
+
+        # after RATE_LIMIT_MAX_RETRIES retries the 429 response is returned
+        def always_throttled(handler):
+            calls.append(time.monotonic())
+            return 429, {'Retry-After': '0'}, {'error': {'code': 'TooManyRequests'}}
+
+        calls.clear()
+        StandInHandler.routes[path] = always_throttled
+        response = azurerm.do_get_raw(self.url + path, 'token')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(len(calls), azurerm.settings.RATE_LIMIT_MAX_RETRIES + 1)
+    def batch_route(self, handler):
+        '''Stand-in for the batch endpoint: each request's content echoes its URL.'''
+        responses = [{'name': request['name'], 'httpStatusCode': 200,
+                      'content': {'url': request['url']}}
+                     for request in handler.body['requests']]
+        return 200, {}, {'responses': responses}
+
+    def test_batch_get(self):
+        StandInHandler.routes['/batch'] = self.batch_route
+        endpoints = [self.url + '/things/' + str(i) for i in range(45)]
+        with azurerm.use_endpoints(rm_endpoint=self.url):
+            results = azurerm.do_batch_get(endpoints, 'token')
+        self.assertEqual([result['url'] for result in results], endpoints)
+        batches = self.requests_to('/batch')
+        self.assertEqual([len(body['requests']) for _, _, _, body in batches], [20, 20, 5])
+        self.assertEqual({method for method, _, _, _ in batches}, {'POST'})
+
+    def test_batch_get_accepted(self):
+        # a batch which takes longer is answered with 202 and a Location to poll
+        StandInHandler.routes['/batch'] = lambda handler: (
+            202, {'Location': self.url + '/batchresult', 'Retry-After': '0'}, None)
+        StandInHandler.routes['/batchresult'] = lambda handler: (200, {}, {'responses': [
+            {'name': '1', 'content': {'name': 'b'}}, {'name': '0', 'content': {'name': 'a'}}]})
+        with azurerm.use_endpoints(rm_endpoint=self.url):
+            results = azurerm.do_batch_get([self.url + '/a', self.url + '/b', self.url + '/c'],
+                                           'token')
+        self.assertEqual(results[:2], [{'name': 'a'}, {'name': 'b'}])
+        self.assertEqual(results[2]['error']['code'], 'MissingBatchResponse')
+
+    def test_batch_get_class(self):
+        StandInHandler.routes['/batch'] = self.batch_route
+        with azurerm.use_endpoints(rm_endpoint=self.url):
+            with azurerm.BatchGet('token', batch_size=10) as batch:
+                indexes = [batch.add_call(azurerm.get_vm, 'token', 'sub-batch', 'rg1',
+                                          'vm' + str(i)) for i in range(25)]
+                # full batches are sent as they fill up
+                self.assertEqual(len(self.requests_to('/batch')), 2)
+            with self.assertRaises(ValueError):
+                batch.add_call(azurerm.delete_vm, 'token', 'sub-batch', 'rg1', 'vm0')
+        self.assertEqual(indexes, list(range(25)))
+        self.assertEqual(len(self.requests_to('/batch')), 3)
+        results = batch.results()
+        self.assertEqual(len(results), 25)
+        self.assertIn('/virtualMachines/vm24?', results[24]['url'])
+        # the get_vm calls were captured, not sent
+        self.assertEqual(self.requests_to('/subscriptions/sub-batch/resourceGroups/rg1/providers/'
+                                          'Microsoft.Compute/virtualMachines/vm0'), [])
+    def test_etag_cache(self):
+        def tagged(handler):
+            if handler.headers.get('If-None-Match') == '"v1"':
+                return 304, {'ETag': '"v1"'}, None
+            return 200, {'ETag': '"v1"'}, {'name': 'vm1'}
+
+        StandInHandler.routes['/tagged'] = tagged
+        azurerm.enable_etag_cache()
+        self.addCleanup(azurerm.disable_etag_cache)
+        first = azurerm.do_get(self.url + '/tagged', 'token')
+        second = azurerm.do_get(self.url + '/tagged', 'token')
+        self.assertEqual(first, {'name': 'vm1'})
+        self.assertIs(second, first)
+        headers = [entry[2] for entry in self.requests_to('/tagged')]
+        self.assertNotIn('If-None-Match', headers[0])
+        self.assertEqual(headers[1]['If-None-Match'], '"v1"')
+        # entries are kept per token
+        azurerm.do_get(self.url + '/tagged', 'other-token')
+        self.assertNotIn('If-None-Match', self.requests_to('/tagged')[2][2])
+
+        # with room for one entry, the least recently used one is dropped
+        azurerm.enable_etag_cache(max_entries=1)
+        azurerm.do_get(self.url + '/tagged', 'token')
+        self.assertNotIn('If-None-Match', self.requests_to('/tagged')[3][2])
+
+        # not used once the cache is turned off
+        azurerm.disable_etag_cache()
+        azurerm.do_get(self.url + '/tagged', 'other-token')
+        self.assertNotIn('If-None-Match', self.requests_to('/tagged')[4][2])
+    def test_user_agent_cached(self):
+        self.addCleanup(setattr, restfns, '_user_agent', restfns._user_agent)
+        restfns._user_agent = None
+        with mock.patch.object(restfns, '_azurerm_version', return_value='9.9.9') as version:
+            user_agent = azurerm.get_user_agent()
+            self.assertIs(azurerm.get_user_agent(), user_agent)
+            StandInHandler.routes['/agent'] = lambda handler: (200, {}, {})
+            azurerm.do_get(self.url + '/agent', 'token')
+            list(azurerm.iter_values(self.url + '/agent', 'token'))
+        # the package version is looked up once, not per request
+        self.assertEqual(version.call_count, 1)
+        self.assertTrue(user_agent.endswith(' azurerm/9.9.9'))
+        self.assertEqual([entry[2]['User-Agent'] for entry in self.requests_to('/agent')],
+                         [user_agent] * 2)
+    def test_hedging_many_callers(self):
+        # more concurrent GETs than hedge pool threads all run at once
+        def slow(handler):
+            time.sleep(0.3)
+            return 200, {}, {'name': 'slow'}
+
+        StandInHandler.routes['/fast'] = lambda handler: (200, {}, {'name': 'fast'})
+        StandInHandler.routes['/slow'] = slow
+        azurerm.enable_hedging(percentile=95, budget=0.05)
+        for _ in range(20):
+            azurerm.do_get(self.url + '/fast', 'token')
+
+        callers = azurerm.settings.HEDGE_WORKERS * 2
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=callers) as executor:
+            futures = [executor.submit(azurerm.do_get, self.url + '/slow', 'token')
+                       for _ in range(callers)]
+            results = [future.result(timeout=10) for future in futures]
+        self.assertEqual([result['name'] for result in results], ['slow'] * callers)
+        self.assertLess(time.monotonic() - start, 0.55)
+        # the budget allows only a few hedges
+        self.assertLessEqual(len(self.requests_to('/slow')), callers + 4)
+    def single_flight_callers(self, count, leader=None):
+        '''Call do_get for /flight from count threads once the first request has reached the
+        server, and return each caller's result or exception. leader, if given, sends the first
+        request.'''
+        def call():
+            try:
+                return azurerm.do_get(self.url + '/flight', 'token')
+            except Exception as error:
+                return error
+
+        azurerm.enable_single_flight()
+        self.addCleanup(azurerm.disable_single_flight)
+        with ThreadPoolExecutor(max_workers=count + 1) as executor:
+            first = executor.submit(leader or call)
+            self.assertTrue(self.flight_started.wait(5))
+            followers = [executor.submit(call) for _ in range(count)]
+            return first.result(timeout=10), [future.result(timeout=10) for future in followers]
+
+    def flight_route(self, first_delay, delay=0):
+        '''Route which answers the first request after first_delay seconds, and the others after
+        delay seconds.'''
+        self.flight_started = threading.Event()
+
+        def route(handler):
+            with StandInHandler.lock:
+                first = not self.flight_started.is_set()
+                self.flight_started.set()
+            time.sleep(first_delay if first else delay)
+            return 200, {}, {'name': 'shared'}
+        return route
+
+    def test_single_flight(self):
+        StandInHandler.routes['/flight'] = self.flight_route(0.3)
+        first, results = self.single_flight_callers(8)
+        self.assertEqual(first, {'name': 'shared'})
+        self.assertTrue(all(result is first for result in results))
+        self.assertEqual(len(self.requests_to('/flight')), 1)
+
+    def test_single_flight_leader_fails(self):
+        # the leader's read timeout is raised in every caller which shared its request
+        StandInHandler.routes['/flight'] = self.flight_route(0.5)
+        azurerm.set_timeouts(read=0.2)
+        self.addCleanup(azurerm.set_timeouts)
+        first, results = self.single_flight_callers(4)
+        self.assertIsInstance(first, azurerm.restfns.requests.Timeout)
+        self.assertTrue(all(result is first for result in results))
+        self.assertEqual(len(self.requests_to('/flight')), 1)
+
+    def test_single_flight_leader_deadline(self):
+        # a leader which runs out of time says nothing about the request: the others retry
+        def leader():
+            with azurerm.Deadline(0.2):
+                try:
+                    return azurerm.do_get(self.url + '/flight', 'token')
+                except azurerm.DeadlineExceeded as error:
+                    return error
+
+        # slow enough that the retrying callers share one request
+        StandInHandler.routes['/flight'] = self.flight_route(0.5, delay=0.2)
+        first, results = self.single_flight_callers(4, leader=leader)
+        self.assertIsInstance(first, azurerm.DeadlineExceeded)
+        self.assertEqual(results, [{'name': 'shared'}] * 4)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(len(self.requests_to('/flight')), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -83,6 +83,12 @@ class TestAzurermPy(unittest.TestCase):
         response = azurerm.list_storage_accounts_sub(self.access_token, self.subscription_id)
         self.assertTrue('value' in response)
 
+        # iterate storage accounts in resource group
+        print('Iterate storage accounts')
+        accounts = list(azurerm.iter_storage_accounts_rg(self.access_token, self.subscription_id, \
+            self.rgname))
+        self.assertTrue(len(accounts) > 0)
+
         # delete storage account
         print('Delete storage account: ' + self.storage_account)
         response = azurerm.delete_storage_account(self.access_token, self.subscription_id, \
@@ -20,6 +20,8 @@ class TestAzurermPy(unittest.TestCase):
         tenant_id = config_data['tenantId']
         app_id = config_data['appId']
         app_secret = config_data['appSecret']
+        self.credential = azurerm.ServicePrincipalCredential(tenant_id, app_id, app_secret)
+        self.service_principal = (tenant_id, app_id, app_secret)
         self.subscription_id = config_data['subscriptionId']
         self.access_token = azurerm.get_access_token(tenant_id, app_id, app_secret)
 
@@ -45,5 +47,22 @@ class TestAzurermPy(unittest.TestCase):
         # print(json.dumps(response, sort_keys=False, indent=2, separators=(',', ': ')))
         self.assertTrue(len(response['value']) > 0)
 
+    def test_credential(self):
+        # cached service principal token
+        print('Getting cached token..')
+        self.assertEqual(self.credential.get_token(), self.access_token)
+        self.assertTrue(self.credential.expires_in() > 0)
+        response = azurerm.list_tenants(self.credential())
+        self.assertTrue(len(response['value']) > 0)
+
+    def test_credential_pool(self):
+        # token lookup by subscription
+        print('Mapping subscriptions to tenants..')
+        pool = azurerm.CredentialPool()
+        pool.add(*self.service_principal)
+        self.assertEqual(pool.acquire_all(), {})
+        self.assertEqual(pool.map_subscriptions(), {})
+        self.assertEqual(pool.get_token(subscription_id=self.subscription_id), self.access_token)
+
 if __name__ == '__main__':
     unittest.main()
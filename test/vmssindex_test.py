@@ -0,0 +1,83 @@
+# azurerm unit tests - VMSS instance table
+# To run tests: python -m unittest vmssindex_test.py
+# Note: Like aio_test.py these tests don't call Azure. The table is built from VM JSON bodies
+#  shaped like those returned by list_vmss_vms(), so no azurermconfig.json is needed.
+
+import unittest
+
+import azurerm
+
+
+def vmss_vm(instance_id, update_domain, power_state, zone=None, provisioning_state='succeeded'):
+    '''JSON body of a scale set VM listed with its instance view.'''
+    vm = {'instanceId': str(instance_id),
+          'properties': {'provisioningState': 'Succeeded',
+                         'instanceView': {'platformUpdateDomain': update_domain,
+                                          'platformFaultDomain': update_domain % 3,
+                                          'statuses': [
+                                              {'code': 'ProvisioningState/' + provisioning_state},
+                                              {'code': 'PowerState/' + power_state}]}}}
+    if zone is not None:
+        vm['zones'] = [zone]
+    return vm
+
+
+class TestAzurermVmssIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.table = azurerm.VmssInstanceTable(
+            vmss_vm(i, i % 5, 'stopped' if i % 7 == 0 else 'running', zone=str(i % 3 + 1))
+            for i in range(100))
+
+    def test_select(self):
+        self.assertEqual(len(self.table), 100)
+        stopped = sorted(self.table.select(update_domain=3, power_state='stopped'), key=int)
+        self.assertEqual(stopped, [str(i) for i in range(100) if i % 5 == 3 and i % 7 == 0])
+        self.assertEqual(self.table.count(power_state='stopped'), 15)
+        self.assertEqual(self.table.count(zone='2', fault_domain=0), len(
+            [i for i in range(100) if i % 3 == 1 and i % 5 % 3 == 0]))
+        self.assertEqual(self.table.select(power_state='deallocated'), [])
+        self.assertEqual(self.table.count(update_domain=9), 0)
+        self.assertEqual(len(self.table.select()), 100)
+        with self.assertRaises(TypeError):
+            self.table.select(color='red')
+
+    def test_get_and_counts(self):
+        self.assertEqual(self.table.get(14), {'update_domain': 4, 'fault_domain': 1, 'zone': '3',
+                                              'provisioning_state': 'succeeded',
+                                              'power_state': 'stopped'})
+        self.assertEqual(self.table.counts('power_state'), {'running': 85, 'stopped': 15})
+        self.assertEqual(self.table.counts('update_domain'), {ud: 20 for ud in range(5)})
+
+    def test_update_and_remove(self):
+        self.table.add(vmss_vm(14, 4, 'running', zone='3', provisioning_state='updating'))
+        self.assertEqual(self.table.count(power_state='stopped'), 14)
+        self.assertEqual(self.table.select(provisioning_state='updating'), ['14'])
+        self.table.set('14', power_state='deallocated')
+        self.assertEqual(self.table.get('14')['power_state'], 'deallocated')
+
+        self.table.remove('14')
+        self.assertNotIn('14', self.table)
+        self.assertEqual(self.table.count(power_state='deallocated'), 0)
+        self.assertEqual(len(self.table), 99)
+        # the row is reused for the next VM
+        self.table.add(vmss_vm(100, 0, 'running'))
+        self.assertEqual(self.table.get('100')['zone'], None)
+        self.assertEqual(self.table.count(update_domain=0), 21)
+        self.assertEqual(len(list(self.table)), 100)
+
+    def test_matches_scan(self):
+        table = azurerm.VmssInstanceTable(vmss_vm(i, i % 20, 'running') for i in range(5000))
+        for i in range(0, 5000, 3):
+            table.set(i, power_state='stopped' if i % 2 else 'deallocated')
+        for i in range(0, 5000, 10):
+            table.remove(i)
+        expected = [str(i) for i in range(5000)
+                    if i % 10 and i % 3 == 0 and i % 2 and i % 20 == 7]
+        self.assertEqual(table.select(update_domain=7, power_state='stopped'), expected)
+        self.assertEqual(table.count(power_state='running'),
+                         len([i for i in range(5000) if i % 10 and i % 3]))
+
+
+if __name__ == '__main__':
+    unittest.main()